@@ -1,24 +1,91 @@
+import asyncio
 import json
 
 from datetime import date
 
-from agent.llm_client import get_llm_response
-from agent.tool_executor import query_federal_registry_db
+from agent.cache import build_answer_cache, history_digest
+from agent.compaction import (
+    compact_tool_messages,
+    estimate_tokens,
+    get_compaction_stats,
+    record_turn_savings,
+)
+from agent.llm_client import (
+    LLMError,
+    LLMOverloaded,
+    get_llm_response,
+    stream_llm_response,
+)
+from agent.tool_executor import (
+    get_tool_validation_stats,
+    query_federal_registry_db,
+    semantic_search_federal_registry,
+)
 
 from config import global_config as config
+from telemetry import span
 
 
 AVAILABLE_TOOLS = {
     "query_federal_registry_db": query_federal_registry_db,
+    "semantic_search_federal_registry": semantic_search_federal_registry,
 }
 
+answer_cache = build_answer_cache()
 
-async def process_user_query(user_query: str, chat_history: list = None):
+# Tool calls from every conversation share the DB pool, so never run more at once
+# than it has connections.
+tool_call_semaphore = asyncio.Semaphore(config.DB_POOL_MAX_SIZE)
 
-    current_date_str = date.today().strftime("%Y-%m-%d")
+MAX_TOOL_CALLS_PER_TURN = 3  # Safety break
+TOO_MANY_STEPS_ANSWER = "I tried to use my tools to find an answer, but it took too many steps. Could you please rephrase your question or be more specific?"
 
-    if chat_history is None:
-        chat_history = []
+
+_answer_counters = {
+    "answers": 0,
+    "tool_calls": 0,
+    "llm_requests": 0,
+    "step_limit_reached": 0,
+    # Answers by number of tool calls they needed: {"0": n, "1": n, ...}
+    "tool_calls_per_answer": {},
+}
+
+HISTORY_SUMMARY_MAX_QUESTIONS = 10
+HISTORY_SUMMARY_QUESTION_CHARS = 150
+
+
+def _bound_history(chat_history: list):
+    """
+    Keeps the most recent messages that fit CHAT_HISTORY_MAX_MESSAGES and
+    CHAT_HISTORY_MAX_TOKENS. Older user questions are folded into one short
+    summary message instead of an extra LLM round trip.
+    """
+    kept = []
+    used_tokens = 0
+    for message in reversed(chat_history[-config.CHAT_HISTORY_MAX_MESSAGES :]):
+        message_tokens = estimate_tokens(message.get("content"))
+        if kept and used_tokens + message_tokens > config.CHAT_HISTORY_MAX_TOKENS:
+            break
+        kept.append(message)
+        used_tokens += message_tokens
+    kept.reverse()
+
+    dropped = chat_history[: len(chat_history) - len(kept)]
+    earlier_questions = [
+        message["content"][:HISTORY_SUMMARY_QUESTION_CHARS]
+        for message in dropped
+        if message.get("role") == "user" and message.get("content")
+    ][-HISTORY_SUMMARY_MAX_QUESTIONS:]
+    if earlier_questions:
+        summary = "Earlier in this conversation the user asked: " + "; ".join(
+            earlier_questions
+        )
+        return [{"role": "system", "content": summary}] + kept
+    return kept
+
+
+def _build_messages(user_query: str, chat_history: list):
+    current_date_str = date.today().strftime("%Y-%m-%d")
 
     messages = [
         {
@@ -26,21 +93,151 @@ async def process_user_query(user_query: str, chat_history: list = None):
             "content": config.SYSTEM_PROMPT.format(current_date=current_date_str),
         }
     ]
-    messages.extend(chat_history)  # Add past exchanges if any
+    messages.extend(_bound_history(chat_history))  # Add past exchanges if any
     messages.append({"role": "user", "content": user_query})
+    return messages
+
+
+async def _run_tool_call(tool_call_id, function_name, function_args_json):
+    """Executes one tool call requested by the LLM and returns the tool message."""
+    print(f"Using tool: {function_name}")
+
+    if function_name in AVAILABLE_TOOLS:
+        function_to_call = AVAILABLE_TOOLS[function_name]
+        try:
+            function_args = json.loads(function_args_json or "{}")
+
+            with span("tool.call", tool=function_name, arguments=function_args_json):
+                tool_output_json = await function_to_call(**function_args)
+        except json.JSONDecodeError:
+            tool_output_json = json.dumps({"error": "Invalid JSON arguments from LLM."})
+        except Exception as e:
+            print(f"Error executing tool {function_name}: {e}")
+            tool_output_json = json.dumps({"error": f"Error executing tool: {str(e)}"})
+    else:
+        print(f"Error: LLM tried to call unknown tool: {function_name}")
+        tool_output_json = json.dumps(
+            {"error": f"Tool '{function_name}' not found or not permitted."}
+        )
+
+    return {
+        "tool_call_id": tool_call_id,
+        "role": "tool",
+        "name": function_name,
+        "content": tool_output_json,
+    }
+
+
+async def _run_tool_call_bounded(tool_call_id, function_name, function_args_json):
+    """_run_tool_call under the shared semaphore and a per-call timeout."""
+    async with tool_call_semaphore:
+        try:
+            return await asyncio.wait_for(
+                _run_tool_call(tool_call_id, function_name, function_args_json),
+                timeout=config.TOOL_CALL_TIMEOUT_SECONDS,
+            )
+        except asyncio.TimeoutError:
+            print(f"Tool {function_name} timed out.")
+            return {
+                "tool_call_id": tool_call_id,
+                "role": "tool",
+                "name": function_name,
+                "content": json.dumps(
+                    {
+                        "error": f"Tool call timed out after {config.TOOL_CALL_TIMEOUT_SECONDS} seconds."
+                    }
+                ),
+            }
+
+
+def get_answer_cache_stats():
+    return answer_cache.stats()
+
+
+def _has_tool_error(tool_messages):
+    """True if any tool call failed (timeout, busy pool, DB error)."""
+    for message in tool_messages:
+        try:
+            output = json.loads(message["content"])
+        except (TypeError, json.JSONDecodeError):
+            continue
+        if isinstance(output, dict) and "error" in output:
+            return True
+    return False
+
+
+def _record_answer(tool_calls, llm_requests, prompt_tokens_saved, step_limit=False):
+    _answer_counters["answers"] += 1
+    _answer_counters["tool_calls"] += tool_calls
+    _answer_counters["llm_requests"] += llm_requests
+    if step_limit:
+        _answer_counters["step_limit_reached"] += 1
+    histogram = _answer_counters["tool_calls_per_answer"]
+    histogram[str(tool_calls)] = histogram.get(str(tool_calls), 0) + 1
+    record_turn_savings(prompt_tokens_saved)
+
+
+def get_agent_stats():
+    answers = _answer_counters["answers"]
+    return {
+        "answers": answers,
+        "avg_tool_calls_per_answer": (
+            round(_answer_counters["tool_calls"] / answers, 3) if answers else 0.0
+        ),
+        "avg_llm_requests_per_answer": (
+            round(_answer_counters["llm_requests"] / answers, 3) if answers else 0.0
+        ),
+        "step_limit_reached": _answer_counters["step_limit_reached"],
+        "tool_calls_per_answer": dict(_answer_counters["tool_calls_per_answer"]),
+        "tool_arguments": get_tool_validation_stats(),
+        "tool_output_compaction": get_compaction_stats(),
+    }
+
+
+async def process_user_query(
+    user_query: str, chat_history: list = None, use_cache: bool = True
+):
+
+    if chat_history is None:
+        chat_history = []
+
+    messages = _build_messages(user_query, chat_history)
+
+    use_cache = use_cache and config.ANSWER_CACHE_ENABLED
+    if use_cache:
+        # The context excludes the system prompt and the new question itself.
+        cache_context = history_digest(messages[1:-1])
+        with span("agent.answer_cache_lookup"):
+            cached_answer, query_embedding = await answer_cache.lookup(
+                user_query, cache_context
+            )
+        if cached_answer is not None:
+            chat_history.append({"role": "user", "content": user_query})
+            chat_history.append({"role": "assistant", "content": cached_answer})
+            return cached_answer
 
-    MAX_TOOL_CALLS_PER_TURN = 3  # Safety break
     tool_calls_count = 0
+    # Prompt tokens compaction keeps out of every LLM request in this turn.
+    tokens_saved_in_context = 0
+    turn_tokens_saved = 0
+    turn_tool_calls = 0
+    # Answers written around a failed tool call are not cached: the failure is
+    # usually transient and the data version does not change on an outage.
+    turn_tool_error = False
 
     while tool_calls_count < MAX_TOOL_CALLS_PER_TURN:
         # print(f"\nSending to LLM (Turn {tool_calls_count + 1}): {messages[-1]}")
-        llm_response_message = await get_llm_response(
-            messages, tools=config.FEDERAL_REGISTRY_TOOL_SCHEMA, tool_choice="auto"
-        )
-        # print(f"LLM Raw Response: {llm_response_message}")
-
-        if not llm_response_message:
+        turn_tokens_saved += tokens_saved_in_context
+        try:
+            llm_response_message = await get_llm_response(
+                messages, tools=config.FEDERAL_REGISTRY_TOOL_SCHEMA, tool_choice="auto"
+            )
+        except LLMOverloaded:
+            raise  # The API answers 503 so the client backs off.
+        except LLMError as e:
+            print(f"Error communicating with LLM: {e}")
             return "Sorry, I couldn't connect to the language model right now."
+        # print(f"LLM Raw Response: {llm_response_message}")
 
         # Check for tool calls
         if (
@@ -50,58 +247,181 @@ async def process_user_query(user_query: str, chat_history: list = None):
             tool_calls = llm_response_message.tool_calls
             messages.append(llm_response_message)
 
-            for tool_call in tool_calls:
-                function_name = tool_call.function.name
-                function_args_json = tool_call.function.arguments
-                print(f"Using tool: {function_name}")
+            # Independent calls run concurrently; results keep the model's order.
+            tool_messages = await asyncio.gather(
+                *(
+                    _run_tool_call_bounded(
+                        tool_call.id,
+                        tool_call.function.name,
+                        tool_call.function.arguments,
+                    )
+                    for tool_call in tool_calls
+                )
+            )
+            turn_tool_error = turn_tool_error or _has_tool_error(tool_messages)
+            tokens_saved_in_context += compact_tool_messages(tool_messages)
+            messages.extend(tool_messages)
+            tool_calls_count += 1
+            turn_tool_calls += len(tool_messages)
 
-                if function_name in AVAILABLE_TOOLS:
-                    function_to_call = AVAILABLE_TOOLS[function_name]
-                    try:
-                        function_args = json.loads(function_args_json)
+        else:
 
-                        tool_output_json = await function_to_call(**function_args)
-                    except json.JSONDecodeError:
-                        tool_output_json = json.dumps(
-                            {"error": "Invalid JSON arguments from LLM."}
-                        )
-                    except Exception as e:
-                        print(f"Error executing tool {function_name}: {e}")
-                        tool_output_json = json.dumps(
-                            {"error": f"Error executing tool: {str(e)}"}
-                        )
+            final_answer = llm_response_message.content
+            # print(f"LLM Final Answer: {final_answer}")
+            _record_answer(turn_tool_calls, tool_calls_count + 1, turn_tokens_saved)
 
-                    messages.append(
-                        {
-                            "tool_call_id": tool_call.id,
-                            "role": "tool",
-                            "name": function_name,
-                            "content": tool_output_json,
-                        }
+            chat_history.append({"role": "user", "content": user_query})
+            chat_history.append({"role": "assistant", "content": final_answer})
+            if use_cache and final_answer and not turn_tool_error:
+                await answer_cache.store(
+                    user_query, cache_context, final_answer, query_embedding
+                )
+            return final_answer
+
+    _record_answer(
+        turn_tool_calls, tool_calls_count, turn_tokens_saved, step_limit=True
+    )
+    return TOO_MANY_STEPS_ANSWER
+
+
+async def process_user_query_stream(
+    user_query: str, chat_history: list = None, use_cache: bool = True
+):
+    """
+    Same loop as process_user_query, but yields events as they happen:
+    {"type": "tool", ...} around each tool call, {"type": "token", ...} for every
+    piece of the answer, {"type": "reset"} if streamed text turns out to precede
+    a tool call, and finally {"type": "done", "answer": ...} or {"type": "error", ...}.
+    """
+    if chat_history is None:
+        chat_history = []
+
+    messages = _build_messages(user_query, chat_history)
+
+    use_cache = use_cache and config.ANSWER_CACHE_ENABLED
+    if use_cache:
+        cache_context = history_digest(messages[1:-1])
+        with span("agent.answer_cache_lookup"):
+            cached_answer, query_embedding = await answer_cache.lookup(
+                user_query, cache_context
+            )
+        if cached_answer is not None:
+            chat_history.append({"role": "user", "content": user_query})
+            chat_history.append({"role": "assistant", "content": cached_answer})
+            yield {"type": "token", "content": cached_answer}
+            yield {"type": "done", "answer": cached_answer, "cached": True}
+            return
+
+    tool_calls_count = 0
+    tokens_saved_in_context = 0
+    turn_tokens_saved = 0
+    turn_tool_calls = 0
+    turn_tool_error = False
+
+    while tool_calls_count < MAX_TOOL_CALLS_PER_TURN:
+        turn_tokens_saved += tokens_saved_in_context
+        content_parts = []
+        tool_calls = {}
+        try:
+            async for delta in stream_llm_response(
+                messages, tools=config.FEDERAL_REGISTRY_TOOL_SCHEMA, tool_choice="auto"
+            ):
+                for tool_call_delta in getattr(delta, "tool_calls", None) or []:
+                    entry = tool_calls.setdefault(
+                        tool_call_delta.index, {"id": None, "name": "", "arguments": ""}
                     )
-                else:
-                    print(f"Error: LLM tried to call unknown tool: {function_name}")
-                    messages.append(
+                    if tool_call_delta.id:
+                        entry["id"] = tool_call_delta.id
+                    if tool_call_delta.function:
+                        entry["name"] += tool_call_delta.function.name or ""
+                        entry["arguments"] += tool_call_delta.function.arguments or ""
+
+                if getattr(delta, "content", None):
+                    content_parts.append(delta.content)
+                    if not tool_calls:
+                        yield {"type": "token", "content": delta.content}
+        except LLMOverloaded:
+            yield {
+                "type": "error",
+                "message": "The assistant is busy right now. Please try again in a moment.",
+                "overloaded": True,
+            }
+            return
+        except Exception as e:
+            print(f"Error communicating with LLM: {e}")
+            yield {
+                "type": "error",
+                "message": f"Sorry, I encountered an error trying to process your request: {e}",
+            }
+            return
+
+        if tool_calls:
+            if content_parts:
+                yield {"type": "reset"}
+
+            ordered_calls = [tool_calls[index] for index in sorted(tool_calls)]
+            messages.append(
+                {
+                    "role": "assistant",
+                    "content": "".join(content_parts) or None,
+                    "tool_calls": [
                         {
-                            "tool_call_id": tool_call.id,
-                            "role": "tool",
-                            "name": function_name,
-                            "content": json.dumps(
-                                {
-                                    "error": f"Tool '{function_name}' not found or not permitted."
-                                }
-                            ),
+                            "id": call["id"],
+                            "type": "function",
+                            "function": {
+                                "name": call["name"],
+                                "arguments": call["arguments"],
+                            },
                         }
+                        for call in ordered_calls
+                    ],
+                }
+            )
+
+            tasks = []
+            for call in ordered_calls:
+                yield {"type": "tool", "status": "started", "name": call["name"]}
+                tasks.append(
+                    asyncio.ensure_future(
+                        _run_tool_call_bounded(
+                            call["id"], call["name"], call["arguments"]
+                        )
                     )
+                )
+
+            # Report calls as they finish, but append results in the original order.
+            for finished in asyncio.as_completed(tasks):
+                tool_message = await finished
+                turn_tool_error = turn_tool_error or _has_tool_error([tool_message])
+                tokens_saved_in_context += compact_tool_messages([tool_message])
+                try:
+                    count = json.loads(tool_message["content"]).get("count")
+                except (json.JSONDecodeError, AttributeError):
+                    count = None
+                yield {
+                    "type": "tool",
+                    "status": "finished",
+                    "name": tool_message["name"],
+                    "count": count,
+                }
+            messages.extend(task.result() for task in tasks)
             tool_calls_count += 1
+            turn_tool_calls += len(tasks)
 
         else:
-
-            final_answer = llm_response_message.content
-            # print(f"LLM Final Answer: {final_answer}")
+            final_answer = "".join(content_parts)
+            _record_answer(turn_tool_calls, tool_calls_count + 1, turn_tokens_saved)
 
             chat_history.append({"role": "user", "content": user_query})
             chat_history.append({"role": "assistant", "content": final_answer})
-            return final_answer
+            if use_cache and final_answer and not turn_tool_error:
+                await answer_cache.store(
+                    user_query, cache_context, final_answer, query_embedding
+                )
+            yield {"type": "done", "answer": final_answer}
+            return
 
-    return "I tried to use my tools to find an answer, but it took too many steps. Could you please rephrase your question or be more specific?"
+    _record_answer(
+        turn_tool_calls, tool_calls_count, turn_tokens_saved, step_limit=True
+    )
+    yield {"type": "done", "answer": TOO_MANY_STEPS_ANSWER}
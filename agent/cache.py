@@ -0,0 +1,231 @@
+import hashlib
+import json
+import re
+import time
+
+from collections import OrderedDict
+from datetime import date
+
+import numpy as np
+
+from agent.llm_client import get_embeddings
+from config import global_config as config
+from data_pipeline.data_version import get_data_version
+
+
+class VersionedLRUCache:
+    """
+    Size-bounded LRU with a per-entry TTL. The whole cache is dropped when the
+    pipeline bumps the data version, so results never outlive the rows they came from.
+    """
+
+    def __init__(self, max_entries, ttl_seconds):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._data_version = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _check_data_version(self):
+        current_version = get_data_version()
+        if current_version != self._data_version:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._data_version = current_version
+
+    def get(self, key):
+        self._check_data_version()
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        stored_at, value = entry
+        if time.monotonic() - stored_at > self.ttl_seconds:
+            del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key, value):
+        self._check_data_version()
+        self._entries[key] = (time.monotonic(), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def items(self):
+        """Live (key, value) pairs, least recently used first."""
+        self._check_data_version()
+        now = time.monotonic()
+        return [
+            (key, value)
+            for key, (stored_at, value) in self._entries.items()
+            if now - stored_at <= self.ttl_seconds
+        ]
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "data_version": self._data_version,
+        }
+
+
+class OpenAIEmbedder:
+    """
+    Embeds text through the OpenAI-compatible /embeddings endpoint (e.g. a local
+    Ollama model), via the managed LLM client's admission control and retries.
+    """
+
+    def __init__(self, model):
+        self.model = model
+
+    async def embed(self, texts):
+        return await get_embeddings(texts, self.model)
+
+
+def _unit_vector(embedding):
+    """float32 copy scaled to length 1 (None for a zero vector), so cosine is a dot product."""
+    vector = np.asarray(embedding, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else None
+
+
+def normalize_query(text):
+    text = re.sub(r"\s+", " ", text.casefold()).strip()
+    return text.rstrip("?!. ")
+
+
+def history_digest(chat_history):
+    """Short digest of the conversation so far; answers only match within the same context."""
+    return hashlib.sha1(
+        json.dumps(chat_history, sort_keys=True, default=str).encode("utf-8")
+    ).hexdigest()
+
+
+class AnswerCache:
+    """
+    Caches final answers by normalized query + current date + conversation context;
+    the data version is handled by the underlying VersionedLRUCache. With an
+    embedder configured, paraphrased queries also hit when their cosine similarity
+    with a cached query is at least `similarity_threshold`.
+    """
+
+    def __init__(self, max_entries, ttl_seconds, similarity_threshold, embedder=None):
+        self._cache = VersionedLRUCache(max_entries, ttl_seconds)
+        self.similarity_threshold = similarity_threshold
+        self.embedder = embedder
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.embedding_errors = 0
+
+    def _key(self, query, context):
+        return json.dumps([date.today().isoformat(), context, normalize_query(query)])
+
+    async def _embed(self, query):
+        if self.embedder is None:
+            return None
+        try:
+            return (await self.embedder.embed([normalize_query(query)]))[0]
+        except Exception as e:
+            self.embedding_errors += 1
+            print(f"Answer cache embedding failed, using exact matches only: {e}")
+            return None
+
+    async def lookup(self, query, context):
+        """Returns (answer or None, query embedding or None)."""
+        key = self._key(query, context)
+        entry = self._cache.get(key)
+        if entry is not None:
+            self.exact_hits += 1
+            return entry["answer"], entry["embedding"]
+
+        embedding = await self._embed(query)
+        query_vector = _unit_vector(embedding) if embedding is not None else None
+        if query_vector is not None:
+            today = date.today().isoformat()
+            candidates = [
+                cached
+                for _, cached in self._cache.items()
+                if cached.get("vector") is not None
+                and cached["vector"].shape == query_vector.shape
+                and cached["context"] == context
+                and cached["date"] == today
+            ]
+            if candidates:
+                # One matrix-vector product instead of a Python loop per entry.
+                scores = (
+                    np.stack([cached["vector"] for cached in candidates]) @ query_vector
+                )
+                best = int(np.argmax(scores))
+                if scores[best] >= self.similarity_threshold:
+                    self.semantic_hits += 1
+                    return candidates[best]["answer"], embedding
+
+        self.misses += 1
+        return None, embedding
+
+    async def store(self, query, context, answer, embedding=None):
+        if embedding is None:
+            embedding = await self._embed(query)
+        self._cache.set(
+            self._key(query, context),
+            {
+                "answer": answer,
+                "embedding": embedding,
+                "vector": _unit_vector(embedding) if embedding is not None else None,
+                "context": context,
+                "date": date.today().isoformat(),
+            },
+        )
+
+    def stats(self):
+        lookups = self.exact_hits + self.semantic_hits + self.misses
+        stats = self._cache.stats()
+        stats.update(
+            {
+                "hits": self.exact_hits + self.semantic_hits,
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "hit_rate": (
+                    round((self.exact_hits + self.semantic_hits) / lookups, 4)
+                    if lookups
+                    else 0.0
+                ),
+                "semantic_enabled": self.embedder is not None,
+                "similarity_threshold": self.similarity_threshold,
+                "embedding_errors": self.embedding_errors,
+            }
+        )
+        return stats
+
+
+def build_answer_cache():
+    embedder = None
+    if config.ANSWER_CACHE_EMBEDDING_MODEL:
+        embedder = OpenAIEmbedder(config.ANSWER_CACHE_EMBEDDING_MODEL)
+    return AnswerCache(
+        config.ANSWER_CACHE_MAX_ENTRIES,
+        config.ANSWER_CACHE_TTL_SECONDS,
+        config.ANSWER_CACHE_SIMILARITY_THRESHOLD,
+        embedder=embedder,
+    )
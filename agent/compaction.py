@@ -0,0 +1,154 @@
+import json
+
+from config import global_config as config
+
+
+MIN_ABSTRACT_CHARS = 80
+
+_counters = {
+    "tool_outputs": 0,
+    "compacted": 0,
+    "original_tokens": 0,
+    "compacted_tokens": 0,
+    "turns": 0,
+    "prompt_tokens_saved": 0,
+    "last_turn_prompt_tokens_saved": 0,
+}
+
+
+def estimate_tokens(text):
+    """Cheap token estimate (~4 characters per token), good enough for budgeting."""
+    return len(text or "") // 4 + 1
+
+
+def _dumps(data):
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+
+
+def _dedupe_agencies(documents):
+    for doc in documents:
+        if isinstance(doc.get("agencies"), list):
+            doc["agencies"] = list(dict.fromkeys(doc["agencies"]))
+    # Agencies shared by every document are listed once for the whole result.
+    agency_lists = [doc.get("agencies") for doc in documents]
+    if len(documents) > 1 and all(
+        isinstance(agencies, list) and agencies for agencies in agency_lists
+    ):
+        common = [
+            agency
+            for agency in agency_lists[0]
+            if all(agency in rest for rest in agency_lists)
+        ]
+        if common:
+            for doc in documents:
+                doc["agencies"] = [a for a in doc["agencies"] if a not in common]
+                if not doc["agencies"]:
+                    del doc["agencies"]
+            return common
+    return None
+
+
+def _truncate(text, max_chars):
+    if not isinstance(text, str) or len(text) <= max_chars:
+        return text
+    return text[:max_chars].rsplit(" ", 1)[0] + "..."
+
+
+def compact_tool_output(content, max_tokens=None):
+    """
+    Fits a query_federal_registry_db result into `max_tokens` (TOOL_OUTPUT_MAX_TOKENS).
+    Cheapest first: compact JSON and de-duplicated agencies, then abstracts cut to
+    TOOL_OUTPUT_ABSTRACT_MAX_CHARS and shortened further, and finally the
+    lowest-ranked documents dropped (always keeping one). The result says how many
+    documents were omitted so the model can narrow the query or ask for fewer
+    fields; it then carries no next_cursor, which would skip them. Non-document
+    outputs are returned unchanged.
+    """
+    max_tokens = max_tokens or config.TOOL_OUTPUT_MAX_TOKENS
+    try:
+        data = json.loads(content)
+    except (TypeError, json.JSONDecodeError):
+        return content
+    if not isinstance(data, dict) or not data.get("found_documents"):
+        return content
+
+    documents = data["found_documents"]
+    common_agencies = _dedupe_agencies(documents)
+    if common_agencies:
+        data["agencies_of_all_documents"] = common_agencies
+
+    abstract_chars = config.TOOL_OUTPUT_ABSTRACT_MAX_CHARS
+    for doc in documents:
+        doc["abstract"] = _truncate(doc.get("abstract"), abstract_chars)
+        if doc["abstract"] is None:
+            del doc["abstract"]
+
+    compacted = _dumps(data)
+    while (
+        estimate_tokens(compacted) > max_tokens
+        and abstract_chars > MIN_ABSTRACT_CHARS
+    ):
+        abstract_chars //= 2
+        for doc in documents:
+            if "abstract" in doc:
+                doc["abstract"] = _truncate(doc["abstract"], abstract_chars)
+        compacted = _dumps(data)
+
+    if estimate_tokens(compacted) > max_tokens and len(documents) > 1:
+        # Rows come back in the query's order (relevance or date), so the tail
+        # matters least.
+        while estimate_tokens(compacted) > max_tokens and len(documents) > 1:
+            documents.pop()
+            data["omitted_documents"] = data.get("count", 0) - len(documents)
+            compacted = _dumps(data)
+        data["count"] = len(documents)
+        # The cursor points past the last row before compaction, so following it
+        # would skip the omitted documents.
+        data.pop("next_cursor", None)
+        compacted = _dumps(data)
+
+    return compacted
+
+
+def compact_tool_messages(tool_messages):
+    """Compacts tool messages in place. Returns the prompt tokens saved per LLM request."""
+    saved = 0
+    for message in tool_messages:
+        original = message["content"]
+        compacted = compact_tool_output(original)
+        original_tokens = estimate_tokens(original)
+        compacted_tokens = estimate_tokens(compacted)
+        _counters["tool_outputs"] += 1
+        _counters["original_tokens"] += original_tokens
+        _counters["compacted_tokens"] += compacted_tokens
+        if compacted != original:
+            _counters["compacted"] += 1
+            message["content"] = compacted
+        saved += max(0, original_tokens - compacted_tokens)
+    return saved
+
+
+def record_turn_savings(prompt_tokens_saved):
+    """
+    Records one answered question. Tool results stay in the conversation for every
+    later LLM request of the turn, so savings are counted once per request sent.
+    """
+    _counters["turns"] += 1
+    _counters["prompt_tokens_saved"] += prompt_tokens_saved
+    _counters["last_turn_prompt_tokens_saved"] = prompt_tokens_saved
+
+
+def get_compaction_stats():
+    stats = dict(_counters)
+    stats["max_tokens_per_tool_output"] = config.TOOL_OUTPUT_MAX_TOKENS
+    stats["tool_output_savings_ratio"] = (
+        round(1 - _counters["compacted_tokens"] / _counters["original_tokens"], 4)
+        if _counters["original_tokens"]
+        else 0.0
+    )
+    stats["avg_prompt_tokens_saved_per_turn"] = (
+        round(_counters["prompt_tokens_saved"] / _counters["turns"], 1)
+        if _counters["turns"]
+        else 0.0
+    )
+    return stats
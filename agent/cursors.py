@@ -0,0 +1,21 @@
+import base64
+import json
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(values):
+    """Opaque keyset cursor: the last row's sort key as URL-safe base64 JSON."""
+    return base64.urlsafe_b64encode(json.dumps(values).encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (ValueError, UnicodeError) as e:
+        raise InvalidCursor("Malformed cursor.") from e
+    if not isinstance(values, dict):
+        raise InvalidCursor("Malformed cursor.")
+    return values
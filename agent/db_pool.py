@@ -0,0 +1,99 @@
+import asyncio
+import aiomysql
+
+from contextlib import asynccontextmanager
+
+from config import global_config as config
+from telemetry import span
+
+
+_pool = None
+_pool_lock = asyncio.Lock()
+_pool_counters = {
+    "waiting": 0,
+    "acquired_total": 0,
+    "acquire_timeouts": 0,
+}
+
+
+async def init_db_pool():
+    """Creates the app-lifetime aiomysql pool. Safe to call more than once."""
+    global _pool
+    async with _pool_lock:
+        if _pool is None:
+            _pool = await aiomysql.create_pool(
+                host=config.DB_HOST,
+                port=config.DB_PORT,
+                user=config.DB_USER,
+                password=config.DB_PASSWORD,
+                db=config.DB_NAME,
+                autocommit=True,
+                minsize=config.DB_POOL_MIN_SIZE,
+                maxsize=config.DB_POOL_MAX_SIZE,
+                pool_recycle=config.DB_POOL_RECYCLE,
+            )
+            print(
+                f"Database pool created (min={config.DB_POOL_MIN_SIZE}, max={config.DB_POOL_MAX_SIZE})."
+            )
+    return _pool
+
+
+async def close_db_pool():
+    """Closes the shared pool and waits for its connections to be released."""
+    global _pool
+    async with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            await _pool.wait_closed()
+            _pool = None
+            print("Database pool closed.")
+
+
+async def get_db_pool():
+    """Returns the shared pool, creating it lazily when running outside the API."""
+    if _pool is None:
+        return await init_db_pool()
+    return _pool
+
+
+@asynccontextmanager
+async def acquire_db_connection():
+    """Acquires a connection from the shared pool, bounded by DB_POOL_ACQUIRE_TIMEOUT."""
+    pool = await get_db_pool()
+    _pool_counters["waiting"] += 1
+    try:
+        with span("db.acquire"):
+            conn = await asyncio.wait_for(
+                pool.acquire(), timeout=config.DB_POOL_ACQUIRE_TIMEOUT
+            )
+    except asyncio.TimeoutError:
+        _pool_counters["acquire_timeouts"] += 1
+        raise
+    finally:
+        _pool_counters["waiting"] -= 1
+
+    _pool_counters["acquired_total"] += 1
+    try:
+        yield conn
+    finally:
+        pool.release(conn)
+
+
+def get_db_pool_stats():
+    """Returns a snapshot of pool usage for monitoring."""
+    stats = {
+        "initialized": _pool is not None,
+        "min_size": config.DB_POOL_MIN_SIZE,
+        "max_size": config.DB_POOL_MAX_SIZE,
+        "created": 0,
+        "free": 0,
+        "in_use": 0,
+        "waiting": _pool_counters["waiting"],
+        "acquired_total": _pool_counters["acquired_total"],
+        "acquire_timeouts": _pool_counters["acquire_timeouts"],
+    }
+    if _pool is not None:
+        stats["created"] = _pool.size
+        stats["free"] = _pool.freesize
+        stats["in_use"] = _pool.size - _pool.freesize
+    return stats
@@ -1,27 +1,259 @@
+import asyncio
+import random
+import time
+
+from collections import deque
+
+import openai
+
 from config import global_config as config
+from telemetry import count_llm_usage, record_span, span
+
+
+# Transient failures worth another attempt; anything else (bad request, auth) is not.
+RETRYABLE_ERRORS = (
+    openai.APIConnectionError,  # includes APITimeoutError
+    openai.RateLimitError,
+    openai.InternalServerError,
+)
+LATENCY_WINDOW = 1000
+
+
+class LLMError(Exception):
+    """The LLM request failed, after retries if the error was transient."""
+
+
+class LLMOverloaded(LLMError):
+    """Too many requests are already waiting for the LLM; the caller should back off."""
+
+
+class AdmissionLimiter:
+    """
+    Lets at most `max_concurrency` requests reach the LLM at once. Up to `max_queue`
+    more wait (for at most `queue_timeout` seconds); beyond that requests are
+    rejected immediately, so a burst turns into fast 503s instead of an
+    unbounded queue inside Ollama.
+    """
+
+    def __init__(self, max_concurrency, max_queue, queue_timeout):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.in_flight = 0
+        self.waiting = 0
+        self.max_waiting_seen = 0
+        self.rejected = 0
+        self.queue_timeouts = 0
+
+    def saturated(self):
+        return self.waiting >= self.max_queue
+
+    async def acquire(self):
+        if self.in_flight >= self.max_concurrency and self.saturated():
+            self.rejected += 1
+            raise LLMOverloaded("LLM request queue is full.")
+        self.waiting += 1
+        self.max_waiting_seen = max(self.max_waiting_seen, self.waiting)
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.queue_timeouts += 1
+            raise LLMOverloaded(
+                f"Waited {self.queue_timeout}s for an LLM slot."
+            ) from None
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+
+    def release(self):
+        self.in_flight -= 1
+        self._semaphore.release()
+
+
+admission = AdmissionLimiter(
+    config.LLM_MAX_CONCURRENCY,
+    config.LLM_MAX_QUEUE,
+    config.LLM_QUEUE_TIMEOUT_SECONDS,
+)
+
+_counters = {
+    "requests": 0,
+    "succeeded": 0,
+    "failed": 0,
+    "retries": 0,
+    "embedding_requests": 0,
+    "embedding_failed": 0,
+}
+_latencies = deque(maxlen=LATENCY_WINDOW)
+_queue_waits = deque(maxlen=LATENCY_WINDOW)
+
+
+def _backoff_seconds(attempt):
+    """Exponential backoff with full jitter."""
+    ceiling = min(
+        config.LLM_BACKOFF_MAX_SECONDS,
+        config.LLM_BACKOFF_BASE_SECONDS * (2**attempt),
+    )
+    return random.uniform(0, ceiling)
+
+
+def _request_kwargs(messages, tools, tool_choice):
+    kwargs = {
+        "model": config.OLLAMA_MODEL,
+        "messages": messages,
+        "temperature": 0.1,
+    }
+    if tools:
+        kwargs["tools"] = tools
+        kwargs["tool_choice"] = tool_choice
+    return kwargs
+
+
+async def _admit():
+    queued_at = time.perf_counter()
+    with span("llm.admission"):
+        await admission.acquire()
+    _queue_waits.append(time.perf_counter() - queued_at)
+
+
+async def _with_retries(make_request):
+    """Runs `make_request()` with bounded, jittered retries on transient errors."""
+    for attempt in range(config.LLM_MAX_RETRIES + 1):
+        try:
+            return await make_request()
+        except RETRYABLE_ERRORS as e:
+            if attempt == config.LLM_MAX_RETRIES:
+                raise LLMError(
+                    f"LLM request failed after {attempt + 1} attempts: {e}"
+                ) from e
+            delay = _backoff_seconds(attempt)
+            _counters["retries"] += 1
+            print(f"LLM request failed ({e!r}), retrying in {delay:.2f}s")
+            await asyncio.sleep(delay)
+        except openai.OpenAIError as e:
+            raise LLMError(f"LLM request failed: {e}") from e
 
 
 async def get_llm_response(messages, tools=None, tool_choice="auto"):
+    """
+    Returns the assistant message. Raises LLMOverloaded when the admission queue is
+    full and LLMError when the request fails (after retries for transient errors).
+    """
+    _counters["requests"] += 1
+    await _admit()
+    started_at = time.perf_counter()
     try:
-        if tools:
-            response = await config.aclient.chat.completions.create(
-                model=config.OLLAMA_MODEL,
-                messages=messages,
-                tools=tools,
-                tool_choice=tool_choice,
-                temperature=0.1,
+        with span("llm.request", stream=False) as request_span:
+            response = await _with_retries(
+                lambda: config.aclient.chat.completions.create(
+                    **_request_kwargs(messages, tools, tool_choice)
+                )
             )
-        # else:
-        #     response = await config.aclient.chat.completions.create(
-        #         model=config.OLLAMA_MODEL,
-        #         messages=messages,
-        #         temperature=0.7,  # Slightly higher for summarization
-        #     )
-        return response.choices[0].message
-    except Exception as e:
-        print(f"Error communicating with LLM: {e}")
-
-        return {
-            "role": "assistant",
-            "content": f"Sorry, I encountered an error trying to process your request: {e}",
-        }
+            request_span.set(**count_llm_usage(getattr(response, "usage", None)))
+    except LLMError:
+        _counters["failed"] += 1
+        raise
+    finally:
+        admission.release()
+    _latencies.append(time.perf_counter() - started_at)
+    _counters["succeeded"] += 1
+    return response.choices[0].message
+
+
+async def stream_llm_response(messages, tools=None, tool_choice="auto"):
+    """
+    Streams a completion, yielding each choice delta (content or tool call fragments).
+    Opening the stream is retried like get_llm_response; once deltas have been
+    yielded a failure is raised as LLMError, since the output cannot be replayed.
+    The admission slot is held until the stream ends.
+    """
+    _counters["requests"] += 1
+    await _admit()
+    started_at = time.perf_counter()
+    usage = None
+    outcome = "error"
+    try:
+        stream = await _with_retries(
+            lambda: config.aclient.chat.completions.create(
+                stream=True,
+                # The last chunk then carries token usage (and no choices).
+                stream_options={"include_usage": True},
+                **_request_kwargs(messages, tools, tool_choice),
+            )
+        )
+        try:
+            async for chunk in stream:
+                if chunk.choices:
+                    yield chunk.choices[0].delta
+                usage = getattr(chunk, "usage", None) or usage
+        except openai.OpenAIError as e:
+            raise LLMError(f"LLM stream failed: {e}") from e
+        outcome = "ok"
+    except LLMError:
+        _counters["failed"] += 1
+        raise
+    finally:
+        admission.release()
+        # Spans cannot stay open across yields, so the stream is recorded when it ends.
+        record_span(
+            "llm.request",
+            started_at,
+            time.perf_counter() - started_at,
+            outcome,
+            stream=True,
+            **count_llm_usage(usage),
+        )
+    _latencies.append(time.perf_counter() - started_at)
+    _counters["succeeded"] += 1
+
+
+async def get_embeddings(texts, model):
+    """
+    Embeds `texts` with `model` under the same admission limit and retries as chat
+    requests, so query embeddings cannot pile up in the model server.
+    """
+    _counters["embedding_requests"] += 1
+    await _admit()
+    try:
+        with span("llm.embeddings", texts=len(texts)) as request_span:
+            response = await _with_retries(
+                lambda: config.aclient.embeddings.create(model=model, input=texts)
+            )
+            request_span.set(**count_llm_usage(getattr(response, "usage", None)))
+    except LLMError:
+        _counters["embedding_failed"] += 1
+        raise
+    finally:
+        admission.release()
+    return [item.embedding for item in response.data]
+
+
+def _percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(fraction * len(ordered)))], 4)
+
+
+def get_llm_stats():
+    """Request counts, retries, admission queue depth and recent latency percentiles."""
+    return {
+        **_counters,
+        "in_flight": admission.in_flight,
+        "queue_depth": admission.waiting,
+        "max_queue_depth_seen": admission.max_waiting_seen,
+        "rejected": admission.rejected,
+        "queue_timeouts": admission.queue_timeouts,
+        "max_concurrency": admission.max_concurrency,
+        "max_queue": admission.max_queue,
+        "latency_seconds": {
+            "p50": _percentile(_latencies, 0.5),
+            "p95": _percentile(_latencies, 0.95),
+            "p99": _percentile(_latencies, 0.99),
+        },
+        "queue_wait_seconds": {
+            "p50": _percentile(_queue_waits, 0.5),
+            "p95": _percentile(_queue_waits, 0.95),
+        },
+    }
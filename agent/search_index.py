@@ -0,0 +1,419 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from config import global_config as config
+
+
+# Columns mirrored from MySQL; everything the tool can return plus the change hash.
+INDEX_COLUMNS = (
+    "document_number",
+    "title",
+    "type",
+    "abstract",
+    "publication_date",
+    "agencies",
+    "president",
+    "document_url",
+    "content_hash",
+)
+# Characters with a meaning in FTS5 query syntax; stripped from user keywords.
+FTS_OPERATOR_CHARS = '+-<>()~*"@^:'
+SQLITE_MAX_PARAMS = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY,
+    document_number TEXT NOT NULL UNIQUE,
+    title TEXT,
+    type TEXT,
+    abstract TEXT,
+    publication_date TEXT,
+    agencies TEXT,
+    president TEXT,
+    document_url TEXT,
+    content_hash TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_documents_publication_date
+    ON documents (publication_date, id);
+CREATE TABLE IF NOT EXISTS document_agencies (
+    document_id INTEGER NOT NULL,
+    agency TEXT NOT NULL,
+    PRIMARY KEY (document_id, agency)
+) WITHOUT ROWID;
+CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5(
+    title, abstract, content='documents', content_rowid='id', prefix='2 3'
+);
+CREATE TRIGGER IF NOT EXISTS documents_fts_insert AFTER INSERT ON documents BEGIN
+    INSERT INTO documents_fts (rowid, title, abstract)
+    VALUES (new.id, new.title, new.abstract);
+END;
+CREATE TRIGGER IF NOT EXISTS documents_fts_delete AFTER DELETE ON documents BEGIN
+    INSERT INTO documents_fts (documents_fts, rowid, title, abstract)
+    VALUES ('delete', old.id, old.title, old.abstract);
+END;
+CREATE TRIGGER IF NOT EXISTS documents_fts_update AFTER UPDATE ON documents BEGIN
+    INSERT INTO documents_fts (documents_fts, rowid, title, abstract)
+    VALUES ('delete', old.id, old.title, old.abstract);
+    INSERT INTO documents_fts (rowid, title, abstract)
+    VALUES (new.id, new.title, new.abstract);
+END;
+"""
+
+
+def _fts_query(terms, search_mode):
+    """
+    FTS5 MATCH expression for the keywords: any term ranks ("natural"), or every
+    term required as a prefix ("boolean"), like the MySQL FULLTEXT modes.
+    """
+    terms = ['"' + term.replace('"', '""') + '"' for term in terms]
+    if search_mode == "boolean":
+        return " AND ".join(f"{term}*" for term in terms)
+    return " OR ".join(terms)
+
+
+def _build_filters(kwargs):
+    """
+    SQLite counterpart of tool_executor._build_filters. Returns
+    (from_sql, conditions, params, has_relevance).
+    """
+    from_sql = "documents d"
+    conditions = []
+    params = []
+    has_relevance = False
+
+    if kwargs.get("query_keywords"):
+        search_mode = (kwargs.get("search_mode") or config.SEARCH_MODE).lower()
+        like_terms = []
+        fts_terms = []
+        for kw in kwargs["query_keywords"].split():
+            if search_mode == "like":
+                like_terms.append(kw)
+                continue
+            # Short terms take the LIKE path, as they do with MySQL, so both
+            # backends match and rank the same way.
+            cleaned = kw.strip(FTS_OPERATOR_CHARS)
+            if len(cleaned) >= config.FULLTEXT_MIN_TOKEN_SIZE:
+                fts_terms.append(cleaned)
+            elif cleaned:
+                like_terms.append(cleaned)
+        if fts_terms:
+            from_sql = "documents_fts JOIN documents d ON d.id = documents_fts.rowid"
+            conditions.append("documents_fts MATCH ?")
+            params.append(_fts_query(fts_terms, search_mode))
+            has_relevance = True
+        for term in like_terms:
+            conditions.append("(d.title LIKE ? OR d.abstract LIKE ?)")
+            params.extend([f"%{term}%", f"%{term}%"])
+
+    if kwargs.get("publication_date_exact"):
+        conditions.append("d.publication_date = ?")
+        params.append(kwargs["publication_date_exact"])
+    else:
+        if kwargs.get("publication_date_start"):
+            conditions.append("d.publication_date >= ?")
+            params.append(kwargs["publication_date_start"])
+        if kwargs.get("publication_date_end"):
+            conditions.append("d.publication_date <= ?")
+            params.append(kwargs["publication_date_end"])
+
+    if kwargs.get("document_type"):
+        doc_types = [dt.strip() for dt in kwargs["document_type"].upper().split(",")]
+        conditions.append(f"UPPER(d.type) IN ({', '.join(['?'] * len(doc_types))})")
+        params.extend(doc_types)
+
+    if kwargs.get("president_name"):
+        conditions.append("d.president LIKE ?")
+        params.append(f"%{kwargs['president_name']}%")
+
+    if kwargs.get("agency_name"):
+        conditions.append(
+            "d.id IN (SELECT document_id FROM document_agencies WHERE agency LIKE ?)"
+        )
+        params.append(f"%{kwargs['agency_name']}%")
+
+    return from_sql, conditions, params, has_relevance
+
+
+def build_search_query(kwargs, cursor, result_fields):
+    """
+    Same contract as tool_executor.build_document_query, against the local index:
+    limit + 1 rows, keyset paging for date order, offset paging for relevance.
+    BM25 scores are negated so that, as with MySQL, higher means more relevant.
+    """
+    from_sql, conditions, params, has_relevance = _build_filters(kwargs)
+    by_relevance = has_relevance and not kwargs.get("sort_by_date")
+    sort_order = "ASC" if (kwargs.get("sort_by_date") or "").lower() == "asc" else "DESC"
+
+    if cursor and not by_relevance:
+        comparison = ">" if sort_order == "ASC" else "<"
+        conditions.append(
+            f"(d.publication_date {comparison} ?"
+            f" OR (d.publication_date = ? AND d.id {comparison} ?))"
+        )
+        params.extend(
+            [cursor["publication_date"], cursor["publication_date"], cursor["id"]]
+        )
+
+    fields = kwargs.get("fields") or result_fields
+    columns = ["d.id"] + [f"d.{f}" for f in result_fields if f in fields]
+    if "publication_date" not in fields:
+        columns.append("d.publication_date")
+    if has_relevance:
+        columns.append("-bm25(documents_fts) AS relevance")
+
+    query = f"SELECT {', '.join(columns)} FROM {from_sql}"
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    if by_relevance:
+        query += " ORDER BY relevance DESC, d.publication_date DESC, d.id DESC"
+    else:
+        query += f" ORDER BY d.publication_date {sort_order}, d.id {sort_order}"
+    query += " LIMIT ? OFFSET ?"
+    params.append(int(kwargs["limit"]) + 1)
+    params.append(int(cursor.get("offset", 0)) if by_relevance and cursor else 0)
+    return query, params
+
+
+def build_search_count_query(kwargs, count_cap):
+    from_sql, conditions, params, _ = _build_filters(kwargs)
+    query = f"SELECT 1 FROM {from_sql}"
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    return f"SELECT COUNT(*) FROM ({query} LIMIT ?)", params + [count_cap]
+
+
+class SqliteSearchIndex:
+    """
+    Embedded FTS5 copy of the documents the tool searches. The pipeline upserts
+    each loaded batch (skipping rows whose content_hash is unchanged); searches
+    run on per-thread read connections, so they never wait on a pipeline write.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+        self._counters = {
+            "searches": 0,
+            "search_seconds": 0.0,
+            "upserted_batches": 0,
+            "inserted": 0,
+            "updated": 0,
+            "unchanged": 0,
+        }
+
+    def _reader(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(
+                f"file:{self.path}?mode=ro", uri=True, check_same_thread=False
+            )
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    # --- Writing ---
+
+    def upsert_documents(self, documents):
+        """
+        Inserts new documents and rewrites changed ones (by content_hash) in one
+        transaction. Returns {"inserted", "updated", "unchanged"}.
+        """
+        rows = {}
+        for doc in documents:
+            if doc.get("document_number"):
+                rows[doc["document_number"]] = tuple(
+                    doc.get(column) for column in INDEX_COLUMNS
+                )
+        counts = {"inserted": 0, "updated": 0, "unchanged": 0}
+        if not rows:
+            return counts
+
+        placeholders = ", ".join(["?"] * len(INDEX_COLUMNS))
+        assignments = ", ".join(
+            f"{column} = excluded.{column}" for column in INDEX_COLUMNS[1:]
+        )
+        with self._lock:
+            existing = {}
+            numbers = list(rows)
+            for start in range(0, len(numbers), SQLITE_MAX_PARAMS):
+                chunk = numbers[start : start + SQLITE_MAX_PARAMS]
+                existing.update(
+                    self._conn.execute(
+                        "SELECT document_number, content_hash FROM documents"
+                        f" WHERE document_number IN ({', '.join(['?'] * len(chunk))})",
+                        chunk,
+                    ).fetchall()
+                )
+            hash_position = INDEX_COLUMNS.index("content_hash")
+            to_write = []
+            for number, row in rows.items():
+                if number not in existing:
+                    counts["inserted"] += 1
+                elif existing[number] != row[hash_position] or row[hash_position] is None:
+                    counts["updated"] += 1
+                else:
+                    counts["unchanged"] += 1
+                    continue
+                to_write.append(row)
+
+            if to_write:
+                with self._conn:
+                    self._conn.executemany(
+                        f"INSERT INTO documents ({', '.join(INDEX_COLUMNS)})"
+                        f" VALUES ({placeholders})"
+                        f" ON CONFLICT(document_number) DO UPDATE SET {assignments}",
+                        to_write,
+                    )
+                    self._sync_agencies([row[0] for row in to_write])
+
+            self._counters["upserted_batches"] += 1
+            for key, value in counts.items():
+                self._counters[key] += value
+        return counts
+
+    def _sync_agencies(self, document_numbers):
+        for start in range(0, len(document_numbers), SQLITE_MAX_PARAMS):
+            chunk = document_numbers[start : start + SQLITE_MAX_PARAMS]
+            id_rows = self._conn.execute(
+                "SELECT id, agencies FROM documents"
+                f" WHERE document_number IN ({', '.join(['?'] * len(chunk))})",
+                chunk,
+            ).fetchall()
+            self._conn.executemany(
+                "DELETE FROM document_agencies WHERE document_id = ?",
+                [(document_id,) for document_id, _ in id_rows],
+            )
+            links = []
+            for document_id, agencies in id_rows:
+                try:
+                    names = json.loads(agencies) if agencies else []
+                except json.JSONDecodeError:
+                    names = [agencies]
+                links.extend((document_id, name) for name in set(names) if name)
+            self._conn.executemany(
+                "INSERT INTO document_agencies (document_id, agency) VALUES (?, ?)",
+                links,
+            )
+
+    def rebuild_from_mysql(self, batch_size=1000):
+        """Replaces the index contents with the MySQL documents table, streamed in batches."""
+        import pymysql
+
+        from data_pipeline.db_loader import get_db_pool
+
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM document_agencies")
+            self._conn.execute("DELETE FROM documents")
+        started_at = time.perf_counter()
+        total = 0
+        connection = get_db_pool()
+        try:
+            with connection.cursor(pymysql.cursors.SSDictCursor) as cur:
+                cur.execute(f"SELECT {', '.join(INDEX_COLUMNS)} FROM documents")
+                while True:
+                    rows = cur.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    for row in rows:
+                        if row.get("publication_date") is not None:
+                            row["publication_date"] = str(row["publication_date"])
+                    self.upsert_documents(rows)
+                    total += len(rows)
+        finally:
+            connection.close()
+        with self._lock:
+            self._conn.execute("INSERT INTO documents_fts (documents_fts) VALUES ('optimize')")
+            self._conn.commit()
+        print(
+            f"Search index rebuilt with {total} documents in "
+            f"{time.perf_counter() - started_at:.1f}s."
+        )
+        return total
+
+    # --- Reading ---
+
+    def document_count(self):
+        return self._reader().execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+    def fetch(self, arguments, cursor, result_fields, count_cap):
+        """
+        Runs a normalized tool query. Returns (rows, total) where total is None if
+        the cursor already carries it or nothing matched.
+        """
+        started_at = time.perf_counter()
+        conn = self._reader()
+        query, params = build_search_query(arguments, cursor, result_fields)
+        rows = [dict(row) for row in conn.execute(query, params).fetchall()]
+        total = cursor.get("total")
+        if total is None and rows:
+            count_query, count_params = build_search_count_query(arguments, count_cap)
+            total = conn.execute(count_query, count_params).fetchone()[0]
+        self._counters["searches"] += 1
+        self._counters["search_seconds"] += time.perf_counter() - started_at
+        return rows, total
+
+    def stats(self):
+        stats = dict(self._counters)
+        searches = stats.pop("searches")
+        search_seconds = stats.pop("search_seconds")
+        stats.update(
+            {
+                "path": self.path,
+                "documents": self.document_count(),
+                "size_bytes": sum(
+                    os.path.getsize(path)
+                    for path in (self.path, f"{self.path}-wal")
+                    if os.path.exists(path)
+                ),
+                "searches": searches,
+                "avg_search_ms": (
+                    round(search_seconds * 1000 / searches, 3) if searches else None
+                ),
+            }
+        )
+        return stats
+
+
+_search_index = None
+_search_index_lock = threading.Lock()
+
+
+def get_search_index():
+    """Returns the process-wide index at SEARCH_INDEX_PATH, opening it on first use."""
+    global _search_index
+    with _search_index_lock:
+        if _search_index is None:
+            _search_index = SqliteSearchIndex(config.SEARCH_INDEX_PATH)
+    return _search_index
+
+
+def get_search_index_stats():
+    stats = {
+        "backend": config.SEARCH_BACKEND,
+        "index_enabled": config.SEARCH_INDEX_ENABLED,
+    }
+    if config.SEARCH_INDEX_ENABLED:
+        stats["index"] = get_search_index().stats()
+    return stats
+
+
+if __name__ == "__main__":
+    import sys
+
+    # Initial build (or full refresh) from MySQL: `python -m agent.search_index --rebuild`.
+    index = get_search_index()
+    if "--rebuild" in sys.argv[1:]:
+        index.rebuild_from_mysql()
+    print(json.dumps(index.stats(), indent=2))
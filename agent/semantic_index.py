@@ -0,0 +1,343 @@
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+from agent.llm_client import get_embeddings
+from config import global_config as config
+
+
+VECTORS_FILE = "vectors.f32"
+SIDECAR_FILE = "documents.json"
+# Rows scored per matrix-vector product; bounds the memory a full scan touches at once.
+SCORE_BLOCK_ROWS = 65536
+
+
+def embedding_text(document):
+    """The text a document is embedded from: its title and abstract."""
+    parts = [document.get("title") or "", document.get("abstract") or ""]
+    return "\n\n".join(part.strip() for part in parts if part and part.strip())
+
+
+def _text_hash(text):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def _normalize(vectors):
+    """L2-normalizes rows, so a dot product is the cosine similarity."""
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class SemanticIndex:
+    """
+    Embeddings of document titles and abstracts. vectors.f32 is a raw float32
+    matrix (one L2-normalized row per document) that searches memory-map on
+    first use; documents.json is the sidecar mapping rows to document numbers
+    and the hash of the text each row was embedded from, so unchanged documents
+    are never re-embedded. Changed documents are rewritten in place, new ones
+    appended. The sidecar is replaced atomically after the vectors are written,
+    so readers only ever map rows it lists. One writer at a time.
+    """
+
+    def __init__(self, directory, model):
+        self.directory = directory
+        self.model = model
+        self.vectors_path = os.path.join(directory, VECTORS_FILE)
+        self.sidecar_path = os.path.join(directory, SIDECAR_FILE)
+        self._write_lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._loaded = {"mtime": None, "matrix": None, "rows": {}, "numbers": []}
+        self._counters = {
+            "searches": 0,
+            "search_seconds": 0.0,
+            "embedded": 0,
+            "unchanged": 0,
+            "embedding_errors": 0,
+        }
+
+    def _read_sidecar(self):
+        if not os.path.exists(self.sidecar_path):
+            return {
+                "model": self.model,
+                "dim": None,
+                "document_numbers": [],
+                "text_hashes": [],
+            }
+        with open(self.sidecar_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _write_sidecar(self, sidecar):
+        tmp_path = f"{self.sidecar_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(sidecar, f, separators=(",", ":"))
+        os.replace(tmp_path, self.sidecar_path)
+
+    # --- Writing ---
+
+    def update(self, documents, embed_batch, batch_size=None):
+        """
+        Embeds new documents and documents whose title/abstract changed, in
+        batches of `batch_size` through `embed_batch(texts) -> vectors`. A failed
+        batch is skipped and counted; its documents are retried the next time
+        they are seen. Returns {"embedded", "unchanged", "failed"}.
+        """
+        batch_size = batch_size or config.SEMANTIC_EMBEDDING_BATCH_SIZE
+        counts = {"embedded": 0, "unchanged": 0, "failed": 0}
+        with self._write_lock:
+            os.makedirs(self.directory, exist_ok=True)
+            sidecar = self._read_sidecar()
+            if sidecar["model"] != self.model:
+                raise ValueError(
+                    f"{self.directory} holds {sidecar['model']} embeddings; "
+                    f"delete it to re-embed with {self.model}."
+                )
+            numbers = sidecar["document_numbers"]
+            hashes = sidecar["text_hashes"]
+            rows = {number: row for row, number in enumerate(numbers)}
+
+            pending = {}
+            for document in documents:
+                text = embedding_text(document)
+                number = document.get("document_number")
+                if not number or not text:
+                    continue
+                text_hash = _text_hash(text)
+                row = rows.get(number)
+                if row is not None and hashes[row] == text_hash:
+                    counts["unchanged"] += 1
+                    continue
+                pending[number] = (text, text_hash)
+
+            # Rows past the sidecar's count were left by an interrupted write.
+            if sidecar["dim"] and os.path.exists(self.vectors_path):
+                os.truncate(self.vectors_path, len(numbers) * sidecar["dim"] * 4)
+
+            items = list(pending.items())
+            for start in range(0, len(items), batch_size):
+                batch = items[start : start + batch_size]
+                try:
+                    vectors = np.asarray(
+                        embed_batch([text for _, (text, _) in batch]), dtype=np.float32
+                    )
+                except Exception as e:
+                    counts["failed"] += len(batch)
+                    print(f"Embedding batch of {len(batch)} documents failed: {e}")
+                    continue
+                vectors = _normalize(vectors)
+                if sidecar["dim"] is None:
+                    sidecar["dim"] = int(vectors.shape[1])
+                elif vectors.shape[1] != sidecar["dim"]:
+                    raise ValueError(
+                        f"Embedding size changed from {sidecar['dim']} to {vectors.shape[1]}."
+                    )
+
+                row_bytes = sidecar["dim"] * 4
+                mode = "r+b" if os.path.exists(self.vectors_path) else "wb"
+                with open(self.vectors_path, mode) as f:
+                    for (number, (_, text_hash)), vector in zip(batch, vectors):
+                        row = rows.get(number)
+                        if row is None:
+                            row = len(numbers)
+                            rows[number] = row
+                            numbers.append(number)
+                            hashes.append(text_hash)
+                        else:
+                            hashes[row] = text_hash
+                        f.seek(row * row_bytes)
+                        f.write(vector.tobytes())
+                    f.flush()
+                    os.fsync(f.fileno())
+                counts["embedded"] += len(batch)
+
+            if counts["embedded"]:
+                self._write_sidecar(sidecar)
+            for key in ("embedded", "unchanged"):
+                self._counters[key] += counts[key]
+            self._counters["embedding_errors"] += counts["failed"]
+        return counts
+
+    def backfill_from_mysql(self, embed_batch, fetch_size=10000):
+        """Embeds every MySQL document missing from the index (or changed since)."""
+        import pymysql
+
+        from data_pipeline.db_loader import get_db_pool
+
+        started_at = time.perf_counter()
+        totals = {"embedded": 0, "unchanged": 0, "failed": 0}
+        connection = get_db_pool()
+        try:
+            with connection.cursor(pymysql.cursors.SSDictCursor) as cur:
+                cur.execute("SELECT document_number, title, abstract FROM documents")
+                while True:
+                    rows = cur.fetchmany(fetch_size)
+                    if not rows:
+                        break
+                    for key, value in self.update(rows, embed_batch).items():
+                        totals[key] += value
+        finally:
+            connection.close()
+        print(
+            f"Semantic index backfill: {totals['embedded']} embedded, "
+            f"{totals['unchanged']} unchanged, {totals['failed']} failed in "
+            f"{time.perf_counter() - started_at:.1f}s."
+        )
+        return totals
+
+    # --- Reading ---
+
+    def _ensure_loaded(self):
+        """Maps the matrix on first use and again whenever the sidecar is replaced."""
+        try:
+            mtime = os.path.getmtime(self.sidecar_path)
+        except FileNotFoundError:
+            return self._loaded
+        if mtime == self._loaded["mtime"]:
+            return self._loaded
+        with self._load_lock:
+            if mtime != self._loaded["mtime"]:
+                sidecar = self._read_sidecar()
+                numbers = sidecar["document_numbers"]
+                matrix = None
+                if numbers:
+                    matrix = np.memmap(
+                        self.vectors_path,
+                        dtype=np.float32,
+                        mode="r",
+                        shape=(len(numbers), sidecar["dim"]),
+                    )
+                self._loaded = {
+                    "mtime": mtime,
+                    "matrix": matrix,
+                    "rows": {number: row for row, number in enumerate(numbers)},
+                    "numbers": numbers,
+                }
+        return self._loaded
+
+    def search(self, query_vector, limit, document_numbers=None):
+        """
+        Returns up to `limit` (document_number, cosine similarity) pairs, best
+        first. `document_numbers` restricts the candidates, e.g. to the rows
+        matching the structured filters.
+        """
+        started_at = time.perf_counter()
+        loaded = self._ensure_loaded()
+        matrix = loaded["matrix"]
+        if matrix is None:
+            return []
+        query = _normalize(np.asarray(query_vector, dtype=np.float32))
+
+        if document_numbers is not None:
+            candidates = np.fromiter(
+                sorted(
+                    loaded["rows"][number]
+                    for number in document_numbers
+                    if number in loaded["rows"]
+                ),
+                dtype=np.int64,
+            )
+            scores = np.empty(len(candidates), dtype=np.float32)
+            for start in range(0, len(candidates), SCORE_BLOCK_ROWS):
+                block = candidates[start : start + SCORE_BLOCK_ROWS]
+                scores[start : start + len(block)] = matrix[block] @ query
+        else:
+            candidates = None
+            scores = np.empty(matrix.shape[0], dtype=np.float32)
+            for start in range(0, matrix.shape[0], SCORE_BLOCK_ROWS):
+                block = matrix[start : start + SCORE_BLOCK_ROWS]
+                scores[start : start + block.shape[0]] = block @ query
+
+        hits = []
+        k = min(limit, len(scores))
+        if k:
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top], kind="stable")]
+            for position in top:
+                row = candidates[position] if candidates is not None else position
+                hits.append((loaded["numbers"][row], round(float(scores[position]), 4)))
+        self._counters["searches"] += 1
+        self._counters["search_seconds"] += time.perf_counter() - started_at
+        return hits
+
+    def stats(self):
+        stats = dict(self._counters)
+        searches = stats.pop("searches")
+        search_seconds = stats.pop("search_seconds")
+        matrix = self._loaded["matrix"]
+        stats.update(
+            {
+                "model": self.model,
+                # Known once a search has mapped the matrix; the sidecar is not read here.
+                "dim": matrix.shape[1] if matrix is not None else None,
+                "documents": matrix.shape[0] if matrix is not None else None,
+                "size_bytes": (
+                    os.path.getsize(self.vectors_path)
+                    if os.path.exists(self.vectors_path)
+                    else 0
+                ),
+                "loaded": self._loaded["matrix"] is not None,
+                "searches": searches,
+                "avg_search_ms": (
+                    round(search_seconds * 1000 / searches, 3) if searches else None
+                ),
+            }
+        )
+        return stats
+
+
+def build_sync_embedder(loop):
+    """
+    Blocking embed_batch for a worker thread. Each batch runs get_embeddings on
+    `loop` (the app's event loop), so pipeline and backfill embeddings share the
+    chat requests' admission limit, retries, span and counters, and cannot
+    saturate the model server while /chat is being served.
+    """
+
+    def embed_batch(texts):
+        return asyncio.run_coroutine_threadsafe(
+            get_embeddings(texts, config.SEMANTIC_EMBEDDING_MODEL), loop
+        ).result()
+
+    return embed_batch
+
+
+_semantic_index = None
+_semantic_index_lock = threading.Lock()
+
+
+def get_semantic_index():
+    """Returns the process-wide index; the matrix itself is mapped on the first search."""
+    global _semantic_index
+    with _semantic_index_lock:
+        if _semantic_index is None:
+            _semantic_index = SemanticIndex(
+                config.SEMANTIC_INDEX_DIR, config.SEMANTIC_EMBEDDING_MODEL
+            )
+    return _semantic_index
+
+
+def get_semantic_index_stats():
+    stats = {"enabled": config.SEMANTIC_SEARCH_ENABLED}
+    if config.SEMANTIC_SEARCH_ENABLED:
+        stats["index"] = get_semantic_index().stats()
+    return stats
+
+
+if __name__ == "__main__":
+    import sys
+
+    # Embeds documents loaded before semantic search was enabled:
+    # `python -m agent.semantic_index --backfill`.
+    async def backfill():
+        embed_batch = build_sync_embedder(asyncio.get_running_loop())
+        await asyncio.to_thread(index.backfill_from_mysql, embed_batch)
+
+    index = get_semantic_index()
+    if "--backfill" in sys.argv[1:]:
+        asyncio.run(backfill())
+    print(json.dumps(index.stats(), indent=2))
@@ -0,0 +1,149 @@
+import json
+import sqlite3
+import threading
+import time
+import uuid
+
+from collections import OrderedDict
+
+from config import global_config as config
+
+
+def new_session_id():
+    return uuid.uuid4().hex
+
+
+class InMemorySessionStore:
+    """LRU of conversation histories with a per-session idle TTL."""
+
+    def __init__(self, max_sessions, ttl_seconds, max_messages):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.max_messages = max_messages
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id):
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return None
+            updated_at, history = entry
+            if time.monotonic() - updated_at > self.ttl_seconds:
+                del self._sessions[session_id]
+                return None
+            self._sessions.move_to_end(session_id)
+            return list(history)
+
+    def save(self, session_id, history):
+        with self._lock:
+            self._sessions[session_id] = (
+                time.monotonic(),
+                list(history[-self.max_messages :]),
+            )
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+    def delete(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def __len__(self):
+        return len(self._sessions)
+
+
+class SqliteSessionStore:
+    """Local SQLite-backed store, so sessions survive an API restart."""
+
+    def __init__(self, path, max_sessions, ttl_seconds, max_messages):
+        self.path = path
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.max_messages = max_messages
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chat_sessions ("
+            " session_id TEXT PRIMARY KEY,"
+            " history TEXT NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_chat_sessions_updated_at"
+            " ON chat_sessions (updated_at)"
+        )
+        self._conn.commit()
+
+    def get(self, session_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT history, updated_at FROM chat_sessions WHERE session_id = ?",
+                (session_id,),
+            ).fetchone()
+            if row is None:
+                return None
+            if time.time() - row[1] > self.ttl_seconds:
+                self._conn.execute(
+                    "DELETE FROM chat_sessions WHERE session_id = ?", (session_id,)
+                )
+                self._conn.commit()
+                return None
+            return json.loads(row[0])
+
+    def save(self, session_id, history):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO chat_sessions (session_id, history, updated_at) VALUES (?, ?, ?)"
+                " ON CONFLICT(session_id) DO UPDATE SET history = excluded.history,"
+                " updated_at = excluded.updated_at",
+                (session_id, json.dumps(history[-self.max_messages :]), now),
+            )
+            # Expire idle sessions, then keep only the most recently used ones.
+            self._conn.execute(
+                "DELETE FROM chat_sessions WHERE updated_at < ?",
+                (now - self.ttl_seconds,),
+            )
+            self._conn.execute(
+                "DELETE FROM chat_sessions WHERE session_id NOT IN ("
+                " SELECT session_id FROM chat_sessions ORDER BY updated_at DESC LIMIT ?)",
+                (self.max_sessions,),
+            )
+            self._conn.commit()
+
+    def delete(self, session_id):
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM chat_sessions WHERE session_id = ?", (session_id,)
+            )
+            self._conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM chat_sessions").fetchone()[
+                0
+            ]
+
+
+_session_store = None
+
+
+def get_session_store():
+    """Returns the process-wide session store selected by SESSION_STORE."""
+    global _session_store
+    if _session_store is None:
+        if config.SESSION_STORE == "sqlite":
+            _session_store = SqliteSessionStore(
+                config.SESSION_SQLITE_PATH,
+                config.SESSION_MAX_COUNT,
+                config.SESSION_TTL_SECONDS,
+                config.SESSION_MAX_STORED_MESSAGES,
+            )
+        else:
+            _session_store = InMemorySessionStore(
+                config.SESSION_MAX_COUNT,
+                config.SESSION_TTL_SECONDS,
+                config.SESSION_MAX_STORED_MESSAGES,
+            )
+    return _session_store
@@ -1,16 +1,430 @@
+import asyncio
 import aiomysql
 import json
+import re
+
+from datetime import datetime
+
+from agent.cache import OpenAIEmbedder, VersionedLRUCache
+from agent.cursors import InvalidCursor, decode_cursor, encode_cursor
+from agent.db_pool import acquire_db_connection
+from agent.search_index import get_search_index
+from agent.semantic_index import get_semantic_index
 from config import global_config as config
+from telemetry import span
+
+
+SEARCH_MODES = ("natural", "boolean", "like")
+FULLTEXT_MATCH = "MATCH(title, abstract) AGAINST (%s IN {mode})"
+# Characters with a special meaning in BOOLEAN MODE; stripped from user keywords.
+BOOLEAN_OPERATOR_CHARS = '+-<>()~*"@'
+
+
+DATE_ARGUMENTS = (
+    "publication_date_exact",
+    "publication_date_start",
+    "publication_date_end",
+)
+DATE_INPUT_FORMATS = ("%Y-%m-%d", "%Y/%m/%d", "%m/%d/%Y", "%Y%m%d")
+
+# Columns the tool can return; `fields` selects a subset to save prompt tokens.
+RESULT_FIELDS = (
+    "document_number",
+    "title",
+    "type",
+    "abstract",
+    "publication_date",
+    "agencies",
+    "president",
+    "document_url",
+)
+MAX_RESULTS = 25
+TOOL_PARAMETERS = config.FEDERAL_REGISTRY_TOOL_SCHEMA[0]["function"]["parameters"]
+SEMANTIC_TOOL_PARAMETERS = config.SEMANTIC_SEARCH_TOOL_SCHEMA["function"]["parameters"]
+_ISO_DATE = re.compile(r"\d{4}-\d{2}-\d{2}")
+
+_validation_counters = {"calls": 0, "invalid_calls": 0, "invalid_arguments": {}}
+
+tool_result_cache = VersionedLRUCache(
+    config.TOOL_CACHE_MAX_ENTRIES, config.TOOL_CACHE_TTL_SECONDS
+)
+query_embedder = OpenAIEmbedder(config.SEMANTIC_EMBEDDING_MODEL)
+
+
+def _resolve_date(value):
+    """YYYY-MM-DD for a real calendar date in any DATE_INPUT_FORMATS, else None."""
+    value = str(value).strip()
+    for date_format in DATE_INPUT_FORMATS:
+        try:
+            return datetime.strptime(value, date_format).date().isoformat()
+        except ValueError:
+            continue
+    return None
+
+
+def normalize_tool_arguments(kwargs):
+    """
+    Canonical form of the tool arguments: keywords de-duplicated, case-folded and
+    sorted, dates resolved to YYYY-MM-DD, limit clamped, empty values dropped.
+    Equivalent LLM calls therefore produce the same SQL and the same cache key.
+    """
+    normalized = {}
+
+    if kwargs.get("query_keywords"):
+        keywords = sorted({kw.casefold() for kw in str(kwargs["query_keywords"]).split()})
+        if keywords:
+            normalized["query_keywords"] = " ".join(keywords)
+            search_mode = str(kwargs.get("search_mode") or config.SEARCH_MODE).lower()
+            normalized["search_mode"] = (
+                search_mode if search_mode in SEARCH_MODES else config.SEARCH_MODE
+            )
+
+    if kwargs.get("publication_date_exact"):
+        normalized["publication_date_exact"] = _resolve_date(
+            kwargs["publication_date_exact"]
+        )
+    else:
+        for name in DATE_ARGUMENTS[1:]:
+            if kwargs.get(name):
+                normalized[name] = _resolve_date(kwargs[name])
+
+    if kwargs.get("document_type"):
+        document_type = kwargs["document_type"]
+        if isinstance(document_type, list):
+            document_type = ",".join(str(dt) for dt in document_type)
+        doc_types = sorted(
+            {dt.strip() for dt in str(document_type).upper().split(",")} - {""}
+        )
+        if doc_types:
+            normalized["document_type"] = ",".join(doc_types)
+
+    for name in ("president_name", "agency_name"):
+        if kwargs.get(name) and str(kwargs[name]).strip():
+            normalized[name] = str(kwargs[name]).strip().casefold()
+
+    if kwargs.get("sort_by_date"):
+        normalized["sort_by_date"] = str(kwargs["sort_by_date"]).lower()
+
+    try:
+        limit = int(kwargs.get("limit", 5))
+    except (TypeError, ValueError):
+        limit = 5
+    normalized["limit"] = min(max(1, limit), MAX_RESULTS)
+
+    fields = kwargs.get("fields")
+    if fields:
+        if isinstance(fields, str):
+            fields = fields.split(",")
+        selected = {str(f).strip().lower() for f in fields} & set(RESULT_FIELDS)
+        # document_number always comes back so documents can be referenced later.
+        selected.add("document_number")
+        if selected != set(RESULT_FIELDS):
+            normalized["fields"] = [f for f in RESULT_FIELDS if f in selected]
+
+    if kwargs.get("cursor"):
+        normalized["cursor"] = str(kwargs["cursor"]).strip()
+
+    return normalized
+
+
+def _check_value(value, spec):
+    """Returns what is wrong with `value` under the JSON-schema `spec`, or None."""
+    expected_type = spec.get("type")
+    if expected_type == "array":
+        # A comma-separated string is accepted for list arguments.
+        items = value.split(",") if isinstance(value, str) else value
+        if not isinstance(items, list):
+            return "must be a list"
+        for item in items:
+            if isinstance(item, str):
+                item = item.strip()
+            problem = _check_value(item, spec["items"])
+            if problem:
+                return f"item {item!r} {problem}"
+        return None
+
+    if expected_type == "integer":
+        is_digit_string = isinstance(value, str) and value.strip().isdigit()
+        if isinstance(value, bool) or not (isinstance(value, int) or is_digit_string):
+            return "must be an integer"
+        return None  # Out-of-range limits are clamped rather than rejected.
+
+    if not isinstance(value, str):
+        return "must be a string"
+    if "enum" in spec and value.casefold() not in {
+        option.casefold() for option in spec["enum"]
+    }:
+        return f"must be one of {spec['enum']}"
+    if spec.get("format") == "date" and _resolve_date(value) is None:
+        if _ISO_DATE.fullmatch(value.strip()):
+            return "must be a valid calendar date"
+        return "must be a date in YYYY-MM-DD format"
+    return None
+
+
+def validate_tool_arguments(kwargs, parameters=None):
+    """
+    Checks the LLM's arguments against the tool's JSON schema. Returns a list of
+    {"argument", "error"} problems, empty when the call is valid. Empty values
+    count as omitted.
+    """
+    parameters = parameters or TOOL_PARAMETERS
+    properties = parameters["properties"]
+    problems = []
+    for name, value in kwargs.items():
+        spec = properties.get(name)
+        if spec is None:
+            problems.append(
+                {
+                    "argument": name,
+                    "error": f"unknown argument; valid arguments are {sorted(properties)}",
+                }
+            )
+            continue
+        if value is None or value == "" or value == []:
+            continue
+        problem = _check_value(value, spec)
+        if problem:
+            problems.append({"argument": name, "error": problem})
+
+    for name in parameters.get("required", []):
+        if kwargs.get(name) in (None, "", []):
+            problems.append({"argument": name, "error": "is required"})
+
+    start = kwargs.get("publication_date_start")
+    end = kwargs.get("publication_date_end")
+    if start and end and not problems:
+        if _resolve_date(start) > _resolve_date(end):
+            problems.append(
+                {
+                    "argument": "publication_date_start",
+                    "error": "must not be after publication_date_end",
+                }
+            )
+    return problems
+
+
+def get_tool_validation_stats():
+    stats = dict(_validation_counters)
+    stats["invalid_arguments"] = dict(_validation_counters["invalid_arguments"])
+    stats["invalid_rate"] = (
+        round(stats["invalid_calls"] / stats["calls"], 4) if stats["calls"] else 0.0
+    )
+    return stats
+
+
+def get_tool_cache_stats():
+    return tool_result_cache.stats()
+
+
+def _like_condition(keyword, params):
+    params.extend([f"%{keyword}%", f"%{keyword}%"])
+    return "(title LIKE %s OR abstract LIKE %s)"
+
+
+def _build_keyword_filter(query_keywords, search_mode):
+    """
+    Builds the keyword part of the query.
+    Returns (conditions, params, relevance_sql, relevance_params). Terms shorter than
+    the FULLTEXT minimum token size are never indexed, so they fall back to LIKE.
+    """
+    conditions = []
+    params = []
+    relevance_sql = None
+    relevance_params = []
+
+    keywords = query_keywords.split()
+    if search_mode == "like":
+        for kw in keywords:
+            conditions.append(_like_condition(kw, params))
+        return conditions, params, relevance_sql, relevance_params
+
+    fulltext_terms = []
+    for kw in keywords:
+        cleaned = kw.strip(BOOLEAN_OPERATOR_CHARS)
+        if len(cleaned) >= config.FULLTEXT_MIN_TOKEN_SIZE:
+            fulltext_terms.append(cleaned)
+        elif cleaned:
+            conditions.append(_like_condition(cleaned, params))
+
+    if fulltext_terms:
+        if search_mode == "boolean":
+            against = " ".join(f"+{term}*" for term in fulltext_terms)
+            match_sql = FULLTEXT_MATCH.format(mode="BOOLEAN MODE")
+        else:
+            against = " ".join(fulltext_terms)
+            match_sql = FULLTEXT_MATCH.format(mode="NATURAL LANGUAGE MODE")
+        conditions.insert(0, match_sql)
+        params.insert(0, against)
+        relevance_sql = match_sql
+        relevance_params = [against]
+
+    return conditions, params, relevance_sql, relevance_params
+
+
+def _build_filters(kwargs):
+    """Returns (conditions, params, relevance_sql, relevance_params) for the tool arguments."""
+    conditions = []
+    params = []
+    relevance_sql = None
+    relevance_params = []
+
+    if "query_keywords" in kwargs and kwargs["query_keywords"]:
+        search_mode = (kwargs.get("search_mode") or config.SEARCH_MODE).lower()
+        if search_mode not in SEARCH_MODES:
+            search_mode = config.SEARCH_MODE
+        keyword_conditions, keyword_params, relevance_sql, relevance_params = (
+            _build_keyword_filter(kwargs["query_keywords"], search_mode)
+        )
+        if keyword_conditions:
+            conditions.append(f"({' AND '.join(keyword_conditions)})")
+            params.extend(keyword_params)
+
+    if "publication_date_exact" in kwargs and kwargs["publication_date_exact"]:
+        conditions.append("publication_date = %s")
+        params.append(kwargs["publication_date_exact"])
+    elif (
+        "publication_date_start" in kwargs
+        and "publication_date_end" in kwargs
+        and kwargs["publication_date_start"]
+        and kwargs["publication_date_end"]
+    ):
+        conditions.append("publication_date BETWEEN %s AND %s")
+        params.extend(
+            [
+                kwargs["publication_date_start"],
+                kwargs["publication_date_end"],
+            ]
+        )
+    elif "publication_date_start" in kwargs and kwargs["publication_date_start"]:
+        conditions.append("publication_date >= %s")
+        params.append(kwargs["publication_date_start"])
+    elif "publication_date_end" in kwargs and kwargs["publication_date_end"]:
+        conditions.append("publication_date <= %s")
+        params.append(kwargs["publication_date_end"])
+
+    if "document_type" in kwargs and kwargs["document_type"]:
+        doc_types = [dt.strip() for dt in kwargs["document_type"].upper().split(",")]
+        if doc_types:
+            type_placeholders = ", ".join(["%s"] * len(doc_types))
+            conditions.append(f"UPPER(type) IN ({type_placeholders})")
+            params.extend(doc_types)
+
+    if "president_name" in kwargs and kwargs["president_name"]:
+        conditions.append("president LIKE %s")
+        params.append(f"%{kwargs['president_name']}%")
+
+    if "agency_name" in kwargs and kwargs["agency_name"]:
+        # The agencies table is small; the join table is keyed on agency_id.
+        conditions.append(
+            "id IN (SELECT da.document_id FROM document_agencies da"
+            " JOIN agencies a ON a.id = da.agency_id WHERE a.name LIKE %s)"
+        )
+        params.append(f"%{kwargs['agency_name']}%")
 
+    return conditions, params, relevance_sql, relevance_params
 
-async def get_db_pool_tool():
-    return await aiomysql.create_pool(
-        host=config.DB_HOST,
-        port=config.DB_PORT,
-        user=config.DB_USER,
-        password=config.DB_PASSWORD,
-        db=config.DB_NAME,
-        autocommit=True,
+
+def _orders_by_relevance(kwargs, relevance_sql):
+    # Relevance ranking applies unless the caller explicitly asked for a date order.
+    return bool(relevance_sql) and not kwargs.get("sort_by_date")
+
+
+def build_document_query(kwargs, table="documents"):
+    """
+    Translates the tool arguments into a parameterized SELECT. Returns (sql, params).
+    Fetches one row more than `limit` so the caller knows whether a next page exists.
+    Date-ordered pages continue from the cursor's (publication_date, id) key; the
+    FULLTEXT relevance order cannot use an index anyway, so it pages by offset.
+    """
+    conditions, params, relevance_sql, relevance_params = _build_filters(kwargs)
+    cursor = decode_cursor(kwargs["cursor"]) if kwargs.get("cursor") else {}
+    by_relevance = _orders_by_relevance(kwargs, relevance_sql)
+    sort_order = "ASC" if (kwargs.get("sort_by_date") or "").lower() == "asc" else "DESC"
+
+    if cursor and not by_relevance:
+        if "publication_date" not in cursor or "id" not in cursor:
+            raise InvalidCursor("Cursor does not match this query's sort order.")
+        comparison = ">" if sort_order == "ASC" else "<"
+        conditions.append(
+            f"(publication_date {comparison} %s"
+            f" OR (publication_date = %s AND id {comparison} %s))"
+        )
+        params.extend(
+            [cursor["publication_date"], cursor["publication_date"], cursor["id"]]
+        )
+
+    fields = kwargs.get("fields") or RESULT_FIELDS
+    columns = ", ".join(["id"] + [f for f in RESULT_FIELDS if f in fields])
+    if "publication_date" not in fields:
+        columns += ", publication_date"
+    select_params = []
+    if relevance_sql:
+        columns += f", {relevance_sql} AS relevance"
+        select_params = list(relevance_params)
+
+    query = f"SELECT {columns} FROM {table}"
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+
+    if by_relevance:
+        query += " ORDER BY relevance DESC, publication_date DESC, id DESC"
+    else:
+        query += f" ORDER BY publication_date {sort_order}, id {sort_order}"
+
+    limit = int(kwargs.get("limit", 5))
+    limit = min(max(1, limit), MAX_RESULTS)
+    query += " LIMIT %s"
+    params.append(limit + 1)
+    if by_relevance and cursor:
+        query += " OFFSET %s"
+        params.append(int(cursor.get("offset", 0)))
+
+    return query, select_params + params
+
+
+def build_count_query(kwargs, table="documents"):
+    """
+    Counts matches up to TOOL_MATCH_COUNT_CAP. The inner LIMIT stops the scan at
+    the cap, so broad queries stay cheap and are reported as "at least N".
+    """
+    conditions, params, _, _ = _build_filters(kwargs)
+    query = f"SELECT 1 FROM {table}"
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    query = f"SELECT COUNT(*) AS total FROM ({query} LIMIT %s) AS matches"
+    params.append(config.TOOL_MATCH_COUNT_CAP)
+    return query, params
+
+
+def _next_cursor(kwargs, last_row, total):
+    _, _, relevance_sql, _ = _build_filters(kwargs)
+    cursor = {"total": total}
+    if _orders_by_relevance(kwargs, relevance_sql):
+        previous = decode_cursor(kwargs["cursor"]) if kwargs.get("cursor") else {}
+        cursor["offset"] = int(previous.get("offset", 0)) + int(kwargs["limit"])
+    else:
+        cursor["publication_date"] = str(last_row["publication_date"])
+        cursor["id"] = last_row["id"]
+    return encode_cursor(cursor)
+
+
+def _check_tool_call(kwargs, parameters):
+    """Counts the call; returns the structured invalid-arguments error, or None if valid."""
+    _validation_counters["calls"] += 1
+    problems = validate_tool_arguments(kwargs, parameters)
+    if not problems:
+        return None
+    _validation_counters["invalid_calls"] += 1
+    for problem in problems:
+        counts = _validation_counters["invalid_arguments"]
+        counts[problem["argument"]] = counts.get(problem["argument"], 0) + 1
+    return json.dumps(
+        {
+            "error": "Invalid tool arguments. Fix them and call the tool again.",
+            "invalid_arguments": problems,
+            "count": 0,
+        }
     )
 
 
@@ -18,126 +432,241 @@ async def query_federal_registry_db(**kwargs):
     """
     Actually executes the SQL query against the MySQL database based on LLM parameters.
     This is the function the agent_core will call, NOT eval().
+    Invalid arguments are answered with a structured error listing each problem,
+    so the model can fix the call instead of guessing again.
     """
-    pool = await get_db_pool_tool()
-    results = []
-    try:
-        async with pool.acquire() as conn:
-            async with conn.cursor(
-                aiomysql.DictCursor
-            ) as cur:  # DictCursor for easy conversion to JSON
-                base_query = "SELECT document_number, title, type, abstract, publication_date, agencies, president, document_url FROM documents"
-                conditions = []
-                params = []
-
-                if "query_keywords" in kwargs and kwargs["query_keywords"]:
-                    keywords = kwargs["query_keywords"].split()
-                    keyword_conditions = []
-                    for kw in keywords:
-                        keyword_conditions.append("(title LIKE %s OR abstract LIKE %s)")
-                        params.extend([f"%{kw}%", f"%{kw}%"])
-                    if keyword_conditions:
-                        conditions.append(f"({' AND '.join(keyword_conditions)})")
-
-                if (
-                    "publication_date_exact" in kwargs
-                    and kwargs["publication_date_exact"]
-                ):
-                    conditions.append("publication_date = %s")
-                    params.append(kwargs["publication_date_exact"])
-                elif (
-                    "publication_date_start" in kwargs
-                    and "publication_date_end" in kwargs
-                    and kwargs["publication_date_start"]
-                    and kwargs["publication_date_end"]
-                ):
-                    conditions.append("publication_date BETWEEN %s AND %s")
-                    params.extend(
-                        [
-                            kwargs["publication_date_start"],
-                            kwargs["publication_date_end"],
-                        ]
-                    )
-                elif (
-                    "publication_date_start" in kwargs
-                    and kwargs["publication_date_start"]
-                ):
-                    conditions.append("publication_date >= %s")
-                    params.append(kwargs["publication_date_start"])
-                elif (
-                    "publication_date_end" in kwargs and kwargs["publication_date_end"]
-                ):
-                    conditions.append("publication_date <= %s")
-                    params.append(kwargs["publication_date_end"])
-
-                if "document_type" in kwargs and kwargs["document_type"]:
-                    doc_types = [
-                        dt.strip() for dt in kwargs["document_type"].upper().split(",")
-                    ]
-                    if doc_types:
-                        type_placeholders = ", ".join(["%s"] * len(doc_types))
-                        conditions.append(f"UPPER(type) IN ({type_placeholders})")
-                        params.extend(doc_types)
-
-                if "president_name" in kwargs and kwargs["president_name"]:
-                    conditions.append("president LIKE %s")
-                    params.append(f"%{kwargs['president_name']}%")
-
-                if "agency_name" in kwargs and kwargs["agency_name"]:
-
-                    conditions.append(
-                        "JSON_UNQUOTE(JSON_EXTRACT(agencies, '$[*]')) LIKE %s"
-                    )
-                    params.append(f"%{kwargs['agency_name']}%")
-
-                if conditions:
-                    base_query += " WHERE " + " AND ".join(conditions)
-
-                sort_order = "DESC"
-                if (
-                    "sort_by_date" in kwargs
-                    and kwargs["sort_by_date"]
-                    and kwargs["sort_by_date"].lower() == "asc"
-                ):
-                    sort_order = "ASC"
-                base_query += f" ORDER BY publication_date {sort_order}"
-
-                limit = int(kwargs.get("limit", 5))
-                limit = min(max(1, limit), 25)
-                base_query += f" LIMIT %s"
-                params.append(limit)
-
-                await cur.execute(base_query, tuple(params))
+    invalid_response = _check_tool_call(kwargs, TOOL_PARAMETERS)
+    if invalid_response:
+        return invalid_response
+
+    arguments = normalize_tool_arguments(kwargs)
+    cache_key = json.dumps(arguments, sort_keys=True)
+    if config.TOOL_CACHE_ENABLED:
+        cached_output = tool_result_cache.get(cache_key)
+        if cached_output is not None:
+            return cached_output
+
+    tool_output = await _execute_document_query(arguments)
+    with span("tool.serialize"):
+        tool_output_json = json.dumps(tool_output)
+    if config.TOOL_CACHE_ENABLED and "error" not in tool_output:
+        tool_result_cache.set(cache_key, tool_output_json)
+    return tool_output_json
+
+
+def _format_row(row, fields):
+    if row.get("publication_date") and not isinstance(row["publication_date"], str):
+        row["publication_date"] = row["publication_date"].isoformat()
+
+    if row.get("agencies") and isinstance(row.get("agencies"), str):
+        try:
+            row["agencies"] = json.loads(row["agencies"])
+        except json.JSONDecodeError:
+            row["agencies"] = [row["agencies"]]  # or handle error
+
+    if row.get("relevance") is not None:
+        row["relevance"] = round(float(row["relevance"]), 4)
+
+    # id and an unrequested publication_date are only needed for the cursor.
+    return {
+        key: value
+        for key, value in row.items()
+        if key in fields or key == "relevance"
+    }
+
+
+async def _fetch_from_mysql(arguments, cursor):
+    """Returns (rows, total) for a normalized query; total is None when already known."""
+    query, params = build_document_query(arguments)
+    async with acquire_db_connection() as conn:
+        async with conn.cursor(
+            aiomysql.DictCursor
+        ) as cur:  # DictCursor for easy conversion to JSON
+            with span("db.query", sql=query, params=repr(params)) as query_span:
+                await cur.execute(query, tuple(params))
                 query_results = await cur.fetchall()
+                query_span.set(rows=len(query_results))
 
-                if query_results:
-                    for row in query_results:
-
-                        if row.get("publication_date"):
-                            row["publication_date"] = row[
-                                "publication_date"
-                            ].isoformat()
-
-                        if row.get("agencies") and isinstance(row.get("agencies"), str):
-                            try:
-                                row["agencies"] = json.loads(row["agencies"])
-                            except json.JSONDecodeError:
-                                row["agencies"] = [row["agencies"]]  # or handle error
-                        results.append(dict(row))
-                    return json.dumps(
-                        {"found_documents": results, "count": len(results)}
-                    )
-                else:
-                    return json.dumps(
-                        {
-                            "message": "No documents found matching your criteria.",
-                            "count": 0,
-                        }
-                    )
+            # The total is counted on the first page and carried in the cursor.
+            total = cursor.get("total")
+            if total is None and query_results:
+                count_query, count_params = build_count_query(arguments)
+                with span("db.count", sql=count_query, params=repr(count_params)):
+                    await cur.execute(count_query, tuple(count_params))
+                    total = (await cur.fetchone())["total"]
+    return query_results, total
+
+
+async def _fetch_from_search_index(arguments, cursor):
+    """Same as _fetch_from_mysql, against the local FTS5 index (see search_index.py)."""
+    if cursor and not _orders_by_relevance(arguments, _build_filters(arguments)[2]):
+        if "publication_date" not in cursor or "id" not in cursor:
+            raise InvalidCursor("Cursor does not match this query's sort order.")
+    with span("search_index.query", arguments=json.dumps(arguments)):
+        return await asyncio.to_thread(
+            get_search_index().fetch,
+            arguments,
+            cursor,
+            RESULT_FIELDS,
+            config.TOOL_MATCH_COUNT_CAP,
+        )
+
+
+# Keyed by SEARCH_BACKEND. Cursors are only valid for the backend that issued them.
+SEARCH_BACKENDS = {
+    "mysql": _fetch_from_mysql,
+    "sqlite": _fetch_from_search_index,
+}
+
+
+async def _execute_document_query(arguments, backend=None):
+    fields = arguments.get("fields") or RESULT_FIELDS
+    fetch = SEARCH_BACKENDS[backend or config.SEARCH_BACKEND]
+    try:
+        cursor = decode_cursor(arguments["cursor"]) if arguments.get("cursor") else {}
+        with span("tool.execute", backend=backend or config.SEARCH_BACKEND):
+            query_results, total = await fetch(arguments, cursor)
+    except InvalidCursor as e:
+        return {"error": f"Invalid cursor: {e}", "count": 0}
+    except asyncio.TimeoutError:
+        print("Database query error: timed out waiting for a pooled connection.")
+        return {
+            "error": "Database is busy, timed out waiting for a connection.",
+            "count": 0,
+        }
     except Exception as e:
         print(f"Database query error: {e}")
-        return json.dumps({"error": f"Failed to query database: {str(e)}", "count": 0})
-    finally:
-        if pool:
-            pool.close()
-            await pool.wait_closed()
+        return {"error": f"Failed to query database: {str(e)}", "count": 0}
+
+    if not query_results:
+        return {
+            "message": "No documents found matching your criteria.",
+            "count": 0,
+        }
+
+    has_more = len(query_results) > arguments["limit"]
+    page = query_results[: arguments["limit"]]
+    result = {
+        "found_documents": [_format_row(dict(row), fields) for row in page],
+        "count": len(page),
+        "total_matches": total,
+        "total_is_lower_bound": total >= config.TOOL_MATCH_COUNT_CAP,
+    }
+    if has_more:
+        result["next_cursor"] = _next_cursor(arguments, page[-1], total)
+    return result
+
+
+async def _semantic_candidates(filters):
+    """
+    Document numbers matching the structured filters, or None when more than
+    SEMANTIC_FILTER_CANDIDATE_CAP match (the top similarities are filtered instead).
+    """
+    conditions, params, _, _ = _build_filters(filters)
+    query = "SELECT document_number FROM documents WHERE " + " AND ".join(conditions)
+    query += " LIMIT %s"
+    params.append(config.SEMANTIC_FILTER_CANDIDATE_CAP + 1)
+    async with acquire_db_connection() as conn:
+        async with conn.cursor() as cur:
+            with span("db.query", sql=query, params=repr(params)):
+                await cur.execute(query, tuple(params))
+                rows = await cur.fetchall()
+    if len(rows) > config.SEMANTIC_FILTER_CANDIDATE_CAP:
+        return None
+    return [row[0] for row in rows]
+
+
+async def _execute_semantic_query(arguments):
+    fields = arguments.get("fields") or RESULT_FIELDS
+    filters = {
+        name: value
+        for name, value in arguments.items()
+        if name not in ("query", "limit", "fields")
+    }
+    try:
+        with span("semantic.embed_query"):
+            query_vector = (await query_embedder.embed([arguments["query"]]))[0]
+    except Exception as e:
+        print(f"Semantic search embedding error: {e}")
+        return {"error": f"Failed to embed the query: {str(e)}", "count": 0}
+
+    try:
+        candidates = await _semantic_candidates(filters) if filters else None
+        # Without a candidate list, take extra hits so filtering still leaves enough.
+        top_k = arguments["limit"]
+        if filters and candidates is None:
+            top_k = max(top_k, config.SEMANTIC_TOP_CANDIDATES)
+        with span("semantic.search", top_k=top_k):
+            hits = await asyncio.to_thread(
+                get_semantic_index().search, query_vector, top_k, candidates
+            )
+        if not hits:
+            return {
+                "message": "No documents found matching your criteria.",
+                "count": 0,
+            }
+
+        scores = dict(hits)
+        conditions, params = [], []
+        if filters and candidates is None:
+            conditions, params, _, _ = _build_filters(filters)
+        conditions.append(f"document_number IN ({', '.join(['%s'] * len(scores))})")
+        params.extend(scores)
+        columns = ", ".join(["id"] + [f for f in RESULT_FIELDS if f in fields])
+        query = f"SELECT {columns} FROM documents WHERE {' AND '.join(conditions)}"
+        async with acquire_db_connection() as conn:
+            async with conn.cursor(aiomysql.DictCursor) as cur:
+                with span("db.query", sql=query, params=repr(params)):
+                    await cur.execute(query, tuple(params))
+                    rows = await cur.fetchall()
+    except asyncio.TimeoutError:
+        print("Database query error: timed out waiting for a pooled connection.")
+        return {
+            "error": "Database is busy, timed out waiting for a connection.",
+            "count": 0,
+        }
+    except Exception as e:
+        print(f"Semantic search error: {e}")
+        return {"error": f"Failed to run semantic search: {str(e)}", "count": 0}
+
+    rows = sorted(rows, key=lambda row: scores[row["document_number"]], reverse=True)
+    page = rows[: arguments["limit"]]
+    if not page:
+        return {"message": "No documents found matching your criteria.", "count": 0}
+    found_documents = []
+    for row in page:
+        row = dict(row)
+        row["relevance"] = scores[row["document_number"]]
+        found_documents.append(_format_row(row, fields))
+    return {"found_documents": found_documents, "count": len(found_documents)}
+
+
+async def semantic_search_federal_registry(**kwargs):
+    """
+    Ranks documents by the cosine similarity of their title/abstract embedding
+    to a natural-language query, restricted by the same structured filters as
+    query_federal_registry_db. Catches paraphrases keyword matching misses.
+    """
+    if not config.SEMANTIC_SEARCH_ENABLED:
+        return json.dumps(
+            {"error": "Semantic search is not enabled on this server.", "count": 0}
+        )
+    invalid_response = _check_tool_call(kwargs, SEMANTIC_TOOL_PARAMETERS)
+    if invalid_response:
+        return invalid_response
+
+    query = " ".join(str(kwargs.pop("query")).split())
+    arguments = normalize_tool_arguments(kwargs)
+    arguments["query"] = query
+    cache_key = json.dumps(["semantic", arguments], sort_keys=True)
+    if config.TOOL_CACHE_ENABLED:
+        cached_output = tool_result_cache.get(cache_key)
+        if cached_output is not None:
+            return cached_output
+
+    tool_output = await _execute_semantic_query(arguments)
+    with span("tool.serialize"):
+        tool_output_json = json.dumps(tool_output)
+    if config.TOOL_CACHE_ENABLED and "error" not in tool_output:
+        tool_result_cache.set(cache_key, tool_output_json)
+    return tool_output_json
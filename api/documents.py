@@ -0,0 +1,188 @@
+import asyncio
+import csv
+import io
+import json
+
+import aiomysql
+
+from agent.cache import VersionedLRUCache
+from agent.cursors import InvalidCursor, decode_cursor, encode_cursor
+from agent.db_pool import acquire_db_connection
+from config import global_config as config
+
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+EXPORT_FETCH_SIZE = 500
+STATS_RECENT_DAYS = 30
+
+# Columns shown when browsing or exporting; bookkeeping columns are left out.
+DOCUMENT_COLUMNS = [
+    "id",
+    "document_number",
+    "title",
+    "type",
+    "abstract",
+    "publication_date",
+    "agencies",
+    "document_url",
+    "pdf_url",
+    "raw_text_url",
+    "president",
+    "executive_order_number",
+]
+PAGE_ORDERS = ("id", "publication_date")
+
+# Exports hold a pooled connection while the client downloads; see EXPORT_MAX_CONCURRENCY.
+_export_slots = asyncio.Semaphore(config.EXPORT_MAX_CONCURRENCY)
+
+# Stats only change when the pipeline loads rows, which bumps the data version.
+_stats_cache = VersionedLRUCache(max_entries=1, ttl_seconds=300)
+
+
+def build_page_query(order="id", cursor=None, limit=DEFAULT_PAGE_SIZE):
+    """
+    Keyset pagination: the cursor holds the last row's sort key, so every page is
+    an index range scan instead of an ever-growing OFFSET. order="id" pages
+    oldest-first by id; order="publication_date" pages newest-first.
+    """
+    if order not in PAGE_ORDERS:
+        raise InvalidCursor(f"order must be one of {', '.join(PAGE_ORDERS)}.")
+    columns = ", ".join(DOCUMENT_COLUMNS)
+    conditions, params = [], []
+    if order == "id":
+        if cursor:
+            values = decode_cursor(cursor)
+            conditions.append("id > %s")
+            params.append(values.get("id"))
+        order_by = "id ASC"
+    else:
+        if cursor:
+            values = decode_cursor(cursor)
+            conditions.append(
+                "(publication_date < %s OR (publication_date = %s AND id < %s))"
+            )
+            params.extend(
+                [
+                    values.get("publication_date"),
+                    values.get("publication_date"),
+                    values.get("id"),
+                ]
+            )
+        order_by = "publication_date DESC, id DESC"
+    if None in params:
+        raise InvalidCursor("Cursor does not match the requested order.")
+
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    # One extra row tells whether another page exists.
+    query = f"SELECT {columns} FROM documents {where} ORDER BY {order_by} LIMIT %s"
+    params.append(limit + 1)
+    return query, params
+
+
+async def fetch_documents_page(order="id", cursor=None, limit=DEFAULT_PAGE_SIZE):
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    query, params = build_page_query(order, cursor, limit)
+    async with acquire_db_connection() as conn:
+        async with conn.cursor(aiomysql.DictCursor) as cur:
+            await cur.execute(query, tuple(params))
+            rows = await cur.fetchall()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        key = {"id": last["id"]}
+        if order == "publication_date":
+            key["publication_date"] = str(last["publication_date"])
+        next_cursor = encode_cursor(key)
+    return {"documents": rows, "next_cursor": next_cursor, "limit": limit}
+
+
+def _format_ndjson(rows):
+    return "".join(json.dumps(row, default=str) + "\n" for row in rows)
+
+
+def _format_csv(rows, include_header):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if include_header:
+        writer.writerow(DOCUMENT_COLUMNS)
+    for row in rows:
+        writer.writerow(
+            ["" if row[column] is None else row[column] for column in DOCUMENT_COLUMNS]
+        )
+    return buffer.getvalue()
+
+
+def export_slot_available():
+    return not _export_slots.locked()
+
+
+async def stream_documents_export(export_format="ndjson"):
+    """
+    Streams the whole documents table as NDJSON or CSV. Uses an unbuffered
+    (server-side) cursor, so memory stays at one fetch batch however large the table.
+    At most EXPORT_MAX_CONCURRENCY exports hold a pooled connection at a time.
+    """
+    async with _export_slots, acquire_db_connection() as conn:
+        # No cursor context manager: closing an unbuffered cursor drains every
+        # unread row, which is exactly what an abandoned export must not do.
+        cur = await conn.cursor(aiomysql.SSDictCursor)
+        try:
+            await cur.execute(
+                f"SELECT {', '.join(DOCUMENT_COLUMNS)} FROM documents ORDER BY id"
+            )
+            if export_format == "csv":
+                yield _format_csv([], include_header=True)
+            while True:
+                rows = await cur.fetchmany(EXPORT_FETCH_SIZE)
+                if not rows:
+                    break
+                if export_format == "csv":
+                    yield _format_csv(rows, include_header=False)
+                else:
+                    yield _format_ndjson(rows)
+        except BaseException:
+            # A client that disconnects mid-export leaves unread rows on the wire;
+            # closing the connection is far cheaper than draining them. The pool
+            # drops the closed connection when it is released.
+            conn.close()
+            raise
+        await cur.close()
+
+
+async def get_document_stats():
+    """Row counts overall, by type and for recent publication dates. Cached per data version."""
+    cached = _stats_cache.get("stats")
+    if cached is not None:
+        return cached
+
+    async with acquire_db_connection() as conn:
+        async with conn.cursor(aiomysql.DictCursor) as cur:
+            await cur.execute(
+                "SELECT COUNT(*) AS total, MIN(publication_date) AS first_publication_date, "
+                "MAX(publication_date) AS last_publication_date FROM documents"
+            )
+            totals = await cur.fetchone()
+            await cur.execute(
+                "SELECT type, COUNT(*) AS count FROM documents GROUP BY type ORDER BY count DESC"
+            )
+            by_type = await cur.fetchall()
+            await cur.execute(
+                "SELECT publication_date, COUNT(*) AS count FROM documents "
+                "WHERE publication_date >= CURDATE() - INTERVAL %s DAY "
+                "GROUP BY publication_date ORDER BY publication_date DESC",
+                (STATS_RECENT_DAYS,),
+            )
+            by_date = await cur.fetchall()
+
+    stats = {
+        "total": totals["total"],
+        "first_publication_date": totals["first_publication_date"],
+        "last_publication_date": totals["last_publication_date"],
+        "by_type": by_type,
+        "by_publication_date": by_date,
+    }
+    _stats_cache.set("stats", stats)
+    return stats
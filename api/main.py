@@ -1,16 +1,89 @@
+import asyncio
 import os
+import json
 import uvicorn
-import pymysql
 
-from fastapi import FastAPI, Request, HTTPException
-from fastapi.responses import HTMLResponse
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Query, Request, HTTPException
+from fastapi.responses import HTMLResponse, PlainTextResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 
 from api.models import ChatRequest, ChatResponse, ChatMessage
-from agent.agent_core import process_user_query
+from api.documents import (
+    DEFAULT_PAGE_SIZE,
+    MAX_PAGE_SIZE,
+    InvalidCursor,
+    export_slot_available,
+    fetch_documents_page,
+    get_document_stats,
+    stream_documents_export,
+)
+from agent.agent_core import (
+    process_user_query,
+    process_user_query_stream,
+    get_agent_stats,
+    get_answer_cache_stats,
+)
+from telemetry import finish_trace, render_metrics, start_trace
+from agent.db_pool import init_db_pool, close_db_pool, get_db_pool_stats
+from agent.llm_client import LLMOverloaded, admission, get_llm_stats
+from agent.search_index import get_search_index_stats
+from agent.semantic_index import get_semantic_index_stats
+from agent.session_store import get_session_store, new_session_id
+from agent.tool_executor import get_tool_cache_stats
+from data_pipeline.jobs import (
+    cancel_pipeline_job,
+    get_pipeline_job,
+    start_pipeline_job,
+)
+from config import global_config as config
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One pool for the whole process, shared by every tool call.
+    await init_db_pool()
+    try:
+        yield
+    finally:
+        await cancel_pipeline_job()
+        await close_db_pool()
+
+
+app = FastAPI(lifespan=lifespan)
+
+
+def _route_label(request: Request):
+    # The route template keeps metric labels bounded (no document ids or session ids).
+    route = request.scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """
+    Times each request into http_request_duration_seconds and collects the spans
+    recorded while serving it; streamed responses are timed to their last chunk.
+    """
+    trace = start_trace(request.method, request.url.path)
+    try:
+        response = await call_next(request)
+    except Exception:
+        finish_trace(trace, _route_label(request), 500)
+        raise
+    route = _route_label(request)
+    body_iterator = response.body_iterator
+
+    async def body_then_finish():
+        try:
+            async for chunk in body_iterator:
+                yield chunk
+        finally:
+            finish_trace(trace, route, response.status_code)
 
-app = FastAPI()
+    response.body_iterator = body_then_finish()
+    return response
 
 
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -25,58 +98,213 @@ async def get_chat_ui(request: Request):
     return templates.TemplateResponse("index.html", {"request": request})
 
 
+def _load_session(chat_request: ChatRequest):
+    """Returns (session_id, history) for the request, starting a new session if needed."""
+    session_id = chat_request.session_id or new_session_id()
+    history = get_session_store().get(session_id) if chat_request.session_id else None
+    if history is None:
+        history = [msg.model_dump() for msg in chat_request.history or []]
+    return session_id, history
+
+
+def _overloaded_error(e):
+    return HTTPException(
+        status_code=503,
+        detail=f"The assistant is busy, please retry shortly. ({e})",
+        headers={"Retry-After": str(int(config.LLM_QUEUE_TIMEOUT_SECONDS))},
+    )
+
+
 @app.post("/chat", response_model=ChatResponse)
 async def chat_with_agent(chat_request: ChatRequest):
     user_query = chat_request.query
-    history = chat_request.history if chat_request.history else []
-    history_for_agent = [msg.model_dump() for msg in history]
-    agent_answer_content = await process_user_query(user_query, history_for_agent)
-    updated_history = history + [
-        ChatMessage(role="user", content=user_query),
-        ChatMessage(role="assistant", content=agent_answer_content),
-    ]
+    session_id, history_for_agent = _load_session(chat_request)
+    try:
+        agent_answer_content = await process_user_query(
+            user_query, history_for_agent, use_cache=not chat_request.bypass_cache
+        )
+    except LLMOverloaded as e:
+        raise _overloaded_error(e)
+    get_session_store().save(session_id, history_for_agent)
+
+    updated_history = None
+    if chat_request.history is not None:
+        updated_history = chat_request.history + [
+            ChatMessage(role="user", content=user_query),
+            ChatMessage(role="assistant", content=agent_answer_content),
+        ]
+
+    return ChatResponse(
+        answer=agent_answer_content, session_id=session_id, history=updated_history
+    )
+
+
+@app.post("/chat/stream")
+async def chat_with_agent_stream(chat_request: ChatRequest):
+    """Same as /chat, but streams tool progress and answer tokens as server-sent events."""
+    user_query = chat_request.query
+    if admission.saturated():
+        # Fail fast before opening the stream; later overloads arrive as error events.
+        raise _overloaded_error("LLM request queue is full.")
+    session_id, history_for_agent = _load_session(chat_request)
+
+    async def event_stream():
+        yield f"event: session\ndata: {json.dumps({'type': 'session', 'session_id': session_id})}\n\n"
+        async for event in process_user_query_stream(
+            user_query, history_for_agent, use_cache=not chat_request.bypass_cache
+        ):
+            yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        get_session_store().save(session_id, history_for_agent)
 
-    return ChatResponse(answer=agent_answer_content, history=updated_history)
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
-@app.post("/run_data_pipeline")
+@app.delete("/chat/session/{session_id}")
+async def delete_chat_session(session_id: str):
+    """Forgets a conversation, e.g. when the user clears the chat."""
+    get_session_store().delete(session_id)
+    return {"message": "Session deleted."}
+
+
+@app.post("/run_data_pipeline", status_code=202)
 async def run_data_pipeline():
-    """Endpoint to trigger the data pipeline."""
+    """
+    Starts the data pipeline in the background and returns its job id right away;
+    poll /pipeline/status/{job_id}. A trigger while a run is in progress returns
+    the running job instead of starting another.
+    """
     # Importing here to avoid circular import issues
     from data_pipeline.main_pipeline import run_pipeline
 
-    await run_pipeline()
-    return {"message": "Data pipeline run triggered."}
+    job, started = start_pipeline_job(run_pipeline)
+    return {
+        "message": (
+            "Data pipeline run triggered."
+            if started
+            else "Data pipeline is already running."
+        ),
+        "job_id": job.id,
+        "status": job.status,
+        "already_running": not started,
+    }
 
 
-@app.get("/get_database")
-async def get_database():
+@app.get("/pipeline/status/{job_id}")
+async def pipeline_status(job_id: str):
+    """Reports a pipeline job's status, current stage, progress counts and stage timings."""
+    job = get_pipeline_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown pipeline job.")
+    return job.to_dict()
+
+
+@app.get("/monitoring/db_pool")
+async def db_pool_stats():
+    """Returns connection pool usage (created, in use, waiting) for monitoring."""
+    return get_db_pool_stats()
+
+
+@app.get("/monitoring/cache")
+async def cache_stats():
+    """Returns hit/miss counters for the answer and tool result caches."""
+    return {
+        "answers": get_answer_cache_stats(),
+        "tool_results": get_tool_cache_stats(),
+    }
+
+
+@app.get("/monitoring/search")
+async def search_stats():
+    """Returns the search backend, local index and semantic index sizes and latencies."""
+    return {
+        **await asyncio.to_thread(get_search_index_stats),
+        "semantic": get_semantic_index_stats(),
+    }
+
+
+@app.get("/monitoring/llm")
+async def llm_stats():
+    """Returns LLM request counts, retries, admission queue depth and latency percentiles."""
+    return get_llm_stats()
+
+
+@app.get("/monitoring/agent")
+async def agent_stats():
+    """Returns agent loop metrics, e.g. prompt tokens saved by tool output compaction."""
+    return get_agent_stats()
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
     """
-    Returns all rows from your MySQL database table as a list of dicts.
-    Update connection details and table name as needed.
+    Prometheus metrics: request and span latency histograms, LLM token counters,
+    and the /monitoring/* stats as gauges.
     """
+    stats = {
+        "llm": get_llm_stats(),
+        "db_pool": get_db_pool_stats(),
+        "cache": {
+            "answers": get_answer_cache_stats(),
+            "tool_results": get_tool_cache_stats(),
+        },
+        "agent": get_agent_stats(),
+        "search": await asyncio.to_thread(get_search_index_stats),
+        "semantic": get_semantic_index_stats(),
+    }
+    return PlainTextResponse(
+        render_metrics(stats), media_type="text/plain; version=0.0.4"
+    )
 
-    from config import global_config as config
 
+@app.get("/get_database")
+async def get_database(
+    cursor: str = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    order: str = "id",
+):
+    """
+    Returns one page of documents and a `next_cursor` for the following page
+    (null on the last page). order is "id" (oldest first) or "publication_date"
+    (newest first).
+    """
     try:
-        timeout = 10
-        conn = pymysql.connect(
-            charset="utf8mb4",
-            connect_timeout=timeout,
-            cursorclass=pymysql.cursors.DictCursor,
-            db=config.DB_NAME,
-            host=config.DB_HOST,
-            password=config.DB_PASSWORD,
-            read_timeout=timeout,
-            port=config.DB_PORT,
-            user=config.DB_USER,
-            write_timeout=timeout,
+        return await fetch_documents_page(order=order, cursor=cursor, limit=limit)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"MySQL error: {e}")
+
+
+@app.get("/export/documents")
+async def export_documents(format: str = "ndjson"):
+    """Streams every document as NDJSON or CSV without loading the table into memory."""
+    if format not in ("ndjson", "csv"):
+        raise HTTPException(status_code=400, detail="format must be ndjson or csv.")
+    if not export_slot_available():
+        raise HTTPException(
+            status_code=503,
+            detail="Too many exports in progress, please retry shortly.",
+            headers={"Retry-After": "30"},
         )
-        with conn.cursor() as cursor:
-            cursor.execute(f"SELECT * FROM documents")
-            rows = cursor.fetchall()
-        conn.close()
-        return rows
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        stream_documents_export(format),
+        media_type=media_type,
+        headers={
+            "Content-Disposition": f'attachment; filename="documents.{format}"'
+        },
+    )
+
+
+@app.get("/stats")
+async def document_stats():
+    """Cheap table summary: total rows, counts by type and by recent publication date."""
+    try:
+        return await get_document_stats()
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"MySQL error: {e}")
 
@@ -9,9 +9,16 @@ class ChatMessage(BaseModel):
 
 class ChatRequest(BaseModel):
     query: str
+    # History is kept server-side; clients send the session_id they were given.
+    session_id: Optional[str] = None
+    # Legacy: full history sent by the client, only used to seed a new session.
     history: Optional[List[ChatMessage]] = None
+    # Skip the answer cache, e.g. to force a fresh answer.
+    bypass_cache: bool = False
 
 
 class ChatResponse(BaseModel):
     answer: str
-    history: List[ChatMessage]
+    session_id: str
+    # Only echoed back to legacy clients that sent their own history.
+    history: Optional[List[ChatMessage]] = None
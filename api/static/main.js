@@ -48,6 +48,7 @@ function showBackHomeModal() {
             chatbox.style.display = 'none';
             welcomePage.style.display = 'flex';
             // Optionally clear chat history:
+            endSession();
             chatHistory = [{ role: "assistant", content: "👋 <strong>Welcome!</strong> How can I help you with Federal Registry documents today?" }];
         };
     }
@@ -67,6 +68,15 @@ if (backHomeBtn) {
 
 
 let chatHistory = [{ role: "assistant", content: "👋 <strong>Welcome!</strong> How can I help you with Federal Registry documents today?" }];
+// Conversation history lives on the server; the browser only keeps the session id.
+let sessionId = null;
+
+function endSession() {
+    if (sessionId) {
+        fetch(`/chat/session/${sessionId}`, { method: 'DELETE' }).catch(() => {});
+        sessionId = null;
+    }
+}
 
 function formatAssistantText(text) {
     // Bold: **word**
@@ -87,6 +97,36 @@ function addMessage(role, text) {
     }
     chatlogs.appendChild(messageDiv);
     chatlogs.scrollTop = chatlogs.scrollHeight;
+    return messageDiv;
+}
+
+function updateAssistantMessage(messageDiv, text) {
+    messageDiv.innerHTML = `<strong>Assistant:</strong> ${formatAssistantText(text)}`;
+    chatlogs.scrollTop = chatlogs.scrollHeight;
+}
+
+// Parses a server-sent events body, calling onEvent(type, data) for each event.
+async function readEventStream(response, onEvent) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const rawEvent = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+            let eventType = 'message';
+            let data = '';
+            rawEvent.split('\n').forEach(line => {
+                if (line.startsWith('event:')) eventType = line.slice(6).trim();
+                else if (line.startsWith('data:')) data += line.slice(5).trim();
+            });
+            if (data) onEvent(eventType, JSON.parse(data));
+        }
+    }
 }
 
 function renderChatHistory() {
@@ -109,25 +149,53 @@ async function sendMessage() {
     chatlogs.scrollTop = chatlogs.scrollHeight;
 
     try {
-        const response = await fetch('/chat', {
+        const response = await fetch('/chat/stream', {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ query: query, history: chatHistory }),
+            body: JSON.stringify({ query: query, session_id: sessionId }),
         });
 
-        chatlogs.removeChild(thinkingDiv);
-
         if (!response.ok) {
+            chatlogs.removeChild(thinkingDiv);
             const errorData = await response.json().catch(() => ({ detail: "Unknown error" }));
             addMessage('assistant', `Error: ${response.status} - ${errorData.detail || "Could not get response."}`);
             return;
         }
 
-        const data = await response.json();
-        addMessage('assistant', data.answer);
-        chatHistory = data.history;
+        let answerDiv = null;
+        let answerText = '';
+        await readEventStream(response, (type, data) => {
+            if (type === 'session') {
+                sessionId = data.session_id;
+            } else if (type === 'tool') {
+                thinkingDiv.textContent = data.status === 'started'
+                    ? 'Searching the Federal Register...'
+                    : `Found ${data.count ?? 0} document(s), writing the answer...`;
+            } else if (type === 'token') {
+                if (!answerDiv) {
+                    thinkingDiv.remove();
+                    answerDiv = addMessage('assistant', '');
+                }
+                answerText += data.content;
+                updateAssistantMessage(answerDiv, answerText);
+            } else if (type === 'reset') {
+                answerText = '';
+                if (answerDiv) {
+                    answerDiv.remove();
+                    answerDiv = null;
+                    chatlogs.appendChild(thinkingDiv);
+                }
+            } else if (type === 'done' || type === 'error') {
+                const finalText = type === 'done' ? data.answer : data.message;
+                thinkingDiv.remove();
+                if (!answerDiv) answerDiv = addMessage('assistant', '');
+                updateAssistantMessage(answerDiv, finalText);
+                if (type === 'done') chatHistory.push({ role: 'assistant', content: finalText });
+            }
+        });
+        thinkingDiv.remove();
     } catch (error) {
-        chatlogs.removeChild(thinkingDiv);
+        thinkingDiv.remove();
         addMessage('assistant', 'Sorry, there was an error connecting to the server.');
     }
 }
@@ -146,6 +214,7 @@ getStartedBtn.onclick = () => {
 };
 
 clearChatBtn.onclick = () => {
+    endSession();
     chatHistory = [{ role: "assistant", content: "👋 <strong>Welcome!</strong> How can I help you with Federal Registry documents today?" }];
     renderChatHistory();
 };
@@ -207,6 +276,7 @@ document.getElementById('cancelClearChat').onclick = function () {
 document.getElementById('confirmClearChat').onclick = function () {
     document.getElementById('clearChatModal').style.display = 'none';
     // Actual clear chat logic:
+    endSession();
     chatHistory = [{ role: "assistant", content: "👋 <strong>Welcome!</strong> How can I help you with Federal Registry documents today?" }];
     renderChatHistory();
 };
@@ -219,6 +289,41 @@ const pipelineResultContainer = document.getElementById('pipelineResultContainer
 const pipelineSummary = document.getElementById('pipelineSummary');
 const viewDataBtn = document.getElementById('viewDataBtn');
 
+const PIPELINE_STAGES = {
+    downloading: { label: 'Downloading new documents', start: 0, end: 40 },
+    processing_and_loading: { label: 'Processing and loading documents', start: 40, end: 90 },
+    cleanup: { label: 'Cleaning up old files', start: 90, end: 100 },
+};
+
+function renderPipelineProgress(job) {
+    const stage = PIPELINE_STAGES[job.stage];
+    if (!stage) return;
+    const p = job.progress || {};
+    let fraction = 0;
+    let detail = '';
+    if (job.stage === 'downloading' && p.dates_to_download) {
+        const done = (p.dates_downloaded || 0) + (p.dates_failed || 0);
+        fraction = done / p.dates_to_download;
+        detail = ` (${done}/${p.dates_to_download} days)`;
+    } else if (job.stage === 'processing_and_loading' && p.documents_loaded) {
+        detail = ` (${p.documents_loaded} documents)`;
+    }
+    pipelineProgressFill.style.width = (stage.start + (stage.end - stage.start) * fraction) + '%';
+    pipelineProgressText.textContent = stage.label + detail + '...';
+}
+
+// Polls the background pipeline job until it finishes, updating the progress bar.
+async function waitForPipelineJob(jobId) {
+    while (true) {
+        const resp = await fetch(`/pipeline/status/${jobId}`);
+        if (!resp.ok) throw new Error('Could not fetch pipeline status');
+        const job = await resp.json();
+        if (job.status === 'succeeded' || job.status === 'failed') return job;
+        renderPipelineProgress(job);
+        await new Promise(resolve => setTimeout(resolve, 1000));
+    }
+}
+
 updatePipelineBtn.onclick = async () => {
     updatePipelineBtn.disabled = true;
     pipelineResultContainer.style.display = 'none';
@@ -226,29 +331,22 @@ updatePipelineBtn.onclick = async () => {
     pipelineProgressFill.style.width = '0%';
     pipelineProgressText.textContent = 'Updating data pipeline...';
 
-    // Animate progress bar (fake progress for UX)
-    let progress = 0;
-    const progressInterval = setInterval(() => {
-        if (progress < 90) {
-            progress += Math.random() * 10;
-            pipelineProgressFill.style.width = Math.min(progress, 90) + '%';
-        }
-    }, 300);
-
     let error = null;
     let total = 0;
     try {
         const resp = await fetch('/run_data_pipeline', { method: 'POST' });
         if (!resp.ok) throw new Error('Pipeline failed');
-        // After pipeline, fetch the real row count from database
-        const dbResp = await fetch('/get_database', { method: 'GET' });
-        if (!dbResp.ok) throw new Error('Could not fetch database');
-        const dbData = await dbResp.json();
-        total = Array.isArray(dbData) ? dbData.length : 0;
+        const { job_id } = await resp.json();
+        const job = await waitForPipelineJob(job_id);
+        if (job.status !== 'succeeded') throw new Error(job.error || 'Pipeline failed');
+        // After pipeline, fetch the real row count from the cheap stats endpoint
+        const statsResp = await fetch('/stats', { method: 'GET' });
+        if (!statsResp.ok) throw new Error('Could not fetch database stats');
+        const stats = await statsResp.json();
+        total = stats.total || 0;
     } catch (e) {
         error = "Failed to update pipeline or fetch database.";
     }
-    clearInterval(progressInterval);
     pipelineProgressFill.style.width = '100%';
     pipelineProgressText.textContent = error ? error : 'Pipeline updated successfully!';
     updatePipelineBtn.disabled = false;
@@ -265,21 +363,43 @@ updatePipelineBtn.onclick = async () => {
     pipelineProgressContainer.style.display = 'none';
 };
 
-// View Data button logic
+// View Data button logic: one page at a time, "Load more" follows next_cursor
+let dbRows = [];
+let dbNextCursor = null;
+
+async function loadDbPage(cursor) {
+    const params = new URLSearchParams({ limit: '100' });
+    if (cursor) params.set('cursor', cursor);
+    const resp = await fetch(`/get_database?${params}`, { method: 'GET' });
+    if (!resp.ok) throw new Error('Could not fetch database');
+    const page = await resp.json();
+    dbRows = cursor ? dbRows.concat(page.documents) : page.documents;
+    dbNextCursor = page.next_cursor;
+}
+
+function showDbPage() {
+    showDbModal(dbRows);
+    if (dbNextCursor) {
+        const loadMoreBtn = document.createElement('button');
+        loadMoreBtn.textContent = 'Load more';
+        loadMoreBtn.onclick = async () => {
+            loadMoreBtn.disabled = true;
+            try {
+                await loadDbPage(dbNextCursor);
+                showDbPage();
+            } catch (e) {
+                showDbModal({ error: "Failed to fetch database." });
+            }
+        };
+        dbTableContainer.appendChild(loadMoreBtn);
+    }
+}
+
 viewDataBtn.onclick = async () => {
-    // Try to fetch real data from database
-    let dbData = null;
-    let error = null;
     try {
-        const resp = await fetch('/get_database', { method: 'GET' });
-        if (!resp.ok) throw new Error('Could not fetch database');
-        dbData = await resp.json();
+        await loadDbPage(null);
+        showDbPage();
     } catch (e) {
-        error = "Failed to fetch database.";
-    }
-    if (error) {
-        showDbModal({ error });
-    } else {
-        showDbModal(dbData);
+        showDbModal({ error: "Failed to fetch database." });
     }
-};
\ No newline at end of file
+};
@@ -0,0 +1,161 @@
+"""
+Seeds a deterministic synthetic corpus into MySQL and/or the local search index.
+
+    python -m benchmarks.corpus --rows 100000 --target both
+
+Documents are numbered BENCH-00000000 upwards and generated from a fixed seed,
+so 10k, 100k and 1M row corpora are prefixes of one another and re-seeding is
+idempotent. Point DB_NAME at a scratch database: rows go into `documents`.
+"""
+
+import argparse
+import random
+import time
+
+from datetime import date, timedelta
+
+from benchmarks.fulltext_benchmark import TYPES, VOCABULARY
+from data_pipeline.processor import _iter_batches, transform_document
+
+AGENCIES = [
+    "Environmental Protection Agency",
+    "Energy Department",
+    "Transportation Department",
+    "Federal Aviation Administration",
+    "Health and Human Services Department",
+    "Treasury Department",
+    "Commerce Department",
+    "Agriculture Department",
+    "Interior Department",
+    "Homeland Security Department",
+]
+PRESIDENTS = ["Donald J. Trump", "Joseph R. Biden Jr.", "Barack Obama"]
+CORPUS_START = date(2015, 1, 1)
+CORPUS_DAYS = 3650
+SEED_BATCH_SIZE = 5000
+
+
+def _text(rng, words):
+    return " ".join(rng.choice(VOCABULARY) for _ in range(words))
+
+
+def raw_document(number, publication_date, rng):
+    """One document in the Federal Register API's shape (before processing)."""
+    doc_type = rng.choice(TYPES)
+    return {
+        "document_number": number,
+        "title": _text(rng, 8).capitalize(),
+        "type": doc_type,
+        "abstract": _text(rng, 60).capitalize() + ".",
+        "publication_date": publication_date,
+        "agencies": [
+            {"name": name} for name in rng.sample(AGENCIES, rng.randint(1, 2))
+        ],
+        "html_url": f"https://example.invalid/documents/{number}",
+        "pdf_url": f"https://example.invalid/documents/{number}.pdf",
+        "raw_text_url": None,
+        "president": (
+            rng.choice(PRESIDENTS) if doc_type == "Presidential Document" else None
+        ),
+        "executive_order_number": None,
+    }
+
+
+def generate_documents(rows, seed=42):
+    """Yields `rows` processed documents; row i is the same for every corpus size."""
+    for i in range(rows):
+        rng = random.Random(seed * 1_000_003 + i)
+        publication_date = CORPUS_START + timedelta(days=rng.randrange(CORPUS_DAYS))
+        yield transform_document(
+            raw_document(f"BENCH-{i:08d}", publication_date.isoformat(), rng)
+        )
+
+
+def raw_documents_for_date(date_str, count, seed=42):
+    """A day's raw documents for the stub Federal Register API."""
+    rng = random.Random(f"{seed}-{date_str}")
+    compact_date = date_str.replace("-", "")
+    return [
+        raw_document(f"STUB-{compact_date}-{i:05d}", date_str, rng)
+        for i in range(count)
+    ]
+
+
+def tool_argument_workload(count, seed=42):
+    """
+    Tool calls resembling what the model sends: keyword searches in every mode,
+    combined with date ranges, types and agencies, plus filter-only queries.
+    """
+    rng = random.Random(seed)
+    workload = []
+    for _ in range(count):
+        arguments = {}
+        if rng.random() < 0.85:
+            arguments["query_keywords"] = " ".join(
+                rng.sample(VOCABULARY, rng.randint(1, 3))
+            )
+            arguments["search_mode"] = rng.choice(
+                ["natural", "natural", "boolean", "like"]
+            )
+        if rng.random() < 0.4:
+            start = CORPUS_START + timedelta(days=rng.randrange(CORPUS_DAYS - 365))
+            arguments["publication_date_start"] = start.isoformat()
+            arguments["publication_date_end"] = (
+                start + timedelta(days=rng.choice([7, 30, 365]))
+            ).isoformat()
+        if rng.random() < 0.3:
+            arguments["document_type"] = [rng.choice(TYPES)]
+        if rng.random() < 0.2:
+            arguments["agency_name"] = rng.choice(AGENCIES).split()[0]
+        if not arguments or rng.random() < 0.2:
+            arguments["sort_by_date"] = rng.choice(["asc", "desc"])
+        arguments["limit"] = rng.choice([5, 5, 10, 25])
+        workload.append(arguments)
+    return workload
+
+
+def seed_mysql(rows, seed=42):
+    from data_pipeline.db_loader import get_db_pool, load_data_to_db
+
+    connection = get_db_pool()
+    try:
+        with connection.cursor() as cur:
+            cur.execute(
+                "SELECT COUNT(*) AS n FROM documents WHERE document_number LIKE %s",
+                ("BENCH-%",),
+            )
+            existing = cur.fetchone()["n"]
+    finally:
+        connection.close()
+    if existing >= rows:
+        print(f"MySQL already holds {existing} benchmark rows.")
+        return
+
+    started = time.perf_counter()
+    for batch in _iter_batches(generate_documents(rows, seed), SEED_BATCH_SIZE):
+        load_data_to_db(batch)
+    print(f"Seeded {rows} rows into MySQL in {time.perf_counter() - started:.1f}s")
+
+
+def seed_search_index(rows, seed=42):
+    from agent.search_index import get_search_index
+
+    index = get_search_index()
+    started = time.perf_counter()
+    for batch in _iter_batches(generate_documents(rows, seed), SEED_BATCH_SIZE):
+        index.upsert_documents(batch)
+    print(
+        f"Seeded {rows} rows into {index.path} in {time.perf_counter() - started:.1f}s"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--target", choices=("mysql", "sqlite", "both"), default="both")
+    args = parser.parse_args()
+    if args.target in ("mysql", "both"):
+        seed_mysql(args.rows, args.seed)
+    if args.target in ("sqlite", "both"):
+        seed_search_index(args.rows, args.seed)
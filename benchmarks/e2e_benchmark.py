@@ -0,0 +1,535 @@
+"""
+End-to-end benchmarks of the agent tool, /chat and /run_data_pipeline against local fakes.
+
+    python -m benchmarks.e2e_benchmark tool --backend mysql --rows 100000 --seed-corpus
+    python -m benchmarks.e2e_benchmark chat --requests 200 --concurrency 8 --llm-latency-ms 200
+    python -m benchmarks.e2e_benchmark pipeline --days 7 --docs-per-day 2000
+    python -m benchmarks.e2e_benchmark history
+
+The fake LLM and the stub Federal Register API (benchmarks/fakes.py) run as
+subprocesses. The app runs in this process (under uvicorn for chat and
+pipeline), so DB time and memory are measured on the app itself. Each
+scenario reports p50/p95/p99 latency, throughput, DB time and RSS; results
+are appended to benchmarks/results/history.jsonl and compared with the last
+run that used the same parameters. Point DB_NAME at a scratch database: the
+corpus and pipeline write to `documents`. Caches are off unless --caches.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from contextlib import asynccontextmanager
+from datetime import datetime
+
+RESULTS_FILE = os.path.join(os.path.dirname(__file__), "results", "history.jsonl")
+DEFAULT_INDEX_PATH = os.path.join(
+    os.path.dirname(__file__), "results", "search_index.sqlite3"
+)
+CHAT_QUESTIONS = [
+    "What rules did the EPA publish about vehicle emissions?",
+    "Find recent notices about endangered species habitat.",
+    "Were there any Medicare hospital payment rules this year?",
+    "Show me presidential documents about trade and tariffs.",
+    "What did the FAA publish about airworthiness directives?",
+]
+# Metrics shown when comparing a run with the previous one.
+COMPARED_METRICS = (
+    "p50_ms",
+    "p95_ms",
+    "p99_ms",
+    "throughput_per_s",
+    "db_ms_per_request",
+)
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _configure_environment(args, workdir):
+    """Points the app's configuration at the fakes. Must run before config is imported."""
+    args.llm_port = _free_port()
+    args.federal_register_port = _free_port()
+    os.environ.update(
+        {
+            "OLLAMA_BASE_URL": f"http://127.0.0.1:{args.llm_port}/v1",
+            "OLLAMA_MODEL": "fake-llm",
+            "OLLAMA_API_KEY": "benchmark",
+            "FEDERAL_REGISTER_API_URL": f"http://127.0.0.1:{args.federal_register_port}/documents.json",
+            "FEDERAL_REGISTER_RATE_LIMIT_PER_SECOND": "1000",
+            "FEDERAL_REGISTER_RATE_LIMIT_BURST": "1000",
+            "INGESTION_STATE_FILE": os.path.join(workdir, "ingestion_state.json"),
+            "INGESTION_INITIAL_LOOKBACK_DAYS": str(args.days),
+            "INGESTION_RECHECK_DAYS": "0",
+            "RAW_DATA_DIR": os.path.join(workdir, "raw_data"),
+            "PROCESSED_DATA_DIR": os.path.join(workdir, "processed_data"),
+            "DATA_VERSION_FILE": os.path.join(workdir, "data_version.txt"),
+            "SEARCH_BACKEND": args.backend,
+            "SEARCH_INDEX_PATH": args.index_path,
+            "TOOL_CACHE_ENABLED": "true" if args.caches else "false",
+            "ANSWER_CACHE_ENABLED": "true" if args.caches else "false",
+        }
+    )
+
+
+def _start_fake(service, port, *options):
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "benchmarks.fakes",
+            service,
+            "--port",
+            str(port),
+            *options,
+        ],
+        stdout=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Fake {service} exited with code {process.returncode}")
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return process
+        except OSError:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError(f"Fake {service} did not start on port {port}")
+
+
+@asynccontextmanager
+async def _serve_app(port):
+    import uvicorn
+
+    from api.main import app
+
+    server = uvicorn.Server(
+        uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning")
+    )
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        if task.done():
+            task.result()
+            raise RuntimeError("API server stopped during startup.")
+        await asyncio.sleep(0.05)
+    try:
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        server.should_exit = True
+        await task
+
+
+def _memory_mb():
+    """Current and peak resident set size of this process, in MB."""
+    memory = {}
+    with open("/proc/self/status", encoding="ascii") as f:
+        for line in f:
+            if line.startswith(("VmRSS:", "VmHWM:")):
+                key = "rss_mb" if line.startswith("VmRSS") else "peak_rss_mb"
+                memory[key] = round(int(line.split()[1]) / 1024, 1)
+    return memory
+
+
+def _percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(fraction * len(ordered)))], 2)
+
+
+class DbTimer:
+    """Times the tool's search backend calls (MySQL or the local index)."""
+
+    def __init__(self):
+        self.durations_ms = []
+
+    def install(self):
+        from agent import tool_executor
+
+        for name, fetch in list(tool_executor.SEARCH_BACKENDS.items()):
+            tool_executor.SEARCH_BACKENDS[name] = self._timed(fetch)
+
+    def _timed(self, fetch):
+        async def timed_fetch(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await fetch(*args, **kwargs)
+            finally:
+                self.durations_ms.append((time.perf_counter() - started) * 1000)
+
+        return timed_fetch
+
+
+async def _drive(make_request, requests, concurrency):
+    """Issues `requests` calls of make_request(i) from `concurrency` workers."""
+    latencies_ms = []
+    errors = []
+    next_index = iter(range(requests))
+
+    async def worker():
+        for i in next_index:
+            started = time.perf_counter()
+            try:
+                await make_request(i)
+                latencies_ms.append((time.perf_counter() - started) * 1000)
+            except Exception as e:
+                errors.append(str(e))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies_ms, errors, time.perf_counter() - started
+
+
+def _summarize(latencies_ms, errors, wall_seconds, db_timer=None):
+    completed = len(latencies_ms)
+    metrics = {
+        "requests": completed + len(errors),
+        "errors": len(errors),
+        "p50_ms": _percentile(latencies_ms, 0.5),
+        "p95_ms": _percentile(latencies_ms, 0.95),
+        "p99_ms": _percentile(latencies_ms, 0.99),
+        "max_ms": round(max(latencies_ms), 2) if latencies_ms else None,
+        "throughput_per_s": (
+            round(completed / wall_seconds, 2) if wall_seconds else None
+        ),
+        "wall_seconds": round(wall_seconds, 3),
+    }
+    if db_timer is not None:
+        db_ms = db_timer.durations_ms
+        metrics.update(
+            {
+                "db_calls": len(db_ms),
+                "db_p50_ms": _percentile(db_ms, 0.5),
+                "db_p95_ms": _percentile(db_ms, 0.95),
+                "db_ms_per_request": (
+                    round(sum(db_ms) / metrics["requests"], 2)
+                    if metrics["requests"]
+                    else None
+                ),
+                "db_time_share": (
+                    round(sum(db_ms) / sum(latencies_ms), 4) if latencies_ms else None
+                ),
+            }
+        )
+    if errors:
+        metrics["first_errors"] = sorted(set(errors))[:3]
+    metrics.update(_memory_mb())
+    return metrics
+
+
+# --- Scenarios ---
+
+
+async def run_tool_scenario(args):
+    from agent.db_pool import close_db_pool
+    from agent.tool_executor import query_federal_registry_db
+    from benchmarks.corpus import seed_mysql, seed_search_index, tool_argument_workload
+
+    if args.seed_corpus:
+        seed = seed_mysql if args.backend == "mysql" else seed_search_index
+        await asyncio.to_thread(seed, args.rows, args.seed)
+
+    workload = tool_argument_workload(args.requests, args.seed)
+    db_timer = DbTimer()
+    db_timer.install()
+
+    async def call_tool(i):
+        output = json.loads(await query_federal_registry_db(**workload[i]))
+        if "error" in output:
+            raise RuntimeError(output["error"])
+
+    try:
+        latencies, errors, wall = await _drive(
+            call_tool, args.requests, args.concurrency
+        )
+    finally:
+        await close_db_pool()
+    return _summarize(latencies, errors, wall, db_timer)
+
+
+async def run_chat_scenario(args):
+    import httpx
+
+    fake_llm = _start_fake(
+        "llm",
+        args.llm_port,
+        "--latency-ms",
+        str(args.llm_latency_ms),
+        "--jitter-ms",
+        str(args.llm_jitter_ms),
+        "--seed",
+        str(args.seed),
+    )
+    db_timer = DbTimer()
+    db_timer.install()
+    try:
+        async with _serve_app(_free_port()) as base_url:
+            async with httpx.AsyncClient(base_url=base_url, timeout=120) as client:
+
+                async def chat(i):
+                    body = {
+                        "query": CHAT_QUESTIONS[i % len(CHAT_QUESTIONS)],
+                        "bypass_cache": not args.caches,
+                    }
+                    if not args.stream:
+                        response = await client.post("/chat", json=body)
+                        response.raise_for_status()
+                        return
+                    async with client.stream(
+                        "POST", "/chat/stream", json=body
+                    ) as response:
+                        response.raise_for_status()
+                        async for line in response.aiter_lines():
+                            if line.startswith("event: error"):
+                                raise RuntimeError("error event in stream")
+
+                latencies, errors, wall = await _drive(
+                    chat, args.requests, args.concurrency
+                )
+                llm_stats = (await client.get("/monitoring/llm")).json()
+    finally:
+        fake_llm.terminate()
+        fake_llm.wait()
+    metrics = _summarize(latencies, errors, wall, db_timer)
+    metrics["llm"] = {
+        "requests": llm_stats.get("requests"),
+        "retries": llm_stats.get("retries"),
+        "rejected": llm_stats.get("rejected"),
+        "latency_seconds": llm_stats.get("latency_seconds"),
+        "queue_wait_seconds": llm_stats.get("queue_wait_seconds"),
+    }
+    return metrics
+
+
+async def run_pipeline_scenario(args):
+    import httpx
+
+    from data_pipeline import main_pipeline
+
+    load_durations_ms = []
+    load_data_to_db = main_pipeline.load_data_to_db
+
+    def timed_load(*load_args, **load_kwargs):
+        started = time.perf_counter()
+        try:
+            return load_data_to_db(*load_args, **load_kwargs)
+        finally:
+            load_durations_ms.append((time.perf_counter() - started) * 1000)
+
+    main_pipeline.load_data_to_db = timed_load
+
+    stub = _start_fake(
+        "federal-register",
+        args.federal_register_port,
+        "--docs-per-day",
+        str(args.docs_per_day),
+        "--latency-ms",
+        str(args.api_latency_ms),
+        "--seed",
+        str(args.seed),
+    )
+    try:
+        async with _serve_app(_free_port()) as base_url:
+            async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+                started = time.perf_counter()
+                job = (await client.post("/run_data_pipeline")).json()
+                # Status polls double as a probe of API responsiveness during the run.
+                poll_latencies_ms = []
+                while True:
+                    poll_started = time.perf_counter()
+                    status = (
+                        await client.get(f"/pipeline/status/{job['job_id']}")
+                    ).json()
+                    poll_latencies_ms.append(
+                        (time.perf_counter() - poll_started) * 1000
+                    )
+                    if status["status"] in ("succeeded", "failed"):
+                        break
+                    await asyncio.sleep(0.2)
+                wall = time.perf_counter() - started
+    finally:
+        stub.terminate()
+        stub.wait()
+        main_pipeline.load_data_to_db = load_data_to_db
+
+    metrics = _summarize(poll_latencies_ms, [], wall)
+    documents = status["progress"].get("documents_loaded", 0)
+    metrics.update(
+        {
+            "status": status["status"],
+            "error": status["error"],
+            "documents": documents,
+            "documents_per_s": round(documents / wall, 1) if wall else None,
+            "db_ms": round(sum(load_durations_ms), 1),
+            "db_ms_per_batch": (
+                round(sum(load_durations_ms) / len(load_durations_ms), 1)
+                if load_durations_ms
+                else None
+            ),
+            "progress": status["progress"],
+            "stages": status["stages"],
+        }
+    )
+    # Throughput here is documents per second; poll latency is the API's responsiveness.
+    metrics["throughput_per_s"] = metrics["documents_per_s"]
+    return metrics
+
+
+SCENARIOS = {
+    "tool": run_tool_scenario,
+    "chat": run_chat_scenario,
+    "pipeline": run_pipeline_scenario,
+}
+SCENARIO_PARAMETERS = {
+    "tool": ("backend", "rows", "requests", "concurrency", "caches", "seed"),
+    "chat": (
+        "backend",
+        "requests",
+        "concurrency",
+        "llm_latency_ms",
+        "llm_jitter_ms",
+        "stream",
+        "caches",
+        "seed",
+    ),
+    "pipeline": ("days", "docs_per_day", "api_latency_ms", "seed"),
+}
+
+
+# --- Results ---
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_history():
+    if not os.path.exists(RESULTS_FILE):
+        return []
+    with open(RESULTS_FILE, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def store_result(record):
+    os.makedirs(os.path.dirname(RESULTS_FILE), exist_ok=True)
+    with open(RESULTS_FILE, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record) + "\n")
+
+
+def print_comparison(record, previous):
+    print(f"\n{'metric':<22} {'this run':>12} {'previous':>12} {'change':>9}")
+    for metric in COMPARED_METRICS:
+        current = record["metrics"].get(metric)
+        before = previous["metrics"].get(metric) if previous else None
+        change = ""
+        if current is not None and before:
+            change = f"{(current - before) / before:+.1%}"
+        print(
+            f"{metric:<22} {str(current):>12} {str(before if previous else '-'):>12} {change:>9}"
+        )
+    if previous:
+        print(
+            f"(previous: {previous['timestamp']}, commit {previous.get('git_commit')})"
+        )
+
+
+def print_history():
+    print(
+        f"{'timestamp':<20} {'commit':<9} {'scenario':<9} {'p50_ms':>9} {'p95_ms':>9} {'p99_ms':>9} {'thr/s':>9}  parameters"
+    )
+    for record in load_history():
+        metrics = record["metrics"]
+        print(
+            f"{record['timestamp']:<20} {str(record.get('git_commit')):<9} {record['scenario']:<9} "
+            f"{str(metrics.get('p50_ms')):>9} {str(metrics.get('p95_ms')):>9} "
+            f"{str(metrics.get('p99_ms')):>9} {str(metrics.get('throughput_per_s')):>9}  "
+            f"{json.dumps(record['parameters'], sort_keys=True)}"
+        )
+
+
+def run(args):
+    with tempfile.TemporaryDirectory(prefix="fr-benchmark-") as workdir:
+        _configure_environment(args, workdir)
+        parameters = {
+            name: getattr(args, name) for name in SCENARIO_PARAMETERS[args.scenario]
+        }
+        print(
+            f"Running {args.scenario} scenario: {json.dumps(parameters, sort_keys=True)}"
+        )
+        metrics = asyncio.run(SCENARIOS[args.scenario](args))
+
+    record = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "git_commit": _git_commit(),
+        "scenario": args.scenario,
+        "parameters": parameters,
+        "metrics": metrics,
+    }
+    previous = None
+    for candidate in load_history():
+        # Failed pipeline runs are kept in the history but are no baseline.
+        if (
+            candidate["scenario"] == args.scenario
+            and candidate["parameters"] == parameters
+            and candidate["metrics"].get("status") != "failed"
+        ):
+            previous = candidate
+    print(json.dumps(metrics, indent=2, default=str))
+    print_comparison(record, previous)
+    store_result(record)
+    print(f"\nStored in {RESULTS_FILE}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("scenario", choices=(*SCENARIOS, "history"))
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument(
+        "--caches", action="store_true", help="Keep the answer and tool caches on."
+    )
+    parser.add_argument("--backend", choices=("mysql", "sqlite"), default="mysql")
+    parser.add_argument("--index-path", default=DEFAULT_INDEX_PATH)
+    parser.add_argument(
+        "--rows",
+        type=int,
+        default=10_000,
+        help="Corpus size: 10000, 100000 or 1000000.",
+    )
+    parser.add_argument(
+        "--seed-corpus",
+        action="store_true",
+        help="Seed the corpus before the tool scenario.",
+    )
+    parser.add_argument("--llm-latency-ms", type=float, default=200)
+    parser.add_argument("--llm-jitter-ms", type=float, default=50)
+    parser.add_argument(
+        "--stream", action="store_true", help="Use /chat/stream instead of /chat."
+    )
+    parser.add_argument("--days", type=int, default=7)
+    parser.add_argument("--docs-per-day", type=int, default=500)
+    parser.add_argument("--api-latency-ms", type=float, default=50)
+    args = parser.parse_args()
+    if args.scenario == "history":
+        print_history()
+    else:
+        run(args)
@@ -0,0 +1,248 @@
+"""
+Local stand-ins for the external services, for benchmarks and load tests.
+
+    python -m benchmarks.fakes llm --port 8011 --latency-ms 200 --jitter-ms 50
+    python -m benchmarks.fakes federal-register --port 8012 --docs-per-day 500
+
+`llm` is an OpenAI-compatible server (chat completions, streaming, embeddings)
+that follows a script: a user question gets a query_federal_registry_db tool
+call taken from the seeded workload, a tool result gets a short final answer.
+`federal-register` serves deterministic synthetic documents for any date, paged
+like the real API. Both can add latency; the stub can also answer 429s.
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import time
+import zlib
+
+from aiohttp import web
+
+from benchmarks.corpus import raw_documents_for_date, tool_argument_workload
+
+EMBEDDING_DIM = 64
+
+
+class _Latency:
+    def __init__(self, latency_ms, jitter_ms, seed):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self._rng = random.Random(seed)
+
+    async def wait(self):
+        delay_ms = self.latency_ms + self._rng.uniform(-self.jitter_ms, self.jitter_ms)
+        if delay_ms > 0:
+            await asyncio.sleep(delay_ms / 1000)
+
+
+def _usage(prompt_text, completion_text):
+    prompt_tokens = len(prompt_text) // 4 + 1
+    completion_tokens = len(completion_text) // 4 + 1
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+    }
+
+
+def _fake_embedding(text):
+    """Deterministic bag-of-words vector, so similar texts get similar embeddings."""
+    vector = [0.0] * EMBEDDING_DIM
+    for word in text.lower().split():
+        vector[zlib.crc32(word.encode("utf-8")) % EMBEDDING_DIM] += 1.0
+    return vector
+
+
+def build_fake_llm_app(latency_ms=200, jitter_ms=50, seed=42, workload_size=1000):
+    latency = _Latency(latency_ms, jitter_ms, seed)
+    scripted_calls = itertools.cycle(tool_argument_workload(workload_size, seed))
+    counters = {"completions": 0, "tool_calls": 0, "embeddings": 0}
+
+    def next_turn(messages, tools):
+        """Returns (content, tool_calls) for the scripted reply to `messages`."""
+        if not tools or (messages and messages[-1].get("role") == "tool"):
+            found = 0
+            for message in reversed(messages):
+                if message.get("role") != "tool":
+                    break
+                try:
+                    found += json.loads(message.get("content") or "{}").get("count", 0)
+                except (TypeError, ValueError, AttributeError):
+                    pass
+            return f"I found {found} matching documents in the Federal Register.", None
+        counters["tool_calls"] += 1
+        tool_call = {
+            "id": f"call_{counters['tool_calls']}",
+            "type": "function",
+            "function": {
+                "name": "query_federal_registry_db",
+                "arguments": json.dumps(next(scripted_calls)),
+            },
+        }
+        return None, [tool_call]
+
+    async def chat_completions(request):
+        body = await request.json()
+        counters["completions"] += 1
+        await latency.wait()
+        content, tool_calls = next_turn(body.get("messages", []), body.get("tools"))
+        prompt_text = json.dumps(body.get("messages", []))
+        completion_text = content or json.dumps(tool_calls)
+        created = int(time.time())
+        finish_reason = "tool_calls" if tool_calls else "stop"
+
+        if not body.get("stream"):
+            message = {"role": "assistant", "content": content}
+            if tool_calls:
+                message["tool_calls"] = tool_calls
+            return web.json_response(
+                {
+                    "id": f"chatcmpl-{counters['completions']}",
+                    "object": "chat.completion",
+                    "created": created,
+                    "model": body.get("model"),
+                    "choices": [
+                        {"index": 0, "message": message, "finish_reason": finish_reason}
+                    ],
+                    "usage": _usage(prompt_text, completion_text),
+                }
+            )
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+
+        async def send(delta, finish=None):
+            chunk = {
+                "id": f"chatcmpl-{counters['completions']}",
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": body.get("model"),
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish}],
+            }
+            await response.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+
+        if tool_calls:
+            await send(
+                {
+                    "role": "assistant",
+                    "tool_calls": [{"index": 0, **tool_calls[0]}],
+                }
+            )
+        else:
+            for word in content.split(" "):
+                await send({"content": word + " "})
+        await send({}, finish_reason)
+        if (body.get("stream_options") or {}).get("include_usage"):
+            usage_chunk = {
+                "id": f"chatcmpl-{counters['completions']}",
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": body.get("model"),
+                "choices": [],
+                "usage": _usage(prompt_text, completion_text),
+            }
+            await response.write(
+                f"data: {json.dumps(usage_chunk)}\n\n".encode("utf-8")
+            )
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+    async def embeddings(request):
+        body = await request.json()
+        counters["embeddings"] += 1
+        await latency.wait()
+        texts = body.get("input")
+        texts = [texts] if isinstance(texts, str) else texts
+        return web.json_response(
+            {
+                "object": "list",
+                "data": [
+                    {
+                        "object": "embedding",
+                        "index": i,
+                        "embedding": _fake_embedding(text),
+                    }
+                    for i, text in enumerate(texts)
+                ],
+                "model": body.get("model"),
+                "usage": _usage("".join(texts), ""),
+            }
+        )
+
+    async def stats(request):
+        return web.json_response(counters)
+
+    app = web.Application(client_max_size=64 * 1024 * 1024)
+    app.router.add_post("/v1/chat/completions", chat_completions)
+    app.router.add_post("/v1/embeddings", embeddings)
+    app.router.add_get("/stats", stats)
+    return app
+
+
+def build_stub_federal_register_app(
+    docs_per_day=500, latency_ms=50, jitter_ms=10, error_rate=0.0, seed=42
+):
+    latency = _Latency(latency_ms, jitter_ms, seed)
+    rng = random.Random(seed)
+    counters = {"requests": 0, "throttled": 0}
+
+    async def documents(request):
+        counters["requests"] += 1
+        await latency.wait()
+        if error_rate and rng.random() < error_rate:
+            counters["throttled"] += 1
+            return web.json_response(
+                {"error": "Too Many Requests"}, status=429, headers={"Retry-After": "1"}
+            )
+        date_str = request.query.get("conditions[publication_date][gte]")
+        per_page = int(request.query.get("per_page", 20))
+        page = int(request.query.get("page", 1))
+        results = raw_documents_for_date(date_str, docs_per_day, seed)
+        total_pages = max(1, -(-len(results) // per_page))
+        return web.json_response(
+            {
+                "count": len(results),
+                "total_pages": total_pages,
+                "results": results[(page - 1) * per_page : page * per_page],
+            }
+        )
+
+    async def stats(request):
+        return web.json_response(counters)
+
+    app = web.Application()
+    app.router.add_get("/documents.json", documents)
+    app.router.add_get("/stats", stats)
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("service", choices=("llm", "federal-register"))
+    parser.add_argument("--port", type=int, default=8011)
+    parser.add_argument("--latency-ms", type=float, default=None)
+    parser.add_argument("--jitter-ms", type=float, default=None)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--docs-per-day", type=int, default=500)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    if args.service == "llm":
+        app = build_fake_llm_app(
+            200 if args.latency_ms is None else args.latency_ms,
+            50 if args.jitter_ms is None else args.jitter_ms,
+            args.seed,
+        )
+    else:
+        app = build_stub_federal_register_app(
+            args.docs_per_day,
+            50 if args.latency_ms is None else args.latency_ms,
+            10 if args.jitter_ms is None else args.jitter_ms,
+            args.error_rate,
+            args.seed,
+        )
+    web.run_app(app, host="127.0.0.1", port=args.port, print=None)
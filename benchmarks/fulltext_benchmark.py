@@ -0,0 +1,145 @@
+"""
+Compares the LIKE keyword path with the FULLTEXT search modes on a synthetic table.
+
+    python -m benchmarks.fulltext_benchmark --rows 1000000 --repeat 5
+
+The synthetic rows go into a separate `documents_bench` table so the real
+`documents` table is never touched. Pass --keep to reuse the table between runs.
+"""
+
+import argparse
+import random
+import statistics
+import time
+
+from datetime import date, timedelta
+
+from agent.tool_executor import build_document_query
+from data_pipeline.db_loader import get_db_pool
+
+BENCH_TABLE = "documents_bench"
+
+VOCABULARY = [
+    "environmental", "protection", "agency", "emissions", "vehicle", "standards",
+    "energy", "efficiency", "conservation", "appliances", "air", "quality",
+    "water", "pollution", "discharge", "permit", "wildlife", "endangered",
+    "species", "habitat", "fisheries", "marine", "aviation", "safety",
+    "airworthiness", "directives", "medicare", "payment", "hospital",
+    "security", "export", "controls", "sanctions", "tariff", "trade",
+    "agriculture", "commodity", "pesticide", "tolerance", "drug", "device",
+    "labeling", "food", "railroad", "pipeline", "hazardous", "materials",
+    "education", "student", "loan", "housing", "mortgage", "tax", "revenue",
+]
+TYPES = ["Rule", "Proposed Rule", "Notice", "Presidential Document"]
+
+KEYWORD_CASES = [
+    "emissions vehicle",
+    "endangered species habitat",
+    "medicare hospital payment",
+    "air quality",
+    "tax",
+]
+
+
+def _random_text(rng, words):
+    return " ".join(rng.choice(VOCABULARY) for _ in range(words))
+
+
+def create_bench_table(connection, rows, batch_size=5000, seed=42):
+    rng = random.Random(seed)
+    start = date(2000, 1, 1)
+    with connection.cursor() as cur:
+        cur.execute(f"DROP TABLE IF EXISTS {BENCH_TABLE}")
+        cur.execute(
+            f"""
+            CREATE TABLE {BENCH_TABLE} (
+                id INT AUTO_INCREMENT PRIMARY KEY,
+                document_number VARCHAR(255) UNIQUE NOT NULL,
+                title TEXT,
+                type VARCHAR(100),
+                abstract TEXT,
+                publication_date DATE,
+                agencies JSON,
+                president VARCHAR(255) NULL,
+                document_url TEXT,
+                INDEX idx_publication_date (publication_date)
+            )
+            """
+        )
+        insert_query = (
+            f"INSERT INTO {BENCH_TABLE} (document_number, title, type, abstract, publication_date, agencies, president, document_url) "
+            "VALUES (%s, %s, %s, %s, %s, %s, %s, %s)"
+        )
+        batch = []
+        started = time.perf_counter()
+        for i in range(rows):
+            batch.append(
+                (
+                    f"BENCH-{i:08d}",
+                    _random_text(rng, 8),
+                    rng.choice(TYPES),
+                    _random_text(rng, 60),
+                    start + timedelta(days=rng.randint(0, 9000)),
+                    '["Synthetic Agency"]',
+                    None,
+                    f"https://example.invalid/{i}",
+                )
+            )
+            if len(batch) >= batch_size:
+                cur.executemany(insert_query, batch)
+                connection.commit()
+                batch = []
+        if batch:
+            cur.executemany(insert_query, batch)
+            connection.commit()
+        print(f"Inserted {rows} rows in {time.perf_counter() - started:.1f}s")
+
+        started = time.perf_counter()
+        cur.execute(
+            f"CREATE FULLTEXT INDEX ft_title_abstract ON {BENCH_TABLE} (title, abstract)"
+        )
+        print(f"Built FULLTEXT index in {time.perf_counter() - started:.1f}s")
+
+
+def time_query(connection, query, params, repeat):
+    timings = []
+    row_count = 0
+    with connection.cursor() as cur:
+        for _ in range(repeat):
+            started = time.perf_counter()
+            cur.execute(query, tuple(params))
+            row_count = len(cur.fetchall())
+            timings.append((time.perf_counter() - started) * 1000)
+    return timings, row_count
+
+
+def run_benchmark(rows, repeat, keep):
+    connection = get_db_pool()
+    try:
+        if not keep:
+            create_bench_table(connection, rows)
+
+        print(f"\n{'keywords':<30} {'mode':<8} {'median ms':>10} {'max ms':>10} {'rows':>5}")
+        for keywords in KEYWORD_CASES:
+            for mode in ("like", "natural", "boolean"):
+                query, params = build_document_query(
+                    {"query_keywords": keywords, "search_mode": mode, "limit": 25},
+                    table=BENCH_TABLE,
+                )
+                timings, row_count = time_query(connection, query, params, repeat)
+                print(
+                    f"{keywords:<30} {mode:<8} {statistics.median(timings):>10.1f} {max(timings):>10.1f} {row_count:>5}"
+                )
+    finally:
+        connection.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--keep", action="store_true", help="Reuse the existing bench table."
+    )
+    args = parser.parse_args()
+    run_benchmark(args.rows, args.repeat, args.keep)
@@ -0,0 +1,82 @@
+"""
+Runs the same tool queries against the MySQL backend and the local SQLite FTS5 index.
+
+    python -m benchmarks.search_backend_benchmark --repeat 20 --rebuild
+
+Both backends are queried through tool_executor with the result cache bypassed,
+so timings include the full fetch + count path the agent uses. --rebuild
+refreshes the index from the current `documents` table first.
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+from agent.db_pool import close_db_pool
+from agent.search_index import get_search_index
+from agent.tool_executor import _execute_document_query, normalize_tool_arguments
+
+QUERY_CASES = [
+    {"query_keywords": "emissions vehicle"},
+    {"query_keywords": "endangered species habitat", "search_mode": "boolean"},
+    {"query_keywords": "medicare hospital payment", "document_type": "Rule"},
+    {"query_keywords": "air quality", "sort_by_date": "desc"},
+    {"query_keywords": "tax", "search_mode": "like"},
+    {"agency_name": "environmental protection", "limit": 10},
+    {"president_name": "biden", "document_type": "Presidential Document"},
+    {
+        "publication_date_start": "2024-01-01",
+        "publication_date_end": "2024-12-31",
+        "document_type": "Notice",
+    },
+]
+
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+async def time_backend(backend, arguments, repeat):
+    timings = []
+    result = {}
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = await _execute_document_query(arguments, backend=backend)
+        timings.append((time.perf_counter() - started) * 1000)
+    if "error" in result:
+        raise RuntimeError(f"{backend}: {result['error']}")
+    return timings, result.get("total_matches") or 0
+
+
+async def run_benchmark(repeat, rebuild):
+    index = get_search_index()
+    if rebuild or index.document_count() == 0:
+        await asyncio.to_thread(index.rebuild_from_mysql)
+
+    print(
+        f"\n{'query':<60} {'backend':<8} {'median ms':>10} {'p95 ms':>10} {'matches':>8}"
+    )
+    try:
+        for case in QUERY_CASES:
+            arguments = normalize_tool_arguments(case)
+            label = ", ".join(f"{k}={v}" for k, v in case.items())[:60]
+            for backend in ("mysql", "sqlite"):
+                timings, matches = await time_backend(backend, arguments, repeat)
+                print(
+                    f"{label:<60} {backend:<8} {statistics.median(timings):>10.2f} "
+                    f"{_percentile(timings, 0.95):>10.2f} {matches:>8}"
+                )
+    finally:
+        await close_db_pool()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument(
+        "--rebuild", action="store_true", help="Rebuild the index from MySQL first."
+    )
+    args = parser.parse_args()
+    asyncio.run(run_benchmark(args.repeat, args.rebuild))
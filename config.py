@@ -1,4 +1,5 @@
 import os
+import httpx
 from openai import AsyncOpenAI
 
 from dotenv import load_dotenv, find_dotenv
@@ -14,27 +15,221 @@ class Config:
             self.DB_PASSWORD = os.getenv("DB_PASSWORD")
             self.DB_NAME = os.getenv("DB_NAME")
             self.DB_PORT = int(os.getenv("DB_PORT"))
+
+            # Shared aiomysql pool used by the agent tools
+            self.DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "1"))
+            self.DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+            self.DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "3600"))
+            self.DB_POOL_ACQUIRE_TIMEOUT = float(
+                os.getenv("DB_POOL_ACQUIRE_TIMEOUT", "5")
+            )
+            # Full-table exports hold a pooled connection for the whole download;
+            # capped below the pool size so the agent tools always find one free.
+            self.EXPORT_MAX_CONCURRENCY = max(
+                1,
+                min(
+                    int(os.getenv("EXPORT_MAX_CONCURRENCY", "2")),
+                    self.DB_POOL_MAX_SIZE - 1,
+                ),
+            )
             print("Database configuration loaded successfully.")
 
             # Ollama Configuration
             self.OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL")
             self.OLLAMA_MODEL = os.getenv("OLLAMA_MODEL")
             self.OLLAMA_API_KEY = os.getenv("OLLAMA_API_KEY")
+            # LLM client: timeouts, retries (done by agent/llm_client.py) and admission
+            self.LLM_REQUEST_TIMEOUT_SECONDS = float(
+                os.getenv("LLM_REQUEST_TIMEOUT_SECONDS", "60")
+            )
+            self.LLM_CONNECT_TIMEOUT_SECONDS = float(
+                os.getenv("LLM_CONNECT_TIMEOUT_SECONDS", "5")
+            )
+            self.LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+            self.LLM_BACKOFF_BASE_SECONDS = float(
+                os.getenv("LLM_BACKOFF_BASE_SECONDS", "0.5")
+            )
+            self.LLM_BACKOFF_MAX_SECONDS = float(
+                os.getenv("LLM_BACKOFF_MAX_SECONDS", "8")
+            )
+            # Requests sent to Ollama at once; more wait in a bounded queue.
+            self.LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+            self.LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "16"))
+            self.LLM_QUEUE_TIMEOUT_SECONDS = float(
+                os.getenv("LLM_QUEUE_TIMEOUT_SECONDS", "10")
+            )
             self.aclient = AsyncOpenAI(
                 base_url=self.OLLAMA_BASE_URL,
                 api_key=str(self.OLLAMA_API_KEY),
+                timeout=httpx.Timeout(
+                    self.LLM_REQUEST_TIMEOUT_SECONDS,
+                    connect=self.LLM_CONNECT_TIMEOUT_SECONDS,
+                ),
+                # Retries happen in agent/llm_client.py, with jitter and metrics.
+                max_retries=0,
+                # One keep-alive pool, sized for the admitted concurrency.
+                http_client=httpx.AsyncClient(
+                    limits=httpx.Limits(
+                        max_connections=self.LLM_MAX_CONCURRENCY * 2,
+                        max_keepalive_connections=self.LLM_MAX_CONCURRENCY * 2,
+                    )
+                ),
             )
 
             print("Ollama configuration loaded successfully.")
 
             # Federal Registry API
-            self.FEDERAL_REGISTER_API_URL = "https://www.federalregister.gov/api/v1/public-inspection-documents.json"
+            self.FEDERAL_REGISTER_API_URL = os.getenv(
+                "FEDERAL_REGISTER_API_URL",
+                "https://www.federalregister.gov/api/v1/public-inspection-documents.json",
+            )
+            # Downloader pacing: token bucket shared by all dates and pages
+            self.FEDERAL_REGISTER_RATE_LIMIT_PER_SECOND = float(
+                os.getenv("FEDERAL_REGISTER_RATE_LIMIT_PER_SECOND", "5")
+            )
+            self.FEDERAL_REGISTER_RATE_LIMIT_BURST = int(
+                os.getenv("FEDERAL_REGISTER_RATE_LIMIT_BURST", "10")
+            )
+            self.FEDERAL_REGISTER_MAX_RETRIES = int(
+                os.getenv("FEDERAL_REGISTER_MAX_RETRIES", "5")
+            )
+            self.FEDERAL_REGISTER_BACKOFF_BASE_SECONDS = float(
+                os.getenv("FEDERAL_REGISTER_BACKOFF_BASE_SECONDS", "1")
+            )
+            self.FEDERAL_REGISTER_BACKOFF_MAX_SECONDS = float(
+                os.getenv("FEDERAL_REGISTER_BACKOFF_MAX_SECONDS", "60")
+            )
+            self.FEDERAL_REGISTER_REQUEST_TIMEOUT = float(
+                os.getenv("FEDERAL_REGISTER_REQUEST_TIMEOUT", "30")
+            )
+            self.DOWNLOAD_DATE_CONCURRENCY = int(
+                os.getenv("DOWNLOAD_DATE_CONCURRENCY", "4")
+            )
+            self.DOWNLOAD_CONNECTION_LIMIT = int(
+                os.getenv("DOWNLOAD_CONNECTION_LIMIT", "5")
+            )
             print("Federal Register API URL loaded successfully.")
 
+            # Keyword search: "natural" / "boolean" use the FULLTEXT index, "like" scans.
+            self.SEARCH_MODE = os.getenv("SEARCH_MODE", "natural").lower()
+            # Tool search backend: "mysql", or "sqlite" for the local FTS5 index that
+            # the pipeline keeps up to date (build it with `python -m agent.search_index --rebuild`).
+            self.SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "mysql").lower()
+            self.SEARCH_INDEX_PATH = os.getenv(
+                "SEARCH_INDEX_PATH", "data_pipeline/search_index.sqlite3"
+            )
+            # Maintain the index even while MySQL serves searches, e.g. to benchmark both.
+            self.SEARCH_INDEX_ENABLED = (
+                os.getenv("SEARCH_INDEX_ENABLED", "false").lower() == "true"
+                or self.SEARCH_BACKEND == "sqlite"
+            )
+            # Semantic search tool: title/abstract embeddings in a memory-mapped
+            # float32 matrix, kept up to date by the pipeline. Needs an embedding model.
+            self.SEMANTIC_EMBEDDING_MODEL = os.getenv("SEMANTIC_EMBEDDING_MODEL", "")
+            self.SEMANTIC_SEARCH_ENABLED = (
+                os.getenv("SEMANTIC_SEARCH_ENABLED", "false").lower() == "true"
+                and bool(self.SEMANTIC_EMBEDDING_MODEL)
+            )
+            self.SEMANTIC_INDEX_DIR = os.getenv(
+                "SEMANTIC_INDEX_DIR", "data_pipeline/semantic_index"
+            )
+            self.SEMANTIC_EMBEDDING_BATCH_SIZE = int(
+                os.getenv("SEMANTIC_EMBEDDING_BATCH_SIZE", "64")
+            )
+            # Filtered searches rank every matching document up to this many; beyond
+            # it, the SEMANTIC_TOP_CANDIDATES most similar documents are filtered instead.
+            self.SEMANTIC_FILTER_CANDIDATE_CAP = int(
+                os.getenv("SEMANTIC_FILTER_CANDIDATE_CAP", "20000")
+            )
+            self.SEMANTIC_TOP_CANDIDATES = int(
+                os.getenv("SEMANTIC_TOP_CANDIDATES", "200")
+            )
+            # Must match the server's innodb_ft_min_token_size; shorter terms use LIKE.
+            self.FULLTEXT_MIN_TOKEN_SIZE = int(
+                os.getenv("FULLTEXT_MIN_TOKEN_SIZE", "3")
+            )
+            # Cache of query_federal_registry_db results, dropped on every data load
+            self.TOOL_CACHE_ENABLED = (
+                os.getenv("TOOL_CACHE_ENABLED", "true").lower() == "true"
+            )
+            self.TOOL_CACHE_MAX_ENTRIES = int(
+                os.getenv("TOOL_CACHE_MAX_ENTRIES", "512")
+            )
+            self.TOOL_CACHE_TTL_SECONDS = int(
+                os.getenv("TOOL_CACHE_TTL_SECONDS", "600")
+            )
+            # Cache of final answers in front of the LLM loop. Setting an
+            # embedding model (e.g. a local Ollama one) lets paraphrases hit too.
+            self.ANSWER_CACHE_ENABLED = (
+                os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+            )
+            self.ANSWER_CACHE_MAX_ENTRIES = int(
+                os.getenv("ANSWER_CACHE_MAX_ENTRIES", "256")
+            )
+            self.ANSWER_CACHE_TTL_SECONDS = int(
+                os.getenv("ANSWER_CACHE_TTL_SECONDS", "1800")
+            )
+            self.ANSWER_CACHE_EMBEDDING_MODEL = os.getenv(
+                "ANSWER_CACHE_EMBEDDING_MODEL", ""
+            )
+            self.ANSWER_CACHE_SIMILARITY_THRESHOLD = float(
+                os.getenv("ANSWER_CACHE_SIMILARITY_THRESHOLD", "0.92")
+            )
+            # The tool counts matches up to this cap; larger totals are reported as "at least".
+            self.TOOL_MATCH_COUNT_CAP = int(os.getenv("TOOL_MATCH_COUNT_CAP", "1000"))
+            print("Search configuration loaded successfully.")
+
+            # Chat sessions: "memory" (LRU with TTL) or "sqlite" (local file)
+            self.SESSION_STORE = os.getenv("SESSION_STORE", "memory").lower()
+            self.SESSION_SQLITE_PATH = os.getenv(
+                "SESSION_SQLITE_PATH", "chat_sessions.sqlite3"
+            )
+            self.SESSION_MAX_COUNT = int(os.getenv("SESSION_MAX_COUNT", "1000"))
+            self.SESSION_TTL_SECONDS = int(os.getenv("SESSION_TTL_SECONDS", "3600"))
+            self.SESSION_MAX_STORED_MESSAGES = int(
+                os.getenv("SESSION_MAX_STORED_MESSAGES", "100")
+            )
+            # Bounds on the history sent to the LLM; older turns are summarized.
+            self.CHAT_HISTORY_MAX_MESSAGES = int(
+                os.getenv("CHAT_HISTORY_MAX_MESSAGES", "12")
+            )
+            self.CHAT_HISTORY_MAX_TOKENS = int(
+                os.getenv("CHAT_HISTORY_MAX_TOKENS", "2000")
+            )
+            print("Session configuration loaded successfully.")
+
             # Data Pipeline Configuration
-            self.RAW_DATA_DIR = "data_pipeline/raw_data"
-            self.PROCESSED_DATA_DIR = "data_pipeline/processed_data"
+            self.RAW_DATA_DIR = os.getenv("RAW_DATA_DIR", "data_pipeline/raw_data")
+            self.PROCESSED_DATA_DIR = os.getenv(
+                "PROCESSED_DATA_DIR", "data_pipeline/processed_data"
+            )
             self.PIPELINE_DATA_RETENTION_DAYS = 7
+            # Raw and processed segment compression: gzip, or zstd if zstandard is installed.
+            self.SEGMENT_COMPRESSION = os.getenv("SEGMENT_COMPRESSION", "gzip").lower()
+            # Documents handed from the processor to the loader at a time.
+            self.PROCESSOR_BATCH_SIZE = int(os.getenv("PROCESSOR_BATCH_SIZE", "1000"))
+            # Processes used to parse raw files; 1 keeps processing in-process.
+            self.PROCESSOR_WORKERS = int(os.getenv("PROCESSOR_WORKERS", "1"))
+            # Rows per loader transaction; a failed chunk only rolls back itself.
+            self.LOADER_CHUNK_SIZE = int(os.getenv("LOADER_CHUNK_SIZE", "500"))
+            # Stage chunks with LOAD DATA LOCAL INFILE (needs local_infile=ON on the server).
+            self.LOADER_USE_LOAD_DATA = (
+                os.getenv("LOADER_USE_LOAD_DATA", "false").lower() == "true"
+            )
+            # Resumable ingestion: per-date status, page checkpoints, high-water mark
+            self.INGESTION_STATE_FILE = os.getenv(
+                "INGESTION_STATE_FILE", "data_pipeline/ingestion_state.json"
+            )
+            # How far back the very first run starts when there is no state yet.
+            self.INGESTION_INITIAL_LOOKBACK_DAYS = int(
+                os.getenv("INGESTION_INITIAL_LOOKBACK_DAYS", "1")
+            )
+            # Recent, already loaded dates re-fetched conditionally (ETag/Last-Modified).
+            self.INGESTION_RECHECK_DAYS = int(os.getenv("INGESTION_RECHECK_DAYS", "2"))
+            # Bumped after every successful load; caches compare against it.
+            self.DATA_VERSION_FILE = os.getenv(
+                "DATA_VERSION_FILE", "data_pipeline/data_version.txt"
+            )
             print("Data pipeline configuration loaded successfully.")
 
             # Tool Configuration
@@ -46,12 +241,139 @@ class Config:
                         "description": (
                             "Queries the local Federal Registry documents database. "
                             "Use this to find information about US federal documents like rules, proposed rules, notices, and presidential documents (executive orders, proclamations). "
-                            "You can filter by keywords, publication dates, document types, and president names."
+                            "You can filter by keywords, publication dates, document types, president and agency. "
+                            "Results report total_matches; when next_cursor is set, pass it back as cursor to get the next page."
                         ),
+                        "parameters": {
+                            "type": "object",
+                            "properties": {
+                                "query_keywords": {
+                                    "type": "string",
+                                    "description": "Space-separated keywords matched against titles and abstracts, e.g. 'climate emissions'.",
+                                },
+                                "search_mode": {
+                                    "type": "string",
+                                    "enum": ["natural", "boolean", "like"],
+                                    "description": "How keywords are matched: 'natural' ranks by relevance, 'boolean' requires every keyword, 'like' does substring matching.",
+                                },
+                                "publication_date_exact": {
+                                    "type": "string",
+                                    "format": "date",
+                                    "description": "Only documents published on this date (YYYY-MM-DD). Overrides the date range.",
+                                },
+                                "publication_date_start": {
+                                    "type": "string",
+                                    "format": "date",
+                                    "description": "Earliest publication date, inclusive (YYYY-MM-DD).",
+                                },
+                                "publication_date_end": {
+                                    "type": "string",
+                                    "format": "date",
+                                    "description": "Latest publication date, inclusive (YYYY-MM-DD).",
+                                },
+                                "document_type": {
+                                    "type": "array",
+                                    "items": {
+                                        "type": "string",
+                                        "enum": [
+                                            "Rule",
+                                            "Proposed Rule",
+                                            "Notice",
+                                            "Presidential Document",
+                                        ],
+                                    },
+                                    "description": "Document types to include. Executive orders and proclamations are 'Presidential Document'.",
+                                },
+                                "president_name": {
+                                    "type": "string",
+                                    "description": "President associated with the document, e.g. 'Joseph R. Biden Jr.' (partial names match).",
+                                },
+                                "agency_name": {
+                                    "type": "string",
+                                    "description": "Issuing agency, e.g. 'Environmental Protection Agency' (partial names match).",
+                                },
+                                "sort_by_date": {
+                                    "type": "string",
+                                    "enum": ["asc", "desc"],
+                                    "description": "Order by publication date instead of keyword relevance.",
+                                },
+                                "limit": {
+                                    "type": "integer",
+                                    "minimum": 1,
+                                    "maximum": 25,
+                                    "description": "Maximum number of documents to return (default 5).",
+                                },
+                                "fields": {
+                                    "type": "array",
+                                    "items": {
+                                        "type": "string",
+                                        "enum": [
+                                            "document_number",
+                                            "title",
+                                            "type",
+                                            "abstract",
+                                            "publication_date",
+                                            "agencies",
+                                            "president",
+                                            "document_url",
+                                        ],
+                                    },
+                                    "description": "Only return these fields, e.g. omit 'abstract' when titles are enough.",
+                                },
+                                "cursor": {
+                                    "type": "string",
+                                    "description": "next_cursor from a previous result with the same filters, to get the next page.",
+                                },
+                            },
+                            "additionalProperties": False,
+                        },
                     },
                 }
             ]
 
+            filter_properties = self.FEDERAL_REGISTRY_TOOL_SCHEMA[0]["function"][
+                "parameters"
+            ]["properties"]
+            self.SEMANTIC_SEARCH_TOOL_SCHEMA = {
+                "type": "function",
+                "function": {
+                    "name": "semantic_search_federal_registry",
+                    "description": (
+                        "Finds Federal Registry documents whose title and abstract are closest in meaning to a natural-language query. "
+                        "Use it when the question describes a topic in its own words or a keyword search found nothing. "
+                        "Accepts the same date, type, president and agency filters as query_federal_registry_db."
+                    ),
+                    "parameters": {
+                        "type": "object",
+                        "properties": {
+                            "query": {
+                                "type": "string",
+                                "description": "What the documents should be about, in plain words, e.g. 'rules limiting pollution from trucks'.",
+                            },
+                            **{
+                                name: filter_properties[name]
+                                for name in (
+                                    "publication_date_exact",
+                                    "publication_date_start",
+                                    "publication_date_end",
+                                    "document_type",
+                                    "president_name",
+                                    "agency_name",
+                                    "limit",
+                                    "fields",
+                                )
+                            },
+                        },
+                        "required": ["query"],
+                        "additionalProperties": False,
+                    },
+                },
+            }
+            if self.SEMANTIC_SEARCH_ENABLED:
+                self.FEDERAL_REGISTRY_TOOL_SCHEMA.append(
+                    self.SEMANTIC_SEARCH_TOOL_SCHEMA
+                )
+
             self.SYSTEM_PROMPT = """You are a helpful AI assistant specializing in information from the US Federal Registry.
 Your goal is to answer user questions based on documents found in the Federal Registry database.
 You have a tool called 'query_federal_registry_db' to search this database.
@@ -61,6 +383,8 @@ When a user asks a question:
    Construct the appropriate parameters for the tool based on the user's query (e.g., keywords, dates, document types, president).
    If dates are relative like "last month" or "this year", calculate the absolute YYYY-MM-DD dates before calling the tool. Today's date is {current_date}.
 3. If you use the tool, I will execute it and provide you with the results in JSON format.
+   If the result lists invalid_arguments, fix exactly those arguments and call the tool again.
+   If a 'semantic_search_federal_registry' tool is available, use it when the user describes a topic in their own words or keyword searches find nothing, instead of guessing new keywords.
 4. Analyze the JSON results. If documents are found, synthesize the information into a concise, human-readable answer.
    Mention key details like titles, publication dates, and a brief summary or relevant snippets from the abstract if appropriate.
    Include document numbers or URLs if specifically asked or highly relevant.
@@ -71,8 +395,30 @@ Do not show the raw JSON from the tool to the user. Summarize it.
 Tool calls should not be visible to the end user in your final response.
 Keep your answers concise and directly address the user's question using the information retrieved.
 """
+            # Upper bound for a single tool call; several calls in one turn run concurrently.
+            self.TOOL_CALL_TIMEOUT_SECONDS = float(
+                os.getenv("TOOL_CALL_TIMEOUT_SECONDS", "15")
+            )
+            # Tool results are compacted to fit this many (estimated) prompt tokens.
+            self.TOOL_OUTPUT_MAX_TOKENS = int(
+                os.getenv("TOOL_OUTPUT_MAX_TOKENS", "1500")
+            )
+            self.TOOL_OUTPUT_ABSTRACT_MAX_CHARS = int(
+                os.getenv("TOOL_OUTPUT_ABSTRACT_MAX_CHARS", "500")
+            )
             print("Tool configuration loaded successfully.")
 
+            # Monitoring: requests slower than SLOW_REQUEST_SECONDS are logged with
+            # their timing spans and SQL, as JSON lines (printed if the path is empty).
+            self.SLOW_REQUEST_LOG_ENABLED = (
+                os.getenv("SLOW_REQUEST_LOG_ENABLED", "false").lower() == "true"
+            )
+            self.SLOW_REQUEST_SECONDS = float(os.getenv("SLOW_REQUEST_SECONDS", "5"))
+            self.SLOW_REQUEST_LOG_PATH = os.getenv(
+                "SLOW_REQUEST_LOG_PATH", "slow_requests.jsonl"
+            )
+            print("Monitoring configuration loaded successfully.")
+
         except Exception as e:
             print(f"Error loading configuration: {e}")
             raise e
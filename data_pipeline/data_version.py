@@ -0,0 +1,39 @@
+import os
+import time
+
+from config import global_config as config
+
+
+_cached_version = {"mtime_ns": None, "version": "0"}
+
+
+def get_data_version():
+    """
+    Returns an opaque token that changes whenever the pipeline commits new rows.
+    Only re-reads the file when its mtime changes, so it is cheap to call per request.
+    """
+    try:
+        mtime_ns = os.stat(config.DATA_VERSION_FILE).st_mtime_ns
+    except FileNotFoundError:
+        return "0"
+
+    if mtime_ns != _cached_version["mtime_ns"]:
+        with open(config.DATA_VERSION_FILE, "r") as f:
+            _cached_version["version"] = f.read().strip() or "0"
+        _cached_version["mtime_ns"] = mtime_ns
+    return _cached_version["version"]
+
+
+def bump_data_version():
+    """Marks the database as changed, invalidating caches in every process on this node."""
+    version = str(time.time_ns())
+    directory = os.path.dirname(config.DATA_VERSION_FILE)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+
+    tmp_path = f"{config.DATA_VERSION_FILE}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(version)
+    os.replace(tmp_path, config.DATA_VERSION_FILE)
+    print(f"Data version bumped to {version}.")
+    return version
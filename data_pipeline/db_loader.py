@@ -1,14 +1,20 @@
 import os
 import json
+import time
 import asyncio
+import itertools
+import tempfile
 import pymysql
 
+from .data_version import bump_data_version
+from .processor import compute_content_hash
 from config import global_config as config
 
 
-def get_db_pool():
+def get_db_pool(local_infile=False):
     timeout = 10
     connection = pymysql.connect(
+        local_infile=local_infile,
         charset="utf8mb4",
         connect_timeout=timeout,
         cursorclass=pymysql.cursors.DictCursor,
@@ -23,17 +29,99 @@ def get_db_pool():
     return connection
 
 
-def load_data_to_db(processed_data_list):
-    if not processed_data_list:
-        print("No data to load into the database.")
+def _chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i : i + size]
+
+
+def _parse_agencies(value):
+    if not value:
+        return []
+    if isinstance(value, list):
+        return value
+    try:
+        agencies = json.loads(value)
+    except json.JSONDecodeError:
+        return [value]
+    return agencies if isinstance(agencies, list) else [agencies]
+
+
+def sync_document_agencies(cur, records, in_clause_size=1000):
+    """Mirrors each record's agency list into the agencies/document_agencies tables."""
+    agencies_by_doc = {
+        record["document_number"]: [
+            name for name in _parse_agencies(record.get("agencies")) if name
+        ]
+        for record in records
+        if record.get("document_number")
+    }
+    if not agencies_by_doc:
         return
 
-    connection = get_db_pool()
-    with connection.cursor() as cur:
-        insert_query = """
-        INSERT INTO documents (document_number, title, type, abstract, publication_date, agencies, document_url, pdf_url, raw_text_url, president, executive_order_number)
-        VALUES (%(document_number)s, %(title)s, %(type)s, %(abstract)s, %(publication_date)s,%(agencies)s, %(document_url)s, %(pdf_url)s, %(raw_text_url)s, %(president)s, %(executive_order_number)s) AS alias
-        ON DUPLICATE KEY UPDATE
+    agency_names = sorted({name for names in agencies_by_doc.values() for name in names})
+    agency_ids = {}
+    if agency_names:
+        cur.executemany(
+            "INSERT IGNORE INTO agencies (name) VALUES (%s)",
+            [(name,) for name in agency_names],
+        )
+        for names in _chunks(agency_names, in_clause_size):
+            placeholders = ", ".join(["%s"] * len(names))
+            cur.execute(
+                f"SELECT id, name FROM agencies WHERE name IN ({placeholders})",
+                tuple(names),
+            )
+            agency_ids.update({row["name"]: row["id"] for row in cur.fetchall()})
+
+    document_ids = {}
+    for numbers in _chunks(list(agencies_by_doc), in_clause_size):
+        placeholders = ", ".join(["%s"] * len(numbers))
+        cur.execute(
+            f"SELECT id, document_number FROM documents WHERE document_number IN ({placeholders})",
+            tuple(numbers),
+        )
+        document_ids.update(
+            {row["document_number"]: row["id"] for row in cur.fetchall()}
+        )
+
+    for ids in _chunks(list(document_ids.values()), in_clause_size):
+        placeholders = ", ".join(["%s"] * len(ids))
+        cur.execute(
+            f"DELETE FROM document_agencies WHERE document_id IN ({placeholders})",
+            tuple(ids),
+        )
+
+    links = [
+        (document_ids[number], agency_ids[name])
+        for number, names in agencies_by_doc.items()
+        if number in document_ids
+        for name in set(names)
+        if name in agency_ids
+    ]
+    if links:
+        cur.executemany(
+            "INSERT IGNORE INTO document_agencies (document_id, agency_id) VALUES (%s, %s)",
+            links,
+        )
+
+
+DOCUMENT_COLUMNS = [
+    "document_number",
+    "title",
+    "type",
+    "abstract",
+    "publication_date",
+    "agencies",
+    "document_url",
+    "pdf_url",
+    "raw_text_url",
+    "president",
+    "executive_order_number",
+    "content_hash",
+]
+STAGING_TABLE = "documents_staging"
+
+_UPSERT_ASSIGNMENTS = """
             title = alias.title,
             type = alias.type,
             abstract = alias.abstract,
@@ -44,49 +132,214 @@ def load_data_to_db(processed_data_list):
             raw_text_url = alias.raw_text_url,
             president = alias.president,
             executive_order_number = alias.executive_order_number,
+            content_hash = alias.content_hash,
             updated_at = CURRENT_TIMESTAMP
-        """
-
-        default_keys = [
-            "document_number",
-            "title",
-            "type",
-            "abstract",
-            "publication_date",
-            "agencies",
-            "document_url",
-            "pdf_url",
-            "raw_text_url",
-            "president",
-            "executive_order_number",
-        ]
+"""
+
+INSERT_QUERY = f"""
+        INSERT INTO documents ({", ".join(DOCUMENT_COLUMNS)})
+        VALUES ({", ".join(f"%({column})s" for column in DOCUMENT_COLUMNS)}) AS alias
+        ON DUPLICATE KEY UPDATE{_UPSERT_ASSIGNMENTS}"""
+
+MERGE_STAGING_QUERY = f"""
+        INSERT INTO documents ({", ".join(DOCUMENT_COLUMNS)})
+        SELECT * FROM (SELECT {", ".join(DOCUMENT_COLUMNS)} FROM {STAGING_TABLE}) AS alias
+        ON DUPLICATE KEY UPDATE{_UPSERT_ASSIGNMENTS}"""
 
-        data_for_execution = []
-        for record in processed_data_list:
 
-            normalized_record = {key: record.get(key) for key in default_keys}
-            data_for_execution.append(normalized_record)
+def _normalize_records(records):
+    normalized = []
+    for record in records:
+        row = {key: record.get(key) for key in DOCUMENT_COLUMNS}
+        # Processed files written before content hashing have no hash yet.
+        row["content_hash"] = row["content_hash"] or compute_content_hash(row)
+        normalized.append(row)
+    return normalized
 
-        try:
-            cur.executemany(insert_query, data_for_execution)
-            connection.commit()
-            print(f"Successfully inserted/updated {cur.rowcount} records.")
-        except Exception as e:
-            connection.rollback()
-            print(f"Error during database load: {e}")
-        finally:
-            connection.close()
-            print("Database connection closed.")
+
+def _split_by_content_hash(cur, records, in_clause_size=1000):
+    """
+    Compares each record's hash with the stored one.
+    Returns (new records, changed records, number of unchanged records).
+    """
+    stored_hashes = {}
+    numbers = [record["document_number"] for record in records]
+    for batch in _chunks(numbers, in_clause_size):
+        placeholders = ", ".join(["%s"] * len(batch))
+        cur.execute(
+            f"SELECT document_number, content_hash FROM documents WHERE document_number IN ({placeholders})",
+            tuple(batch),
+        )
+        stored_hashes.update(
+            {row["document_number"]: row["content_hash"] for row in cur.fetchall()}
+        )
+
+    new_records, changed_records, unchanged = [], [], 0
+    for record in records:
+        if record["document_number"] not in stored_hashes:
+            new_records.append(record)
+        elif stored_hashes[record["document_number"]] != record["content_hash"]:
+            changed_records.append(record)
+        else:
+            unchanged += 1
+    return new_records, changed_records, unchanged
+
+
+def _escape_load_data_value(value):
+    """Encodes a value for LOAD DATA's default tab-separated format."""
+    if value is None:
+        return "\\N"
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+def _upsert_chunk(cur, records):
+    cur.executemany(INSERT_QUERY, records)
+    return cur.rowcount
+
+
+def _upsert_chunk_via_staging(cur, records):
+    """
+    Bulk path for large backfills: stream the chunk into a session-local staging
+    table with LOAD DATA LOCAL INFILE, then merge it with one INSERT ... SELECT.
+    Needs local_infile enabled on both the server and the connection.
+    """
+    cur.execute(
+        f"CREATE TEMPORARY TABLE IF NOT EXISTS {STAGING_TABLE} AS "
+        f"SELECT {', '.join(DOCUMENT_COLUMNS)} FROM documents LIMIT 0"
+    )
+    cur.execute(f"DELETE FROM {STAGING_TABLE}")
+
+    with tempfile.NamedTemporaryFile(
+        "w", encoding="utf-8", suffix=".tsv", delete=False
+    ) as staging_file:
+        for record in records:
+            staging_file.write(
+                "\t".join(
+                    _escape_load_data_value(record[column])
+                    for column in DOCUMENT_COLUMNS
+                )
+                + "\n"
+            )
+    try:
+        cur.execute(
+            f"LOAD DATA LOCAL INFILE %s INTO TABLE {STAGING_TABLE} "
+            f"CHARACTER SET utf8mb4 ({', '.join(DOCUMENT_COLUMNS)})",
+            (staging_file.name,),
+        )
+    finally:
+        os.remove(staging_file.name)
+
+    cur.execute(MERGE_STAGING_QUERY)
+    return cur.rowcount
+
+
+def load_data_to_db(processed_data, chunk_size=None, use_load_data=None):
+    """
+    Upserts processed documents in chunks of `chunk_size`, each in its own
+    transaction, so a bad row only rolls back its chunk. Accepts any iterable.
+    Rows whose content_hash matches the stored one are skipped entirely, so
+    daily reruns do not rewrite (or bump updated_at on) unchanged documents.
+    With use_load_data (or LOADER_USE_LOAD_DATA), chunks go through a
+    LOAD DATA LOCAL INFILE staging table instead of executemany.
+    Returns a report: rows, inserted/updated/unchanged counts, chunks, failed
+    chunks, affected rows and rows/sec.
+    """
+    chunk_size = chunk_size or config.LOADER_CHUNK_SIZE
+    if use_load_data is None:
+        use_load_data = config.LOADER_USE_LOAD_DATA
+    upsert_chunk = _upsert_chunk_via_staging if use_load_data else _upsert_chunk
+
+    report = {
+        "ok": True,
+        "rows": 0,
+        "inserted": 0,
+        "updated": 0,
+        "unchanged": 0,
+        "chunks": 0,
+        "affected_rows": 0,
+        "failed_chunks": [],
+        "elapsed_seconds": 0.0,
+        "rows_per_second": 0.0,
+    }
+    records_iter = iter(processed_data or [])
+    first_chunk = _normalize_records(itertools.islice(records_iter, chunk_size))
+    if not first_chunk:
+        print("No data to load into the database.")
+        return report
+
+    started_at = time.perf_counter()
+    connection = get_db_pool(local_infile=use_load_data)
+    try:
+        with connection.cursor() as cur:
+            chunk = first_chunk
+            while chunk:
+                report["chunks"] += 1
+                report["rows"] += len(chunk)
+                try:
+                    new_records, changed_records, unchanged = _split_by_content_hash(
+                        cur, chunk
+                    )
+                    to_write = new_records + changed_records
+                    affected_rows = 0
+                    if to_write:
+                        affected_rows = upsert_chunk(cur, to_write)
+                        sync_document_agencies(cur, to_write)
+                    connection.commit()
+                    report["affected_rows"] += affected_rows
+                    report["inserted"] += len(new_records)
+                    report["updated"] += len(changed_records)
+                    report["unchanged"] += unchanged
+                except Exception as e:
+                    connection.rollback()
+                    report["ok"] = False
+                    report["failed_chunks"].append(
+                        {
+                            "chunk": report["chunks"],
+                            "rows": len(chunk),
+                            "first_document_number": chunk[0].get("document_number"),
+                            "error": str(e),
+                        }
+                    )
+                    print(f"Error loading chunk {report['chunks']}: {e}")
+                chunk = _normalize_records(itertools.islice(records_iter, chunk_size))
+    finally:
+        connection.close()
+        print("Database connection closed.")
+
+    elapsed = time.perf_counter() - started_at
+    report["elapsed_seconds"] = round(elapsed, 3)
+    report["rows_per_second"] = round(report["rows"] / elapsed, 1) if elapsed else 0.0
+    print(
+        f"Loaded {report['rows']} records in {report['chunks']} chunks "
+        f"({report['inserted']} inserted, {report['updated']} updated, "
+        f"{report['unchanged']} unchanged, {report['rows_per_second']} rows/s, "
+        f"{len(report['failed_chunks'])} failed chunks)."
+    )
+    if report["affected_rows"]:
+        bump_data_version()
+    return report
+
+
+async def load_data_to_db_async(processed_data, **kwargs):
+    """Runs load_data_to_db on a worker thread so the event loop keeps serving requests."""
+    return await asyncio.to_thread(load_data_to_db, processed_data, **kwargs)
 
 
 if __name__ == "__main__":
+    import sys
+
+    from .segment_store import processed_store
 
-    sample_processed_file = os.path.join(
-        config.PROCESSED_DATA_DIR, "processed_YYYY-MM-DD_federal_register.json"
-    )  # replace YYYY-MM-DD
-    if os.path.exists(sample_processed_file):
-        with open(sample_processed_file, "r") as f:
-            test_data = json.load(f)
-        asyncio.run(load_data_to_db(test_data))
-    else:
-        print(f"Sample processed file not found: {sample_processed_file}")
+    # Reloads processed dates from the segment store, e.g. `... db_loader 2024-01-02`.
+    store = processed_store()
+    for date_str in sys.argv[1:] or store.dates()[-1:]:
+        if store.entry(date_str) is None:
+            print(f"No processed data stored for {date_str}")
+            continue
+        load_data_to_db(store.iter_documents(date_str))
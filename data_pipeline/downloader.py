@@ -1,107 +1,356 @@
-import os
+import time
+import random
 import asyncio
+import argparse
 import aiohttp
-import aiofiles
-import json
 
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
 
+from .ingestion_state import DOWNLOADING, IngestionState, PageCheckpoint
+from .segment_store import raw_store
 from config import global_config as config
 
 
-async def fetch_documents_for_date_range(
-    session, start_date_str, end_date_str, per_page=200
-):
-    """Fetches documents for a given date range, handling pagination."""
-    all_results = []
-    page = 1
-    params = {
-        "fields[]": [
-            "document_number",
-            "title",
-            "type",
-            "abstract",
-            "publication_date",
-            "agencies",
-            "cfr_references",
-            "html_url",
-            "pdf_url",
-            "raw_text_url",
-            "president",
-            "executive_order_number",
-        ],
-        "conditions[publication_date][gte]": start_date_str,
-        "conditions[publication_date][lte]": end_date_str,
-        "per_page": per_page,
-        "page": page,
-    }
+DOCUMENT_FIELDS = [
+    "document_number",
+    "title",
+    "type",
+    "abstract",
+    "publication_date",
+    "agencies",
+    "cfr_references",
+    "html_url",
+    "pdf_url",
+    "raw_text_url",
+    "president",
+    "executive_order_number",
+]
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+
+class DownloadError(Exception):
+    """A page could not be fetched after all retries; the date must not be saved partially."""
+
+
+class TokenBucket:
+    """Allows `rate` requests per second on average, with bursts of up to `capacity`."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.capacity, self._tokens + (now - self._updated_at) * self.rate
+                )
+                self._updated_at = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    async def pause(self, seconds):
+        """Empties the bucket so every caller waits, e.g. after a 429 with Retry-After."""
+        async with self._lock:
+            self._tokens = -seconds * self.rate
+            self._updated_at = time.monotonic()
+
+
+def build_rate_limiter():
+    return TokenBucket(
+        config.FEDERAL_REGISTER_RATE_LIMIT_PER_SECOND,
+        config.FEDERAL_REGISTER_RATE_LIMIT_BURST,
+    )
 
-    print(f"Fetching documents from {start_date_str} to {end_date_str}")
 
-    flag = True
-    while flag:
-        params["page"] = page
+def _retry_after_seconds(header_value):
+    if not header_value:
+        return None
+    try:
+        return max(0.0, float(header_value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(header_value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+def _backoff_seconds(attempt):
+    """Exponential backoff with full jitter."""
+    ceiling = min(
+        config.FEDERAL_REGISTER_BACKOFF_MAX_SECONDS,
+        config.FEDERAL_REGISTER_BACKOFF_BASE_SECONDS * (2**attempt),
+    )
+    return random.uniform(0, ceiling)
+
+
+def _page_params(start_date_str, end_date_str, per_page, page):
+    params = [("fields[]", field) for field in DOCUMENT_FIELDS]
+    params.extend(
+        [
+            ("conditions[publication_date][gte]", start_date_str),
+            ("conditions[publication_date][lte]", end_date_str),
+            ("per_page", str(per_page)),
+            ("page", str(page)),
+        ]
+    )
+    return params
+
+
+async def fetch_page(
+    session, params, rate_limiter, api_url=None, request_headers=None
+):
+    """
+    GETs one page, retrying 429/5xx and network errors with backoff and Retry-After.
+    Returns (data, response headers); data is None when the server answers 304.
+    """
+    api_url = api_url or config.FEDERAL_REGISTER_API_URL
+    max_retries = config.FEDERAL_REGISTER_MAX_RETRIES
+    for attempt in range(max_retries + 1):
+        await rate_limiter.acquire()
         try:
-            async with session.get(config.FEDERAL_REGISTER_API_URL) as response:
+            async with session.get(
+                api_url, params=params, headers=request_headers
+            ) as response:
+                if response.status == 304:
+                    return None, response.headers
+                if response.status in RETRYABLE_STATUSES:
+                    if attempt == max_retries:
+                        raise DownloadError(
+                            f"HTTP {response.status} after {max_retries} retries"
+                        )
+                    retry_after = _retry_after_seconds(
+                        response.headers.get("Retry-After")
+                    )
+                    print(
+                        f"HTTP {response.status}, retrying (attempt {attempt + 1}/{max_retries})"
+                    )
+                    if retry_after is not None:
+                        # The server asked everyone to back off, not just this request.
+                        await rate_limiter.pause(retry_after)
+                    else:
+                        await asyncio.sleep(_backoff_seconds(attempt))
+                    continue
                 response.raise_for_status()
-                data = await response.json()
-                results = data.get("results", [])
-                if not results:
-                    break
-                all_results.extend(results)
-                print(
-                    f"Fetched page {page}, {len(results)} results. Total so far: {len(all_results)}"
-                )
-                if "next_page_url" not in data or not data["next_page_url"]:
-                    break
-                page += 1
-                await asyncio.sleep(0.5)
-
-                if page == 10:
-                    print("Fetching 10 pages at once, stopping to avoid rate limits.")
-                    flag = False
-        except aiohttp.ClientError as e:
-            print(f"Error fetching page {page}: {e}")
-            break
+                return await response.json(), response.headers
+        except aiohttp.ClientResponseError as e:
+            raise DownloadError(f"HTTP {e.status}: {e.message}") from e
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            if attempt == max_retries:
+                raise DownloadError(f"{e!r} after {max_retries} retries") from e
+            delay = _backoff_seconds(attempt)
+            print(f"Request failed ({e!r}), retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+
+async def fetch_documents_for_date_range(
+    session,
+    start_date_str,
+    end_date_str,
+    per_page=200,
+    rate_limiter=None,
+    api_url=None,
+    checkpoint=None,
+    request_headers=None,
+):
+    """
+    Fetches every document for a date range. The first page reports `total_pages`;
+    the remaining pages are fetched concurrently, paced by the shared rate limiter.
+    With a checkpoint, pages saved by an interrupted run are reused and new pages
+    are saved as they arrive. Returns None if a conditional request got 304.
+    """
+    rate_limiter = rate_limiter or build_rate_limiter()
+    print(f"Fetching documents from {start_date_str} to {end_date_str}")
+
+    async def get_page(page, headers=None):
+        if checkpoint is not None:
+            data = checkpoint.load_page(page)
+            if data is not None:
+                return data
+        data, response_headers = await fetch_page(
+            session,
+            _page_params(start_date_str, end_date_str, per_page, page),
+            rate_limiter,
+            api_url,
+            headers,
+        )
+        if data is not None and checkpoint is not None:
+            checkpoint.save_page(page, data, response_headers)
+        return data
+
+    first_page = await get_page(1, request_headers)
+    if first_page is None:
+        print(f"Not modified since last download: {start_date_str} to {end_date_str}")
+        return None
+    all_results = list(first_page.get("results", []))
+    if not all_results:
+        return all_results
+
+    total_pages = first_page.get("total_pages")
+    if total_pages:
+        pages = await asyncio.gather(
+            *(get_page(page) for page in range(2, int(total_pages) + 1))
+        )
+        for data in pages:
+            all_results.extend(data.get("results", []))
+    else:
+        # No page count in the response: follow next_page_url until it runs out.
+        data, page = first_page, 1
+        while data.get("next_page_url"):
+            page += 1
+            data = await get_page(page)
+            all_results.extend(data.get("results", []))
+
+    print(
+        f"Fetched {len(all_results)} documents for {start_date_str} to {end_date_str}"
+    )
     return all_results
 
 
+async def _download_date(
+    session, date_str, rate_limiter, api_url, store, state=None, conditional=False
+):
+    checkpoint = PageCheckpoint(state, date_str) if state is not None else None
+    request_headers = state.conditional_headers(date_str) if conditional else None
+    try:
+        daily_documents = await fetch_documents_for_date_range(
+            session,
+            date_str,
+            date_str,
+            rate_limiter=rate_limiter,
+            api_url=api_url,
+            checkpoint=checkpoint,
+            request_headers=request_headers,
+        )
+    except DownloadError as e:
+        print(f"Failed to download {date_str}: {e}")
+        return False
+
+    if daily_documents is None:
+        state.mark_unchanged(date_str)
+        return True
+
+    if daily_documents:
+        # Compressed and appended to the month's raw segment off the event loop.
+        entry = await asyncio.to_thread(store.write_date, date_str, daily_documents)
+        print(
+            f"Successfully downloaded {len(daily_documents)} documents for {date_str} to {entry['segment']}"
+        )
+    else:
+        print(f"No documents found for {date_str}.")
+
+    if state is not None:
+        state.mark_downloaded(date_str, len(daily_documents))
+        checkpoint.clear()
+    return True
+
+
+async def download_dates(dates, api_url=None, state=None, on_date_done=None):
+    """
+    Downloads each (date_str, conditional) into the raw segment store, fanning out
+    across dates (DOWNLOAD_DATE_CONCURRENCY) and pages under one token bucket. With an
+    IngestionState, progress is checkpointed per page and conditional dates are
+    re-fetched only if the server reports a change. `on_date_done(date_str, ok)` is
+    called as each date finishes. Returns the dates that failed.
+    """
+    store = raw_store()
+    rate_limiter = build_rate_limiter()
+    date_semaphore = asyncio.Semaphore(config.DOWNLOAD_DATE_CONCURRENCY)
+
+    async def download_one(date_str, conditional):
+        async with date_semaphore:
+            ok = await _download_date(
+                session, date_str, rate_limiter, api_url, store, state, conditional
+            )
+        if on_date_done is not None:
+            on_date_done(date_str, ok)
+        return ok
+
+    conn = aiohttp.TCPConnector(
+        limit_per_host=config.DOWNLOAD_CONNECTION_LIMIT
+    )  # Limit concurrent connections
+    timeout = aiohttp.ClientTimeout(total=config.FEDERAL_REGISTER_REQUEST_TIMEOUT)
+    async with aiohttp.ClientSession(connector=conn, timeout=timeout) as session:
+        succeeded = await asyncio.gather(*(download_one(d, c) for d, c in dates))
+
+    failed_dates = [d for (d, _), ok in zip(dates, succeeded) if not ok]
+    if failed_dates:
+        print(f"Failed to download {len(failed_dates)} date(s): {failed_dates}")
+    return failed_dates
+
+
+async def download_date_range(start_date, end_date, api_url=None, state=None):
+    """Downloads every date in [start_date, end_date). Returns the dates that failed."""
+    dates = []
+    date_to_fetch = start_date
+    while date_to_fetch < end_date:
+        dates.append((date_to_fetch.strftime("%Y-%m-%d"), False))
+        date_to_fetch += timedelta(days=1)
+    return await download_dates(dates, api_url=api_url, state=state)
+
+
 async def download_daily_data(days_ago=1):
     """Downloads data for N days ago until today."""
-    if not os.path.exists(config.RAW_DATA_DIR):
-        os.makedirs(config.RAW_DATA_DIR)
-
     end_date = datetime.now()
     start_date = end_date - timedelta(
         days=days_ago
     )  # Fetch for 'days_ago' up to yesterday.
+    return await download_date_range(start_date, end_date)
 
-    date_to_fetch = start_date
-    conn = aiohttp.TCPConnector(limit_per_host=5)  # Limit concurrent connections
-    async with aiohttp.ClientSession(connector=conn) as session:
-        while date_to_fetch < end_date:  # Fetch one day at a time to manage file size
-            date_str = date_to_fetch.strftime("%Y-%m-%d")
-            print(f"Attempting to download data for: {date_str}")
-
-            daily_documents = await fetch_documents_for_date_range(
-                session, date_str, date_str
-            )
 
-            if daily_documents:
-                file_path = os.path.join(
-                    config.RAW_DATA_DIR, f"{date_str}_federal_register.json"
-                )
-                async with aiofiles.open(file_path, mode="w", encoding="utf-8") as f:
-                    await f.write(json.dumps(daily_documents, indent=2))
-                print(
-                    f"Successfully downloaded {len(daily_documents)} documents for {date_str} to {file_path}"
-                )
-            else:
-                print(f"No documents found for {date_str} or failed to fetch.")
+async def download_pending_data(state, api_url=None, on_date_done=None):
+    """Downloads only what the ingestion state says is missing or may have changed."""
+    dates = state.dates_to_download()
+    if not dates:
+        print("Nothing to download, ingestion state is up to date.")
+        return []
+    print(f"Downloading {len(dates)} date(s): {[d for d, _ in dates]}")
+    return await download_dates(
+        dates, api_url=api_url, state=state, on_date_done=on_date_done
+    )
+
 
-            date_to_fetch += timedelta(days=1)
+async def backfill(start_date_str, end_date_str, api_url=None):
+    """Downloads an inclusive date range, e.g. a full year of history. Resumable."""
+    state = IngestionState.load()
+    dates = []
+    date_to_fetch = datetime.strptime(start_date_str, "%Y-%m-%d")
+    end_date = datetime.strptime(end_date_str, "%Y-%m-%d")
+    while date_to_fetch <= end_date:
+        date_str = date_to_fetch.strftime("%Y-%m-%d")
+        # Dates a previous run already finished are skipped.
+        if state.status(date_str) in (None, DOWNLOADING):
+            dates.append((date_str, False))
+        date_to_fetch += timedelta(days=1)
+    return await download_dates(dates, api_url=api_url, state=state)
 
 
 if __name__ == "__main__":
 
-    asyncio.run(download_daily_data(days_ago=2))
+    parser = argparse.ArgumentParser(description="Download Federal Register data.")
+    parser.add_argument(
+        "--backfill",
+        nargs=2,
+        metavar=("START_DATE", "END_DATE"),
+        help="Download an inclusive YYYY-MM-DD date range.",
+    )
+    parser.add_argument(
+        "--api-url", help="Override the API URL, e.g. a local stub server."
+    )
+    args = parser.parse_args()
+
+    if args.backfill:
+        asyncio.run(backfill(*args.backfill, api_url=args.api_url))
+    else:
+        asyncio.run(download_daily_data(days_ago=2))
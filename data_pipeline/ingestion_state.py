@@ -0,0 +1,245 @@
+import os
+import json
+import shutil
+
+from datetime import date, datetime, timedelta
+
+from config import global_config as config
+
+
+# Per-date lifecycle: downloading -> downloaded -> processed -> loaded. A date
+# whose raw data yields no documents ends as failed until it is downloaded again.
+DOWNLOADING = "downloading"
+DOWNLOADED = "downloaded"
+PROCESSED = "processed"
+LOADED = "loaded"
+FAILED = "failed"
+
+
+def _atomic_write_json(path, data):
+    directory = os.path.dirname(path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+class IngestionState:
+    """
+    Persisted record of what the pipeline has done, so a run resumes where the
+    last one stopped. Tracks a high-water mark (every date up to it is loaded),
+    per-date status, completed pages of an interrupted download, and the
+    Last-Modified/ETag validators used to skip unchanged dates on re-check.
+    """
+
+    def __init__(self, path, data=None):
+        self.path = path
+        self.data = data or {"high_water_mark": None, "dates": {}}
+
+    @classmethod
+    def load(cls, path=None):
+        path = path or config.INGESTION_STATE_FILE
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                return cls(path, json.load(f))
+        return cls(path)
+
+    def save(self):
+        _atomic_write_json(self.path, self.data)
+
+    @property
+    def high_water_mark(self):
+        return self.data["high_water_mark"]
+
+    def get(self, date_str):
+        return self.data["dates"].get(date_str, {})
+
+    def _update(self, date_str, **fields):
+        entry = self.data["dates"].setdefault(date_str, {})
+        entry.update(fields)
+        entry["updated_at"] = datetime.now().isoformat(timespec="seconds")
+        self.save()
+        return entry
+
+    def status(self, date_str):
+        return self.get(date_str).get("status")
+
+    def dates_with_status(self, status):
+        return sorted(
+            d for d, entry in self.data["dates"].items() if entry.get("status") == status
+        )
+
+    # --- Download ---
+
+    def dates_to_download(self, today=None):
+        """
+        Returns [(date_str, conditional)] to fetch: every date after the high-water
+        mark up to yesterday that has not been downloaded yet, any earlier date left
+        half-downloaded by an interrupted re-check, plus the last
+        INGESTION_RECHECK_DAYS loaded or failed dates, re-fetched conditionally.
+        """
+        today = today or date.today()
+        yesterday = today - timedelta(days=1)
+        if self.high_water_mark:
+            start = datetime.strptime(
+                self.high_water_mark, "%Y-%m-%d"
+            ).date() + timedelta(days=1)
+        else:
+            start = today - timedelta(days=config.INGESTION_INITIAL_LOOKBACK_DAYS)
+
+        pending = []
+        current = start
+        while current <= yesterday:
+            date_str = current.isoformat()
+            if self.status(date_str) in (None, DOWNLOADING):
+                pending.append((date_str, False))
+            current += timedelta(days=1)
+
+        pending_dates = {d for d, _ in pending}
+        # A re-check that found changes restarts its date at or before the
+        # high-water mark; if that run was interrupted, finish the date now.
+        for date_str in self.dates_with_status(DOWNLOADING):
+            if date_str not in pending_dates and date_str <= yesterday.isoformat():
+                pending.append((date_str, False))
+                pending_dates.add(date_str)
+        for offset in range(1, config.INGESTION_RECHECK_DAYS + 1):
+            date_str = (today - timedelta(days=offset)).isoformat()
+            if date_str not in pending_dates and self.status(date_str) in (
+                LOADED,
+                FAILED,
+            ):
+                pending.append((date_str, True))
+        return sorted(pending)
+
+    def conditional_headers(self, date_str):
+        entry = self.get(date_str)
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def start_download(self, date_str):
+        entry = self.get(date_str)
+        if entry.get("status") == DOWNLOADING:
+            return entry
+        return self._update(
+            date_str, status=DOWNLOADING, pages_done=[], total_pages=None
+        )
+
+    def mark_page_done(self, date_str, page, total_pages=None, **validators):
+        entry = self.get(date_str)
+        pages_done = sorted(set(entry.get("pages_done", [])) | {page})
+        fields = {"pages_done": pages_done, **validators}
+        if total_pages:
+            fields["total_pages"] = total_pages
+        self._update(date_str, **fields)
+
+    def mark_downloaded(self, date_str, doc_count):
+        # A date without documents has nothing to process or load.
+        status = DOWNLOADED if doc_count else LOADED
+        self._update(date_str, status=status, doc_count=doc_count, pages_done=[])
+        if status == LOADED:
+            self._advance_high_water_mark()
+            self.save()
+
+    def mark_unchanged(self, date_str):
+        """A conditional re-check returned 304; keep the date as it is."""
+        self._update(
+            date_str, checked_at=datetime.now().isoformat(timespec="seconds")
+        )
+
+    # --- Processing and loading ---
+
+    def mark_processed(self, date_str):
+        self._update(date_str, status=PROCESSED)
+
+    def mark_failed(self, date_str, error, doc_count, source_version=None):
+        """
+        Processing produced no usable documents from this download of the date. It
+        is not processed again until a re-download changes its raw data.
+        """
+        self._update(
+            date_str,
+            status=FAILED,
+            error=error,
+            processed_count=doc_count,
+            source_version=source_version,
+        )
+        self._advance_high_water_mark()
+        self.save()
+
+    def mark_loaded(self, date_strs):
+        for date_str in date_strs:
+            self.data["dates"].setdefault(date_str, {})["status"] = LOADED
+        self._advance_high_water_mark()
+        self.save()
+
+    def _advance_high_water_mark(self):
+        if self.high_water_mark:
+            current = datetime.strptime(self.high_water_mark, "%Y-%m-%d").date()
+        elif self.data["dates"]:
+            first_date = min(self.data["dates"])
+            current = datetime.strptime(first_date, "%Y-%m-%d").date() - timedelta(
+                days=1
+            )
+        else:
+            return
+
+        advanced = current
+        # Failed dates are terminal too; they are reported rather than blocking.
+        while self.status((advanced + timedelta(days=1)).isoformat()) in (
+            LOADED,
+            FAILED,
+        ):
+            advanced += timedelta(days=1)
+        if advanced != current:
+            self.data["high_water_mark"] = advanced.isoformat()
+
+
+class PageCheckpoint:
+    """Stores each fetched page of one date on disk so an interrupted download resumes."""
+
+    def __init__(self, state, date_str):
+        self.state = state
+        self.date_str = date_str
+        self.directory = os.path.join(config.RAW_DATA_DIR, ".partial", date_str)
+
+    def _page_path(self, page):
+        return os.path.join(self.directory, f"page_{page}.json")
+
+    def load_page(self, page):
+        if page not in self.state.get(self.date_str).get("pages_done", []):
+            return None
+        try:
+            with open(self._page_path(page), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def save_page(self, page, data, headers=None):
+        if page == 1:
+            # A fresh first page starts (or restarts, after a changed re-check) the date.
+            self.state.start_download(self.date_str)
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory)
+        tmp_path = f"{self._page_path(page)}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self._page_path(page))
+
+        validators = {}
+        if page == 1 and headers is not None:
+            validators = {
+                "etag": headers.get("ETag"),
+                "last_modified": headers.get("Last-Modified"),
+            }
+        self.state.mark_page_done(
+            self.date_str, page, data.get("total_pages"), **validators
+        )
+
+    def clear(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
@@ -0,0 +1,141 @@
+import asyncio
+import time
+import uuid
+
+from collections import OrderedDict
+from datetime import datetime
+
+from telemetry import detach_trace, record_span
+
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+MAX_TRACKED_JOBS = 20
+
+
+class PipelineJob:
+    """Status of one pipeline run: current stage, progress counts and per-stage timings."""
+
+    def __init__(self):
+        self.id = uuid.uuid4().hex
+        self.status = QUEUED
+        self.stage = None
+        self.progress = {}
+        self.stages = {}
+        self.error = None
+        self.created_at = datetime.now().isoformat(timespec="seconds")
+        self.started_at = None
+        self.finished_at = None
+        self._stage_started = None
+
+    def set_stage(self, stage):
+        now = time.perf_counter()
+        self._finish_stage(now)
+        self.stage = stage
+        self._stage_started = now
+        self.stages[stage] = {
+            "started_at": datetime.now().isoformat(timespec="seconds"),
+            "elapsed_seconds": None,
+        }
+        print(f"Pipeline job {self.id}: {stage}")
+
+    def _finish_stage(self, now, outcome="ok"):
+        if self.stage is not None and self._stage_started is not None:
+            self.stages[self.stage]["elapsed_seconds"] = round(
+                now - self._stage_started, 3
+            )
+            record_span(
+                f"pipeline.{self.stage}",
+                self._stage_started,
+                now - self._stage_started,
+                outcome,
+            )
+
+    def update(self, **counts):
+        """Sets progress counters; safe to call from the worker thread that loads data."""
+        self.progress.update(counts)
+
+    def increment(self, **counts):
+        for key, value in counts.items():
+            self.progress[key] = self.progress.get(key, 0) + value
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "stage": self.stage,
+            "progress": dict(self.progress),
+            "stages": {name: dict(timing) for name, timing in self.stages.items()},
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+_jobs = OrderedDict()
+_current = {"job": None, "task": None}
+
+
+async def _run_job(job, run):
+    # The task inherits the triggering request's context; its spans are not part of it.
+    detach_trace()
+    job.status = RUNNING
+    job.started_at = datetime.now().isoformat(timespec="seconds")
+    try:
+        await run(job)
+        job.status = SUCCEEDED
+    except Exception as e:
+        job.status = FAILED
+        job.error = str(e)
+        print(f"Pipeline job {job.id} failed: {e}")
+    finally:
+        if job.status == RUNNING:
+            job.status = FAILED
+            job.error = "cancelled"
+        job._finish_stage(
+            time.perf_counter(), "ok" if job.status == SUCCEEDED else "error"
+        )
+        job.finished_at = datetime.now().isoformat(timespec="seconds")
+        _current["job"] = None
+        _current["task"] = None
+
+
+def start_pipeline_job(run):
+    """
+    Starts `run(job)` as a background task and returns (job, started). Single-flight:
+    while a run is in progress, further triggers get the running job back instead
+    of starting a second one.
+    """
+    if _current["job"] is not None:
+        return _current["job"], False
+
+    job = PipelineJob()
+    _jobs[job.id] = job
+    while len(_jobs) > MAX_TRACKED_JOBS:
+        _jobs.popitem(last=False)
+    _current["job"] = job
+    _current["task"] = asyncio.create_task(_run_job(job, run))
+    return job, True
+
+
+def get_pipeline_job(job_id):
+    return _jobs.get(job_id)
+
+
+def get_current_pipeline_job():
+    return _current["job"]
+
+
+async def cancel_pipeline_job():
+    """Cancels the running job, e.g. on application shutdown."""
+    task = _current["task"]
+    if task is not None and not task.done():
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
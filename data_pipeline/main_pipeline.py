@@ -1,58 +1,182 @@
 import asyncio
-import os
-from datetime import datetime
 
-from .downloader import download_daily_data
+from .data_version import bump_data_version
+from .downloader import download_pending_data
 from .processor import process_all_new_raw_data
 from .db_loader import load_data_to_db
+from .ingestion_state import PROCESSED, IngestionState
+from .segment_store import processed_store, raw_store
 
+from agent.search_index import get_search_index
+from agent.semantic_index import build_sync_embedder, get_semantic_index
 from config import global_config as config
+from telemetry import span
 
 
-def cleanup_old_files(directory, retention_days: int):
-    """Removes files older than retention_days from the specified directory."""
-    now = datetime.now()
-    for filename in os.listdir(directory):
-        file_path = os.path.join(directory, filename)
-        if os.path.isfile(file_path):
-            try:
-                # Try to extract date from filename like YYYY-MM-DD_*.json
-                file_date_str = filename.split("_")[0]
-                file_date = datetime.strptime(file_date_str, "%Y-%m-%d")
-                if (now - file_date).days > retention_days:
-                    os.remove(file_path)
-                    print(f"Cleaned up old file: {file_path}")
-            except (ValueError, IndexError):
-
-                file_mod_time = datetime.fromtimestamp(os.path.getmtime(file_path))
-                if (now - file_mod_time).days > retention_days:
-                    os.remove(file_path)
-                    print(f"Cleaned up old file by mod time: {file_path}")
-
-
-async def run_pipeline():
+def _process_and_load(state, job=None, loop=None):
+    """
+    Feeds processor batches to the chunked loader and merges the per-batch reports.
+    With SEARCH_INDEX_ENABLED, each fully loaded batch is then upserted into the
+    local search index; with SEMANTIC_SEARCH_ENABLED, its changed documents are
+    embedded. A batch with failed chunks is left out of both until its retry.
+    Blocking; run it on a worker thread. Progress is reported to `job` if given;
+    `loop` is the event loop embedding requests are sent from (see
+    build_sync_embedder).
+    """
+    totals = {
+        "ok": True,
+        "rows": 0,
+        "inserted": 0,
+        "updated": 0,
+        "unchanged": 0,
+        "chunks": 0,
+        "affected_rows": 0,
+        "failed_chunks": [],
+        "elapsed_seconds": 0.0,
+        "rows_per_second": 0.0,
+    }
+    search_index = None
+    if config.SEARCH_INDEX_ENABLED:
+        search_index = get_search_index()
+        if search_index.document_count() == 0:
+            # A new index starts from everything already in MySQL.
+            search_index.rebuild_from_mysql()
+        totals["search_index"] = {"inserted": 0, "updated": 0, "unchanged": 0}
+
+    semantic_index = None
+    if config.SEMANTIC_SEARCH_ENABLED:
+        semantic_index = get_semantic_index()
+        embed_batch = build_sync_embedder(loop)
+        totals["semantic_index"] = {"embedded": 0, "unchanged": 0, "failed": 0}
+
+    process_stats = {}
+    for batch in process_all_new_raw_data(state, stats=process_stats):
+        with span("pipeline.load_batch", rows=len(batch)):
+            report = load_data_to_db(batch)
+        indexes_changed = False
+        if not report["ok"]:
+            # Indexes only get rows that reached MySQL; the date's load is retried
+            # as a whole and the indexes catch up then.
+            print("Skipping index updates for a batch with failed chunks.")
+        elif search_index is not None:
+            with span("pipeline.search_index_upsert", rows=len(batch)):
+                index_counts = search_index.upsert_documents(batch)
+            for key, value in index_counts.items():
+                totals["search_index"][key] += value
+            indexes_changed = config.SEARCH_BACKEND == "sqlite" and bool(
+                index_counts["inserted"] or index_counts["updated"]
+            )
+        if report["ok"] and semantic_index is not None:
+            # Only new or re-worded titles/abstracts are sent to the embedding model.
+            with span("pipeline.embed_batch", rows=len(batch)):
+                embed_counts = semantic_index.update(batch, embed_batch)
+            for key, value in embed_counts.items():
+                totals["semantic_index"][key] += value
+            indexes_changed = indexes_changed or bool(embed_counts["embedded"])
+        if indexes_changed:
+            # Cached tool results may predate these index rows.
+            bump_data_version()
+        totals["ok"] = totals["ok"] and report["ok"]
+        for key in (
+            "rows",
+            "inserted",
+            "updated",
+            "unchanged",
+            "chunks",
+            "affected_rows",
+            "elapsed_seconds",
+        ):
+            totals[key] += report[key]
+        totals["failed_chunks"].extend(report["failed_chunks"])
+        if job is not None:
+            job.update(
+                documents_loaded=totals["rows"],
+                inserted=totals["inserted"],
+                updated=totals["updated"],
+                unchanged=totals["unchanged"],
+                failed_chunks=len(totals["failed_chunks"]),
+            )
+    totals["failed_dates"] = process_stats.get("failed_dates", [])
+    if job is not None and totals["failed_dates"]:
+        job.update(dates_failed_processing=len(totals["failed_dates"]))
+    if totals["elapsed_seconds"]:
+        totals["rows_per_second"] = round(
+            totals["rows"] / totals["elapsed_seconds"], 1
+        )
+    return totals
+
+
+async def run_pipeline(job=None):
+    """
+    Downloads, processes and loads new data. With a PipelineJob (see jobs.py),
+    the current stage and progress counts are reported on it as the run goes.
+    """
+
+    def set_stage(stage):
+        if job is not None:
+            job.set_stage(stage)
+
     print("Starting data pipeline run...")
+    state = IngestionState.load()
+    print(f"Ingestion high-water mark: {state.high_water_mark or 'none'}")
 
-    # Adjust days_ago as needed. For a truly daily run, it's typically 1.
+    # Fetches every date after the high-water mark up to yesterday, resuming
+    # interrupted dates page by page, and re-checks recent dates for changes.
     print("\n--- Downloading Data ---")
-    await download_daily_data(days_ago=1)  # Fetches yesterday's data
+    set_stage("downloading")
+    if job is not None:
+        job.update(
+            dates_to_download=len(state.dates_to_download()),
+            dates_downloaded=0,
+            dates_failed=0,
+        )
+
+    def on_date_done(date_str, ok):
+        if job is not None:
+            job.increment(**{"dates_downloaded" if ok else "dates_failed": 1})
 
-    print("\n--- Processing Data ---")
-    processed_data = process_all_new_raw_data()
+    await download_pending_data(state, on_date_done=on_date_done)
 
-    if processed_data:
-        print("\n--- Loading Data to DB ---")
-        load_data_to_db(processed_data)
+    # Documents flow from the processor to the loader in bounded batches. Parsing
+    # and loading are blocking, so they run on a worker thread to keep the API's
+    # event loop responsive while a large backfill loads.
+    print("\n--- Processing and Loading Data ---")
+    set_stage("processing_and_loading")
+    load_report = await asyncio.to_thread(
+        _process_and_load, state, job, asyncio.get_running_loop()
+    )
+
+    if load_report["rows"]:
+        print(
+            f"\nLoaded {load_report['rows']} documents: "
+            f"{load_report['inserted']} inserted, {load_report['updated']} updated, "
+            f"{load_report['unchanged']} unchanged ({load_report['rows_per_second']} rows/s)."
+        )
+        if load_report["ok"]:
+            state.mark_loaded(state.dates_with_status(PROCESSED))
+        else:
+            print(
+                f"{len(load_report['failed_chunks'])} chunk(s) failed to load; "
+                "their dates will be retried on the next run."
+            )
     else:
         print("\nNo new data processed to load into DB.")
+    if load_report["failed_dates"]:
+        print(
+            f"{len(load_report['failed_dates'])} date(s) could not be processed and are "
+            f"marked failed until re-downloaded: {', '.join(load_report['failed_dates'])}"
+        )
+    print(f"Ingestion high-water mark: {state.high_water_mark or 'none'}")
 
-    print("\n--- Cleaning up old files ---")
-    cleanup_old_files(config.RAW_DATA_DIR, int(config.PIPELINE_DATA_RETENTION_DAYS))
-    cleanup_old_files(
-        config.PROCESSED_DATA_DIR, int(config.PIPELINE_DATA_RETENTION_DAYS)
-    )
+    print("\n--- Cleaning up old segments ---")
+    set_stage("cleanup")
+    for store in (raw_store(), processed_store()):
+        await asyncio.to_thread(
+            store.cleanup, int(config.PIPELINE_DATA_RETENTION_DAYS)
+        )
 
     print("\nData pipeline run finished.")
+    return load_report
 
 
 if __name__ == "__main__":
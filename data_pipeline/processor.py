@@ -1,55 +1,149 @@
+import hashlib
 import json
 import os
-from datetime import datetime
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+
+from .ingestion_state import DOWNLOADED, FAILED, PROCESSED
+from .segment_store import SegmentStore, processed_store, raw_store
 from config import global_config as config
 
 
-def process_raw_file(raw_file_path):
-    """Processes a single raw JSON file into a list of dictionaries for DB insertion."""
-    processed_documents = []
-    try:
-        with open(raw_file_path, "r", encoding="utf-8") as f:
-            raw_data = json.load(f)
-
-        for doc in raw_data:
-            agencies = [
-                agency["name"] for agency in doc.get("agencies", []) if "name" in agency
-            ]
-
-            publication_date_str = doc.get("publication_date")
-            if not publication_date_str:
-                print(
-                    f"Skipping document {doc.get('document_number')} due to missing publication_date."
-                )
-                continue
-            try:
+RAW_FILE_EXTENSIONS = (".ndjson", ".json")
+_ISO_DATE = re.compile(r"\d{4}-\d{2}-\d{2}")
+_SEPARATORS = re.compile(r"[\s,]*")
+# Fields covered by content_hash; the loader skips rows whose hash is unchanged.
+HASHED_FIELDS = (
+    "document_number",
+    "title",
+    "type",
+    "abstract",
+    "publication_date",
+    "agencies",
+    "document_url",
+    "pdf_url",
+    "raw_text_url",
+    "president",
+    "executive_order_number",
+)
 
-                datetime.strptime(publication_date_str, "%Y-%m-%d")
-            except ValueError:
-                print(
-                    f"Skipping document {doc.get('document_number')} due to invalid publication_date format: {publication_date_str}"
-                )
+
+def _iter_json_array(f, chunk_size=1 << 16):
+    """Yields the elements of a top-level JSON array without loading the whole file."""
+    decoder = json.JSONDecoder()
+    buffer = f.read(chunk_size).lstrip()
+    if not buffer.startswith("["):
+        raise json.JSONDecodeError("Expected a JSON array", buffer, 0)
+    pos = 1
+    while True:
+        pos = _SEPARATORS.match(buffer, pos).end()
+        if buffer.startswith("]", pos):
+            return
+        if pos < len(buffer):
+            try:
+                element, pos = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                pass  # The element continues in the next chunk.
+            else:
+                yield element
                 continue
+        chunk = f.read(chunk_size)
+        if not chunk:
+            raise json.JSONDecodeError("Unexpected end of JSON array", buffer, pos)
+        buffer = buffer[pos:] + chunk
+        pos = 0
+
+
+def iter_raw_documents(raw_file_path):
+    """Yields raw documents one at a time from an NDJSON file or a legacy JSON array file."""
+    with open(raw_file_path, "r", encoding="utf-8") as f:
+        first_char = ""
+        while not first_char:
+            char = f.read(1)
+            if not char:
+                return
+            if not char.isspace():
+                first_char = char
+        f.seek(0)
+
+        if first_char == "[":
+            yield from _iter_json_array(f)
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def compute_content_hash(processed_doc):
+    """SHA-256 over the loaded fields, independent of key order."""
+    payload = json.dumps(
+        [processed_doc.get(field) for field in HASHED_FIELDS],
+        ensure_ascii=False,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def transform_document(doc):
+    """Turns one raw API document into a row for DB insertion, or None if it is unusable."""
+    agencies = [
+        agency["name"] for agency in doc.get("agencies") or [] if "name" in agency
+    ]
+
+    publication_date_str = doc.get("publication_date")
+    if not publication_date_str:
+        print(
+            f"Skipping document {doc.get('document_number')} due to missing publication_date."
+        )
+        return None
+    try:
+        # Regex + fromisoformat is several times faster than strptime per document.
+        if not _ISO_DATE.fullmatch(publication_date_str):
+            raise ValueError(publication_date_str)
+        date.fromisoformat(publication_date_str)
+    except ValueError:
+        print(
+            f"Skipping document {doc.get('document_number')} due to invalid publication_date format: {publication_date_str}"
+        )
+        return None
+
+    processed_doc = {
+        "document_number": doc.get("document_number"),
+        "title": doc.get("title"),
+        "type": doc.get("type"),
+        "abstract": doc.get("abstract"),
+        "publication_date": publication_date_str,
+        "agencies": (json.dumps(agencies) if agencies else None),  # Store as JSON string
+        "document_url": doc.get("html_url"),
+        "pdf_url": doc.get("pdf_url"),
+        "raw_text_url": doc.get("raw_text_url"),
+        "president": doc.get("president"),
+        "executive_order_number": doc.get("executive_order_number"),
+    }
+
+    processed_doc = {k: v for k, v in processed_doc.items() if v is not None}
+    processed_doc["content_hash"] = compute_content_hash(processed_doc)
+    return processed_doc
+
+
+def transform_documents(raw_documents):
+    for doc in raw_documents:
+        processed_doc = transform_document(doc)
+        if processed_doc is not None:
+            yield processed_doc
+
+
+def iter_processed_documents(raw_file_path):
+    """Streams a raw file through transform_document. Raises on unreadable JSON."""
+    yield from transform_documents(iter_raw_documents(raw_file_path))
+
 
-            processed_doc = {
-                "document_number": doc.get("document_number"),
-                "title": doc.get("title"),
-                "type": doc.get("type"),
-                "abstract": doc.get("abstract"),
-                "publication_date": publication_date_str,
-                "agencies": (
-                    json.dumps(agencies) if agencies else None
-                ),  # Store as JSON string
-                "document_url": doc.get("html_url"),
-                "pdf_url": doc.get("pdf_url"),
-                "raw_text_url": doc.get("raw_text_url"),
-                "president": doc.get("president"),
-                "executive_order_number": doc.get("executive_order_number"),
-            }
-
-            processed_doc = {k: v for k, v in processed_doc.items() if v is not None}
-            processed_documents.append(processed_doc)
-        return processed_documents
+def process_raw_file(raw_file_path):
+    """Processes a single raw JSON file into a list of dictionaries for DB insertion."""
+    try:
+        return list(iter_processed_documents(raw_file_path))
     except json.JSONDecodeError:
         print(f"Error decoding JSON from {raw_file_path}")
         return []
@@ -58,47 +152,220 @@ def process_raw_file(raw_file_path):
         return []
 
 
-def process_all_new_raw_data():
-    if not os.path.exists(config.PROCESSED_DATA_DIR):
-        os.makedirs(config.PROCESSED_DATA_DIR)
-
-    processed_files_log = os.path.join(config.PROCESSED_DATA_DIR, "processed_log.txt")
-    processed_file_names = set()
-    if os.path.exists(processed_files_log):
-        with open(processed_files_log, "r") as log_f:
-            processed_file_names = set(line.strip() for line in log_f)
-
-    all_processed_data = []
-    newly_processed_files = []
-
-    for filename in os.listdir(config.RAW_DATA_DIR):
-        if filename.endswith(".json") and filename not in processed_file_names:
-            raw_file_path = os.path.join(config.RAW_DATA_DIR, filename)
-            print(f"Processing raw file: {filename}")
-            data_for_db = process_raw_file(raw_file_path)
-            if data_for_db:
-                # Save processed data (optional, but good for record keeping)
-                processed_file_path = os.path.join(
-                    config.PROCESSED_DATA_DIR, f"processed_{filename}"
+def _iter_batches(documents, batch_size):
+    batch = []
+    for document in documents:
+        batch.append(document)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _process_date_in_batches(raw, processed, date_str, batch_size):
+    """Yields batches of a date's processed documents while writing its processed member."""
+    writer = processed.writer(date_str)
+    try:
+        for batch in _iter_batches(
+            transform_documents(raw.iter_documents(date_str)), batch_size
+        ):
+            for processed_doc in batch:
+                writer.write(processed_doc)
+            yield batch
+    except BaseException:
+        processed.discard(writer)
+        raise
+    count = writer.close()
+    processed.commit(
+        date_str,
+        writer.path,
+        count,
+        writer.compression,
+        source_version=raw.entry(date_str)["version"],
+    )
+
+
+def _process_date_to_member(raw_directory, processed_directory, date_str):
+    """
+    Worker: processes one date into a staged processed member.
+    Returns (staged path, document count, compression); the parent commits it.
+    """
+    raw = SegmentStore(raw_directory, "raw")
+    writer = SegmentStore(processed_directory, "processed").writer(date_str)
+    try:
+        for processed_doc in transform_documents(raw.iter_documents(date_str)):
+            writer.write(processed_doc)
+    except BaseException:
+        writer.close()
+        os.remove(writer.path)
+        raise
+    return writer.path, writer.close(), writer.compression
+
+
+def _iter_serial(raw, processed, pending, batch_size, errors):
+    """
+    Yields (date, batch) pairs, then (date, None) once a date is finished. Dates
+    that raise are recorded in `errors` and finished without further batches.
+    """
+    for date_str in pending:
+        print(f"Processing raw data for {date_str}")
+        try:
+            for batch in _process_date_in_batches(raw, processed, date_str, batch_size):
+                yield date_str, batch
+        except json.JSONDecodeError:
+            print(f"Error decoding JSON for {date_str}")
+            errors[date_str] = "invalid JSON in raw data"
+        except Exception as e:
+            print(f"Error processing {date_str}: {e}")
+            errors[date_str] = str(e)
+        yield date_str, None
+
+
+def _iter_parallel(raw, processed, pending, batch_size, workers, errors):
+    """
+    Processes all pending dates on a process pool, then commits their members and
+    streams them back in date order, so output order is deterministic. Dates that
+    raise are recorded in `errors` and yielded only as finished.
+    """
+    print(f"Processing {len(pending)} dates with {workers} worker processes.")
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(
+                _process_date_to_member, raw.directory, processed.directory, date_str
+            )
+            for date_str in pending
+        ]
+        succeeded = []
+        for date_str, future in zip(pending, futures):
+            try:
+                staged_path, count, compression = future.result()
+            except json.JSONDecodeError:
+                print(f"Error decoding JSON for {date_str}")
+                errors[date_str] = "invalid JSON in raw data"
+                continue
+            except Exception as e:
+                print(f"Error processing {date_str}: {e}")
+                errors[date_str] = str(e)
+                continue
+            # Only this process writes to the store; workers just stage members.
+            processed.commit(
+                date_str,
+                staged_path,
+                count,
+                compression,
+                source_version=raw.entry(date_str)["version"],
+            )
+            succeeded.append(date_str)
+
+    for date_str in pending:
+        if date_str in succeeded:
+            yield from (
+                (date_str, batch)
+                for batch in _iter_batches(
+                    processed.iter_documents(date_str), batch_size
                 )
-                with open(processed_file_path, "w", encoding="utf-8") as pf:
-                    json.dump(data_for_db, pf, indent=2)
-                print(f"Saved processed data to {processed_file_path}")
-                all_processed_data.extend(data_for_db)
-                newly_processed_files.append(filename)
+            )
+        yield date_str, None
+
+
+def _needs_processing(raw, processed, date_str, state):
+    raw_version = raw.entry(date_str)["version"]
+    if state is not None and state.status(date_str) == FAILED:
+        # Retried only once a re-download has changed the raw data.
+        return state.get(date_str).get("source_version") != raw_version
+    processed_entry = processed.entry(date_str) or {}
+    if processed_entry.get("source_version") != raw_version:
+        return True
+    # Processed before but never loaded (e.g. a failed load): hand it to the loader again.
+    return state is not None and state.status(date_str) in (DOWNLOADED, PROCESSED)
 
-    if newly_processed_files:
-        with open(processed_files_log, "a") as log_f:
-            for fname in newly_processed_files:
-                log_f.write(f"{fname}\n")
 
-    return all_processed_data
+def process_all_new_raw_data(state=None, batch_size=None, workers=None, stats=None):
+    """
+    Streams raw dates that have not been processed since they were last downloaded,
+    yielding lists of at most batch_size processed documents, so peak memory is one
+    batch rather than the whole backfill. Raw and processed documents live in
+    compressed segment stores (see segment_store.py); each date is read from its own
+    member only. With workers > 1 the dates are parsed on a process pool. A date is
+    marked processed only after the caller has consumed its last batch. With an
+    IngestionState, dates that were processed but never loaded are yielded again,
+    and dates that raise or yield no documents are marked failed instead of being
+    retried every run. Pass a dict as `stats` to receive the run's date/document
+    counts, throughput and failed dates.
+    """
+    batch_size = batch_size or config.PROCESSOR_BATCH_SIZE
+    workers = workers or config.PROCESSOR_WORKERS
+    raw = raw_store()
+    raw.import_loose_files()
+    processed = processed_store()
+    processed.remove_legacy_files()
+
+    pending = [
+        date_str
+        for date_str in raw.dates()
+        if _needs_processing(raw, processed, date_str, state)
+    ]
+
+    started_at = time.perf_counter()
+    errors = {}
+    if workers > 1 and len(pending) > 1:
+        batches = _iter_parallel(
+            raw, processed, pending, batch_size, min(workers, len(pending)), errors
+        )
+    else:
+        batches = _iter_serial(raw, processed, pending, batch_size, errors)
+
+    date_count = 0
+    document_count = 0
+    doc_counts = {}
+    failed_dates = []
+    for date_str, batch in batches:
+        if batch is not None:
+            doc_counts[date_str] = doc_counts.get(date_str, 0) + len(batch)
+            document_count += len(batch)
+            yield batch
+        elif date_str in errors or not doc_counts.get(date_str):
+            # Batches already yielded for a date that then errored stay loaded;
+            # the date is still marked failed so it is reported.
+            error = errors.get(date_str, "no documents could be processed")
+            print(f"Marking {date_str} as failed: {error}")
+            failed_dates.append(date_str)
+            if state is not None:
+                state.mark_failed(
+                    date_str,
+                    error,
+                    doc_counts.get(date_str, 0),
+                    source_version=raw.entry(date_str)["version"],
+                )
+        else:
+            date_count += 1
+            if state is not None:
+                state.mark_processed(date_str)
+
+    elapsed = time.perf_counter() - started_at
+    run_stats = {
+        "dates": date_count,
+        "documents": document_count,
+        "workers": workers if len(pending) > 1 else 1,
+        "elapsed_seconds": round(elapsed, 3),
+        "documents_per_second": round(document_count / elapsed, 1) if elapsed else 0.0,
+        "failed_dates": failed_dates,
+    }
+    print(
+        f"Processed {document_count} documents from {date_count} dates in {elapsed:.2f}s "
+        f"({run_stats['documents_per_second']} docs/s, {run_stats['workers']} worker(s))."
+    )
+    if stats is not None:
+        stats.update(run_stats)
 
 
 if __name__ == "__main__":
 
-    data_to_load = process_all_new_raw_data()
-    if data_to_load:
-        print(f"Processed {len(data_to_load)} documents ready for database loading.")
+    document_count = 0
+    for batch in process_all_new_raw_data():
+        document_count += len(batch)
+    if document_count:
+        print(f"Processed {document_count} documents ready for database loading.")
     else:
         print("No new raw data to process or an error occurred.")
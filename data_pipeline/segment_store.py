@@ -0,0 +1,313 @@
+import glob
+import gzip
+import io
+import json
+import os
+import shutil
+import threading
+import time
+
+from datetime import date, datetime, timedelta
+
+from config import global_config as config
+
+try:
+    import zstandard
+except ImportError:  # Optional: gzip is used when zstandard is not installed.
+    zstandard = None
+
+
+MANIFEST_FILE = "manifest.json"
+STAGING_DIR = ".staging"
+COMPRESSIONS = ("gzip", "zstd")
+# A segment is rewritten during cleanup once this share of it is superseded members.
+COMPACT_DEAD_RATIO = 0.5
+# Per-file outputs of earlier versions, rebuilt from the imported raw files.
+LEGACY_PROCESSED_PATTERNS = (
+    "processed_*.json",
+    "processed_*.ndjson",
+    "processed_*.tmp",
+    "processed_log.txt",
+)
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def _resolve_compression(compression=None):
+    compression = (compression or config.SEGMENT_COMPRESSION).lower()
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"Unknown segment compression: {compression}")
+    if compression == "zstd" and zstandard is None:
+        print("zstandard is not installed, writing gzip segments instead.")
+        return "gzip"
+    return compression
+
+
+class SegmentWriter:
+    """
+    Writes one date's documents as a single compressed NDJSON member in a staging
+    file. Nothing is visible in the store until SegmentStore.commit appends it.
+    """
+
+    def __init__(self, path, compression):
+        self.path = path
+        self.compression = compression
+        self.documents = 0
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, "wb")
+        if compression == "zstd":
+            self._stream = zstandard.ZstdCompressor().stream_writer(
+                self._file, closefd=False
+            )
+        else:
+            self._stream = gzip.GzipFile(fileobj=self._file, mode="wb")
+
+    def write(self, document):
+        self._stream.write((json.dumps(document) + "\n").encode("utf-8"))
+        self.documents += 1
+
+    def close(self):
+        self._stream.close()
+        self._file.close()
+        return self.documents
+
+
+def _open_member(data, compression):
+    if compression == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read zstd segments.")
+        raw = zstandard.ZstdDecompressor().stream_reader(io.BytesIO(data))
+    else:
+        raw = gzip.GzipFile(fileobj=io.BytesIO(data), mode="rb")
+    return io.TextIOWrapper(raw, encoding="utf-8")
+
+
+class SegmentStore:
+    """
+    Compressed NDJSON store for one pipeline stage (raw or processed). Each month is
+    a segment file; each date is one compressed member appended to its month's
+    segment. manifest.json maps date -> segment, byte offset, length and document
+    count, so reading a date range seeks straight to the members it needs and
+    reads them sequentially. Re-writing a date appends a new member; the old one
+    is dropped when cleanup compacts the segment. Use raw_store() and
+    processed_store(): they share one instance, and so one manifest and lock, per
+    directory, so concurrent writers in a process do not lose manifest updates.
+    """
+
+    def __init__(self, directory, name):
+        self.directory = directory
+        self.name = name
+        self.manifest_path = os.path.join(directory, MANIFEST_FILE)
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self.manifest = {"version": 1, "dates": {}}
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                self.manifest = json.load(f)
+
+    def _save_manifest(self):
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.manifest_path)
+
+    def _segment_name(self, date_str, compression):
+        extension = "zst" if compression == "zstd" else "gz"
+        return f"{self.name}-{date_str[:7]}.ndjson.{extension}"
+
+    def dates(self):
+        return sorted(self.manifest["dates"])
+
+    def entry(self, date_str):
+        return self.manifest["dates"].get(date_str)
+
+    # --- Writing ---
+
+    def writer(self, date_str, compression=None):
+        """Returns a SegmentWriter for `date_str`; pass it to commit() when done."""
+        return SegmentWriter(
+            os.path.join(
+                self.directory, STAGING_DIR, f"{date_str}.{time.time_ns()}.member"
+            ),
+            _resolve_compression(compression),
+        )
+
+    def commit(self, date_str, staged_path, documents, compression, **metadata):
+        """Appends a staged member to its segment and points the manifest at it."""
+        segment = self._segment_name(date_str, compression)
+        segment_path = os.path.join(self.directory, segment)
+        with self._lock:
+            with open(staged_path, "rb") as staged, open(segment_path, "ab") as out:
+                offset = out.seek(0, os.SEEK_END)
+                while True:
+                    chunk = staged.read(1 << 20)
+                    if not chunk:
+                        break
+                    out.write(chunk)
+                length = out.tell() - offset
+                out.flush()
+                os.fsync(out.fileno())
+            os.remove(staged_path)
+
+            self.manifest["dates"][date_str] = {
+                "segment": segment,
+                "offset": offset,
+                "length": length,
+                "documents": documents,
+                "compression": compression,
+                "version": time.time_ns(),
+                "written_at": datetime.now().isoformat(timespec="seconds"),
+                **metadata,
+            }
+            self._save_manifest()
+        return self.manifest["dates"][date_str]
+
+    def write_date(self, date_str, documents, **metadata):
+        """Writes all of a date's documents, replacing any earlier version of the date."""
+        writer = self.writer(date_str)
+        try:
+            for document in documents:
+                writer.write(document)
+        except BaseException:
+            self.discard(writer)
+            raise
+        count = writer.close()
+        return self.commit(
+            date_str, writer.path, count, writer.compression, **metadata
+        )
+
+    def discard(self, writer):
+        writer.close()
+        if os.path.exists(writer.path):
+            os.remove(writer.path)
+
+    # --- Reading ---
+
+    def iter_documents(self, date_str):
+        """Yields a date's documents, decompressing only that date's member."""
+        entry = self.entry(date_str)
+        if entry is None:
+            return
+        with open(os.path.join(self.directory, entry["segment"]), "rb") as f:
+            f.seek(entry["offset"])
+            data = f.read(entry["length"])
+        with _open_member(data, entry["compression"]) as lines:
+            for line in lines:
+                if line.strip():
+                    yield json.loads(line)
+
+    def iter_range(self, start_date, end_date):
+        """Yields (date, document) for every stored date in [start_date, end_date]."""
+        for date_str in self.dates():
+            if start_date <= date_str <= end_date:
+                for document in self.iter_documents(date_str):
+                    yield date_str, document
+
+    # --- Retention and compaction ---
+
+    def cleanup(self, retention_days, today=None):
+        """
+        Forgets dates older than `retention_days`, deletes segments with no live
+        dates left and compacts segments that are mostly superseded members.
+        """
+        today = today or date.today()
+        cutoff = (today - timedelta(days=retention_days)).isoformat()
+        with self._lock:
+            expired = [d for d in self.manifest["dates"] if d < cutoff]
+            for date_str in expired:
+                del self.manifest["dates"][date_str]
+            if expired:
+                print(f"Expired {len(expired)} date(s) from the {self.name} store.")
+
+            live_bytes = {}
+            for entry in self.manifest["dates"].values():
+                live_bytes[entry["segment"]] = (
+                    live_bytes.get(entry["segment"], 0) + entry["length"]
+                )
+
+            segment_pattern = os.path.join(self.directory, f"{self.name}-*.ndjson.*")
+            for path in glob.glob(segment_pattern):
+                segment = os.path.basename(path)
+                if segment not in live_bytes:
+                    os.remove(path)
+                    print(f"Cleaned up old segment: {path}")
+                elif live_bytes[segment] < os.path.getsize(path) * (
+                    1 - COMPACT_DEAD_RATIO
+                ):
+                    self._compact_segment(segment)
+            self._save_manifest()
+            # Members staged by an interrupted run were never committed.
+            shutil.rmtree(os.path.join(self.directory, STAGING_DIR), ignore_errors=True)
+
+    def _compact_segment(self, segment):
+        """Rewrites a segment with only its live members, in date order."""
+        path = os.path.join(self.directory, segment)
+        tmp_path = f"{path}.tmp"
+        entries = sorted(
+            (
+                (date_str, entry)
+                for date_str, entry in self.manifest["dates"].items()
+                if entry["segment"] == segment
+            ),
+            key=lambda item: item[0],
+        )
+        with open(path, "rb") as src, open(tmp_path, "wb") as out:
+            for date_str, entry in entries:
+                src.seek(entry["offset"])
+                offset = out.tell()
+                out.write(src.read(entry["length"]))
+                entry["offset"] = offset
+        os.replace(tmp_path, path)
+        print(f"Compacted segment: {path}")
+
+    # --- Migration ---
+
+    def import_loose_files(self, pattern="*_federal_register.*json"):
+        """
+        Moves per-day files written by earlier versions (YYYY-MM-DD_*.json/.ndjson)
+        into the store, so old downloads are still processed once.
+        """
+        from .processor import iter_raw_documents
+
+        for path in sorted(glob.glob(os.path.join(self.directory, pattern))):
+            date_str = os.path.basename(path).split("_")[0]
+            try:
+                datetime.strptime(date_str, "%Y-%m-%d")
+            except ValueError:
+                continue
+            if self.entry(date_str) is None:
+                entry = self.write_date(date_str, iter_raw_documents(path))
+                print(
+                    f"Imported {entry['documents']} documents for {date_str} from {path}"
+                )
+            os.remove(path)
+
+    def remove_legacy_files(self, patterns=LEGACY_PROCESSED_PATTERNS):
+        """
+        Deletes per-file outputs of earlier versions (processed_*.json files and
+        processed_log.txt). Their raw files were moved into the raw store by
+        import_loose_files and are processed again from there.
+        """
+        for pattern in patterns:
+            for path in glob.glob(os.path.join(self.directory, pattern)):
+                os.remove(path)
+                print(f"Removed legacy file: {path}")
+
+
+def _shared_store(directory, name):
+    key = os.path.abspath(directory)
+    with _stores_lock:
+        if key not in _stores:
+            _stores[key] = SegmentStore(directory, name)
+        return _stores[key]
+
+
+def raw_store():
+    return _shared_store(config.RAW_DATA_DIR, "raw")
+
+
+def processed_store():
+    return _shared_store(config.PROCESSED_DATA_DIR, "processed")
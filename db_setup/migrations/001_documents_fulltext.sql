@@ -0,0 +1,21 @@
+-- Adds the FULLTEXT index used by the "natural" and "boolean" keyword search modes.
+-- Safe to run on an existing database; building the index rewrites the table once.
+
+USE federal_registry_db;
+
+SET @index_exists = (
+    SELECT COUNT(*) FROM information_schema.statistics
+    WHERE table_schema = DATABASE()
+      AND table_name = 'documents'
+      AND index_name = 'ft_title_abstract'
+);
+
+SET @ddl = IF(
+    @index_exists = 0,
+    'CREATE FULLTEXT INDEX ft_title_abstract ON documents (title, abstract)',
+    'SELECT ''ft_title_abstract already exists'''
+);
+
+PREPARE stmt FROM @ddl;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
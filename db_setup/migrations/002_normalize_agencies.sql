@@ -0,0 +1,32 @@
+-- Moves agency names out of the documents.agencies JSON column into indexed tables.
+-- The JSON column is kept for display; agency filters go through document_agencies.
+
+USE federal_registry_db;
+
+CREATE TABLE IF NOT EXISTS agencies (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    name VARCHAR(255) NOT NULL,
+    UNIQUE KEY uq_agency_name (name)
+);
+
+CREATE TABLE IF NOT EXISTS document_agencies (
+    document_id INT NOT NULL,
+    agency_id INT NOT NULL,
+    PRIMARY KEY (agency_id, document_id),
+    KEY idx_document_agencies_document (document_id),
+    FOREIGN KEY (document_id) REFERENCES documents (id) ON DELETE CASCADE,
+    FOREIGN KEY (agency_id) REFERENCES agencies (id) ON DELETE CASCADE
+);
+
+-- Backfill from the existing JSON arrays
+INSERT IGNORE INTO agencies (name)
+SELECT DISTINCT jt.name
+FROM documents d
+     CROSS JOIN JSON_TABLE(d.agencies, '$[*]' COLUMNS (name VARCHAR(255) PATH '$')) AS jt
+WHERE jt.name IS NOT NULL;
+
+INSERT IGNORE INTO document_agencies (document_id, agency_id)
+SELECT d.id, a.id
+FROM documents d
+     CROSS JOIN JSON_TABLE(d.agencies, '$[*]' COLUMNS (name VARCHAR(255) PATH '$')) AS jt
+     JOIN agencies a ON a.name = jt.name;
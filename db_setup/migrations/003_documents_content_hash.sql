@@ -0,0 +1,21 @@
+-- Adds the content_hash column the loader uses to skip unchanged documents.
+-- Existing rows start with NULL and get their hash the next time they are loaded.
+
+USE federal_registry_db;
+
+SET @column_exists = (
+    SELECT COUNT(*) FROM information_schema.columns
+    WHERE table_schema = DATABASE()
+      AND table_name = 'documents'
+      AND column_name = 'content_hash'
+);
+
+SET @ddl = IF(
+    @column_exists = 0,
+    'ALTER TABLE documents ADD COLUMN content_hash CHAR(64) NULL AFTER executive_order_number',
+    'SELECT ''content_hash already exists'''
+);
+
+PREPARE stmt FROM @ddl;
+EXECUTE stmt;
+DEALLOCATE PREPARE stmt;
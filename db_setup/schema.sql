@@ -16,15 +16,32 @@ CREATE TABLE IF NOT EXISTS documents (
     raw_text_url TEXT,
     president VARCHAR(255) NULL,
     executive_order_number VARCHAR(50) NULL,
+    -- SHA-256 of the loaded fields; the loader skips rows whose hash is unchanged
+    content_hash CHAR(64) NULL,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
 );
 
+-- Normalized agencies so agency filters can use an index instead of scanning JSON
+CREATE TABLE IF NOT EXISTS agencies (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    name VARCHAR(255) NOT NULL,
+    UNIQUE KEY uq_agency_name (name)
+);
+
+CREATE TABLE IF NOT EXISTS document_agencies (
+    document_id INT NOT NULL,
+    agency_id INT NOT NULL,
+    PRIMARY KEY (agency_id, document_id),
+    KEY idx_document_agencies_document (document_id),
+    FOREIGN KEY (document_id) REFERENCES documents (id) ON DELETE CASCADE,
+    FOREIGN KEY (agency_id) REFERENCES agencies (id) ON DELETE CASCADE
+);
+
 -- Optional: Indexes for faster searching
 CREATE INDEX idx_publication_date ON documents (publication_date);
 CREATE INDEX idx_type ON documents (type);
 CREATE INDEX idx_president ON documents (president);
 
-
--- Full-text search on title and abstract might be beneficial
--- ALTER TABLE documents ADD FULLTEXT(title, abstract);
\ No newline at end of file
+-- Full-text search on title and abstract (keyword search modes "natural" and "boolean")
+CREATE FULLTEXT INDEX ft_title_abstract ON documents (title, abstract);
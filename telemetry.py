@@ -0,0 +1,268 @@
+import contextvars
+import json
+import math
+import re
+import threading
+import time
+
+from datetime import datetime
+
+from config import global_config as config
+
+
+DURATION_BUCKETS = (
+    0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120
+)  # fmt: skip
+# Longest attribute value kept on a span (SQL, parameters) for the slow request log.
+MAX_ATTRIBUTE_CHARS = 2000
+# Spans kept per request; long exports and pipeline runs stop recording after this.
+MAX_TRACE_SPANS = 200
+
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+
+
+# --- Metrics ---
+
+
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _label_text(labels):
+    pairs = ",".join(f'{name}="{_escape_label(value)}"' for name, value in labels)
+    return "{" + pairs + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, "") for name in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                labels = _label_text(zip(self.label_names, key))
+                lines.append(f"{self.name}{labels} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, label_names=(), buckets=DURATION_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, "") for name in self.label_names)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {
+                    "buckets": [0] * len(self.buckets),
+                    "sum": 0.0,
+                    "count": 0,
+                }
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["buckets"][i] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def render(self):
+        lines = [
+            f"# HELP {self.name} {self.help_text}",
+            f"# TYPE {self.name} histogram",
+        ]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                label_pairs = list(zip(self.label_names, key))
+                for bound, count in zip(self.buckets, series["buckets"]):
+                    labels = _label_text(label_pairs + [("le", bound)])
+                    lines.append(f"{self.name}_bucket{labels} {count}")
+                labels = _label_text(label_pairs + [("le", "+Inf")])
+                lines.append(f"{self.name}_bucket{labels} {series['count']}")
+                labels = _label_text(label_pairs)
+                lines.append(f"{self.name}_sum{labels} {round(series['sum'], 6)}")
+                lines.append(f"{self.name}_count{labels} {series['count']}")
+        return lines
+
+
+http_request_duration = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request duration, until the last byte of streamed responses.",
+    ("method", "route", "status"),
+)
+span_duration = Histogram(
+    "span_duration_seconds",
+    "Duration of traced operations (LLM requests, pool acquisition, SQL, pipeline stages).",
+    ("span", "outcome"),
+)
+llm_tokens = Counter(
+    "llm_tokens_total", "Tokens reported by the LLM's usage field.", ("kind",)
+)
+slow_requests = Counter(
+    "slow_requests_total", "Requests slower than SLOW_REQUEST_SECONDS.", ("route",)
+)
+METRICS = [http_request_duration, span_duration, llm_tokens, slow_requests]
+
+
+def _flatten(prefix, value, out):
+    if isinstance(value, bool):
+        out[prefix] = int(value)
+    elif isinstance(value, (int, float)):
+        if not (isinstance(value, float) and math.isnan(value)):
+            out[prefix] = value
+    elif isinstance(value, dict):
+        for key, nested in value.items():
+            _flatten(f"{prefix}_{key}", nested, out)
+
+
+def render_metrics(stats_by_prefix):
+    """
+    Prometheus text format: the counters and histograms above, plus every numeric
+    value of the /monitoring stats dicts as a gauge (e.g. llm_queue_depth).
+    """
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    gauges = {}
+    for prefix, stats in stats_by_prefix.items():
+        _flatten(prefix, stats, gauges)
+    for name, value in sorted(gauges.items()):
+        name = re.sub(r"[^a-zA-Z0-9_]", "_", name)
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name} {value}")
+    return "\n".join(lines) + "\n"
+
+
+# --- Tracing ---
+
+
+class Span:
+    """A timed operation. Attributes (e.g. the SQL) only go to the slow request log."""
+
+    def __init__(self, name, attributes):
+        self.name = name
+        self.attributes = attributes
+        self.outcome = "ok"
+        self._started = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self._started
+        if exc_type is not None:
+            self.outcome = (
+                "cancelled" if exc_type.__name__ == "CancelledError" else "error"
+            )
+            self.attributes.setdefault("error", repr(exc))
+        record_span(self.name, self._started, duration, self.outcome, **self.attributes)
+        return False
+
+
+def record_span(name, started, duration, outcome="ok", **attributes):
+    """
+    Records a finished span timed by the caller, for operations that cannot sit in
+    a `with` block (e.g. an LLM stream consumed across yields).
+    """
+    span_duration.observe(duration, span=name, outcome=outcome)
+    trace = _current_trace.get()
+    if trace is None or len(trace.spans) >= MAX_TRACE_SPANS:
+        return
+    for key, value in attributes.items():
+        if isinstance(value, str) and len(value) > MAX_ATTRIBUTE_CHARS:
+            attributes[key] = value[:MAX_ATTRIBUTE_CHARS] + "..."
+    trace.spans.append(
+        {
+            "name": name,
+            "start_ms": round((started - trace.started) * 1000, 2),
+            "duration_ms": round(duration * 1000, 2),
+            "outcome": outcome,
+            **attributes,
+        }
+    )
+
+
+def span(name, **attributes):
+    """
+    Times a block as `name`: `with span("db.query", sql=query) as s: ... s.set(rows=n)`.
+    Works in sync and async code, and on worker threads started with asyncio.to_thread.
+    """
+    return Span(name, attributes)
+
+
+def count_llm_usage(usage):
+    """
+    Counts the tokens of an OpenAI-style `usage` object and returns them as span
+    attributes (empty when the server reported no usage).
+    """
+    if usage is None:
+        return {}
+    prompt_tokens = getattr(usage, "prompt_tokens", None) or 0
+    completion_tokens = getattr(usage, "completion_tokens", None) or 0
+    llm_tokens.inc(prompt_tokens, kind="prompt")
+    llm_tokens.inc(completion_tokens, kind="completion")
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens}
+
+
+class Trace:
+    """Spans of one HTTP request, kept for the slow request log."""
+
+    def __init__(self, method, path):
+        self.method = method
+        self.path = path
+        self.started = time.perf_counter()
+        self.spans = []
+
+
+def start_trace(method, path):
+    trace = Trace(method, path)
+    _current_trace.set(trace)
+    return trace
+
+
+def detach_trace():
+    """Stops spans of a background task from landing in the request that started it."""
+    _current_trace.set(None)
+
+
+def finish_trace(trace, route, status):
+    duration = time.perf_counter() - trace.started
+    http_request_duration.observe(
+        duration, method=trace.method, route=route, status=status
+    )
+    if not config.SLOW_REQUEST_LOG_ENABLED or duration < config.SLOW_REQUEST_SECONDS:
+        return
+    slow_requests.inc(route=route)
+    entry = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "method": trace.method,
+        "path": trace.path,
+        "route": route,
+        "status": status,
+        "duration_ms": round(duration * 1000, 2),
+        "spans": sorted(trace.spans, key=lambda s: s["start_ms"]),
+    }
+    line = json.dumps(entry, default=str)
+    if config.SLOW_REQUEST_LOG_PATH:
+        with open(config.SLOW_REQUEST_LOG_PATH, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+    else:
+        print(f"Slow request: {line}")